@@ -1,31 +1,83 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from typing import List, Dict
-import pandas as pd
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Depends, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from collections import deque
+from typing import TYPE_CHECKING, List, Dict, Optional
+import asyncio
+import base64
 import json
 import io
+import logging
+import os
+import tempfile
 from datetime import datetime
 
 import sys
 sys.path.append('/app')
 
-from app.utils.database import DatabaseManager
-from app.utils.normalizer import DataNormalizer
+from app.utils.cache import ResultCache, hash_upload
+from app.utils.database import DatabaseManager, ConnectionPool, FeedKeyError
+from app.utils.entry import Entry
+from app.utils.jobs import JobQueue, DONE
+from app.utils.metrics import REGISTRY, configure_logging, record_rejections, record_rows, render_gauges, timer
+from app.utils.parallel import PART_ROWS, create_executor, merge_results, normalize_chunk, split_frame
+from app.utils.json_writer import iter_result_json, result_json_bytes
+
+# Modules that load pandas / pyarrow (normalizer, reader, pipeline, delta,
+# records, exporter) are imported by the handlers that use them, so the
+# process starts and answers /health without loading them
+if TYPE_CHECKING:
+    import pandas as pd
+
+configure_logging()
+logger = logging.getLogger("api")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the connection pool and the normalization workers once per process
+    The schema is not touched here, it is created by python app/manage.py migrate
+    """
+    app.state.executor = create_executor()
+    # Lazy: if PostgreSQL is down now, requests keep retrying until it is back
+    pool = ConnectionPool(lazy=True)
+    app.state.db_pool = pool
+    try:
+        pool.open()
+        logger.info("Connection pool ready (%s-%s connections)", pool.minconn, pool.maxconn)
+    except Exception as e:
+        logger.error("Could not create connection pool, retrying on the next request: %s", e)
+    app.state.jobs = JobQueue(db_pool=app.state.db_pool, executor=app.state.executor)
+    app.state.cache = ResultCache()
+    yield
+    app.state.jobs.shutdown()
+    app.state.db_pool.closeall()
+    if app.state.executor:
+        app.state.executor.shutdown(cancel_futures=True)
 
 app = FastAPI(
     title="Streaver API",
     description="API for CSV normalization and data management",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Initialize database connection
-def get_db():
-    """Get database connection"""
-    db = DatabaseManager()
-    if db.connect():
-        db.create_tables()
-        return db
-    return None
+# Database connection per request
+def get_db(request: Request):
+    """
+    Borrow a pooled database connection for the duration of a request
+    None when the database cannot be reached; the pool retries on the next request
+    """
+    db = DatabaseManager(pool=request.app.state.db_pool)
+    if not db.connect():
+        db = None
+    try:
+        yield db
+    finally:
+        if db:
+            db.close()
 
 @app.get("/")
 def read_root():
@@ -35,21 +87,56 @@ def read_root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
-            "upload": "/upload"
+            "upload": "/upload",
+            "jobs": "/jobs",
+            "normalize": "/normalize",
+            "entries": "/entries",
+            "pool": "/pool",
+            "cache": "/cache",
+            "metrics": "/metrics"
         }
     }
 
 @app.get("/health")
-def health_check():
+def health_check(db: Optional[DatabaseManager] = Depends(get_db)):
     """Health check endpoint"""
-    db = get_db()
-    if db:
-        db.close()
+    if db and db.ping():
         return {"status": "healthy", "database": "connected"}
     return {"status": "unhealthy", "database": "disconnected"}
 
+@app.get("/pool")
+def pool_metrics(request: Request):
+    """Connection pool metrics"""
+    pool = request.app.state.db_pool
+    if not pool.connected:
+        return {"status": "unavailable", **pool.stats()}
+    return {"status": "available", **pool.stats()}
+
+@app.get("/cache")
+def cache_metrics(request: Request):
+    """Upload result cache metrics"""
+    return request.app.state.cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(request: Request):
+    """Stage timings, row counters, pool and cache stats in the Prometheus text format"""
+    body = REGISTRY.render()
+    body += render_gauges("db_pool", request.app.state.db_pool.stats(), "Connection pool")
+    body += render_gauges("upload_cache", request.app.state.cache.stats(), "Upload result cache")
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
 @app.post("/upload")
-async def upload_csv(file: UploadFile = File(...)):
+async def upload_csv(
+    request: Request,
+    file: UploadFile = File(...),
+    chunksize: Optional[int] = Query(None, gt=0, description="Rows per chunk, enables streaming mode"),
+    csv_format: Optional[int] = Query(None, alias="format", ge=1, le=3, description="Skip detection and use this format"),
+    columns: Optional[str] = Form(None, description="JSON mapping of field name to CSV column, instead of a format"),
+    feed: Optional[str] = Query(None, min_length=1, max_length=255, description="Feed this file is a full snapshot of, enables delta mode"),
+    key: Optional[str] = Query(None, description="Comma separated fields that identify a record of the feed (DELTA_KEY)"),
+    output: str = Query("json", description="Result format: json, ndjson, parquet or arrow"),
+    db: Optional[DatabaseManager] = Depends(get_db)
+):
     """
     Upload and process CSV file
     
@@ -57,67 +144,506 @@ async def upload_csv(file: UploadFile = File(...)):
     1. Lastname, Firstname, phonenumber, color, zipcode
     2. Firstname Lastname, color, zipcode, phonenumber
     3. Firstname, Lastname, zipcode, phonenumber, color
+    
+    With chunksize set, the file is processed in chunks of that many rows
+    so memory stays bounded regardless of the file size
+    
+    Parsing and database calls run in the thread pool and normalization in
+    the process pool, so the event loop stays free for other requests
+    
+    The format is detected from the header and the first rows unless given
+    with ?format=N, or a columns mapping (firstname, lastname or fullname,
+    phonenumber, color, zipcode) names the CSV column of every field
+    
+    Re-uploading a file with the same contents returns the earlier result
+    (X-Cache: hit) without processing or storing it again; X-Original-Id
+    holds the ID of the stored upload
+    
+    With feed set, the file is a full snapshot of that feed and only what
+    changed since its previous upload is normalized and stored (see
+    upload_feed)
+    
+    With output set to ndjson, parquet or arrow the response is a zip
+    archive holding the entries in that format and the error lines in a
+    result.errors.json sidecar
     """
+    from app.utils.exporter import check_format
+    from app.utils.reader import normalizer_frame, resolve_schema
+    
+    executor = request.app.state.executor
+    cache = request.app.state.cache
+    mapping, variant = parse_schema_override(csv_format, columns)
     try:
-        # Read CSV file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
+        check_format(output)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if feed:
+        if output != 'json':
+            raise HTTPException(status_code=422, detail="output is not supported for feed uploads")
+        return await upload_feed(file, feed, key, db, chunksize, csv_format, mapping)
+    await run_in_threadpool(check_mapping, file.file, mapping)
+    try:
+        content_hash = await run_in_threadpool(hash_upload, file.file, 1 << 20, variant)
+        cached = await run_in_threadpool(cache.get, content_hash, db)
+        if cached:
+            original_id, body = cached
+            logger.info("Cache hit for %s, original_id=%s", content_hash[:12], original_id)
+            if output != 'json':
+                with timer('serialize'):
+                    body = await run_in_threadpool(export_cached, body, output)
+            return Response(body, media_type=result_media_type(output), headers=cache_headers("hit", original_id))
         
-        # Replace NaN with None for JSON compatibility
-        df = df.replace({pd.NA: None, pd.NaT: None})
-        df = df.where(pd.notna(df), None)
+        if chunksize:
+            return await upload_csv_streaming(file, chunksize, db, executor, csv_format, mapping, output)
         
-        print(f"API: CSV read successfully, {len(df)} rows")
+        # Read CSV file: settle the format on the first rows, then parse only
+        # its columns, or all of them when the original data is saved
+        contents = await file.read()
+        csv_format, usecols = await run_in_threadpool(resolve_schema, io.BytesIO(contents), csv_format, mapping)
+        with timer('parse'):
+            df = await run_in_threadpool(read_csv_frame, contents, None if db else usecols)
         
-        # Convert to original data format
-        original_data = df.to_dict('records')
+        logger.debug("CSV read successfully, %s rows", len(df))
         
         # Process and normalize
-        entries, errors = DataNormalizer.process_csv_data(df)
+        frame = normalizer_frame(df, usecols, mapping)
+        entries, errors, lines = await normalize_frame(frame, executor, csv_format)
         
-        print(f"API: Processed {len(entries)} entries, {len(errors)} errors")
+        logger.info("Processed %s entries, %s errors", len(entries), len(errors))
         
         # Save to database
-        db = get_db()
+        original_id = None
         if db:
-            print("API: Database connected")
             try:
-                original_id = db.insert_original_data(original_data)
-                print(f"API: Original data inserted with ID: {original_id}")
-                
-                if original_id and entries:
-                    success = db.insert_normalized_data(entries, original_id)
-                    print(f"API: Normalized data insert result: {success}")
-                    if not success:
-                        print("API: ERROR - Failed to insert normalized data")
-                else:
-                    print(f"API: Skipping normalized insert - original_id={original_id}, entries={len(entries)}")
-                db.close()
+                original_id = await run_in_threadpool(save_upload, db, df, contents, entries, lines)
             except Exception as e:
-                print(f"API: Database error: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Database error: %s", e)
                 return JSONResponse(
                     status_code=500,
                     content={"error": f"Database error: {str(e)}"}
                 )
         else:
-            print("API: ERROR - Database connection failed")
-        
-        # Create result
-        result = {
-            "entries": entries,
-            "errors": errors
-        }
+            logger.error("Database connection failed")
         
-        return JSONResponse(content=result)
+        # Same bytes as JSONResponse, kept for repeat uploads once the data is saved
+        with timer('serialize'):
+            body = None
+            if output == 'json' or (original_id and cache.enabled):
+                body = await run_in_threadpool(result_json_bytes, entries, errors)
+        if original_id and body is not None:
+            await run_in_threadpool(cache.put, content_hash, original_id, body, db)
+        if output != 'json':
+            with timer('serialize'):
+                body = await run_in_threadpool(export_bytes, entries, errors, output)
+        return Response(body, media_type=result_media_type(output), headers=cache_headers("miss", original_id))
         
     except Exception as e:
-        print(f"API: Processing error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Processing error: %s", e)
         raise HTTPException(status_code=400, detail=f"Error processing CSV: {str(e)}")
 
+async def upload_feed(
+    file: UploadFile,
+    feed: str,
+    key: Optional[str],
+    db: Optional[DatabaseManager],
+    chunksize: Optional[int] = None,
+    csv_format: Optional[int] = None,
+    columns: Optional[Dict[str, str]] = None
+) -> JSONResponse:
+    """
+    Delta variant of upload_csv
+    Records are matched with the feed's previous snapshot by their key, and
+    only new and changed ones are normalized and written; the response lists
+    their entries and rejected lines, the entries of deleted records and the
+    number of inserted / changed / deleted / unchanged records
+    """
+    from app.utils.delta import apply_snapshot, parse_key_fields
+    from app.utils.reader import normalizer_frame, resolve_schema
+    
+    if chunksize:
+        raise HTTPException(status_code=422, detail="chunksize is not supported for feed uploads")
+    if not db:
+        raise HTTPException(status_code=503, detail="Database connection failed")
+    try:
+        key_fields = parse_key_fields(key)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await run_in_threadpool(check_mapping, file.file, columns)
+    
+    try:
+        contents = await file.read()
+        csv_format, usecols = await run_in_threadpool(resolve_schema, io.BytesIO(contents), csv_format, columns)
+        with timer('parse'):
+            df = await run_in_threadpool(read_csv_frame, contents)
+        frame = normalizer_frame(df, usecols, columns)
+        result = await run_in_threadpool(apply_snapshot, db, feed, df, csv_format, key_fields, frame)
+    except FeedKeyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.exception("Feed upload error: %s", e)
+        raise HTTPException(status_code=400, detail=f"Error processing CSV: {str(e)}")
+    
+    with timer('serialize'):
+        result['entries'] = [entry.to_dict() for entry in result['entries']]
+        return JSONResponse(result, headers=cache_headers("bypass", result['original_id']))
+
+def read_csv_frame(contents: bytes, usecols: Optional[List[int]] = None) -> 'pd.DataFrame':
+    """Parse uploaded CSV bytes into a DataFrame of strings with None for missing values"""
+    from app.utils.reader import read_csv_typed
+    return read_csv_typed(io.BytesIO(contents), usecols)
+
+async def normalize_frame(df: 'pd.DataFrame', executor: Optional[Executor], csv_format: int = None):
+    """
+    Normalize a DataFrame off the event loop, split across worker processes when available
+    The format is detected unless given
+    Returns (entries, errors, lines) where lines holds the source line of each entry
+    """
+    from app.utils.normalizer import DataNormalizer
+    
+    if not csv_format:
+        with timer('detect'):
+            csv_format = DataNormalizer.detect_format(df)
+    
+    if executor is None:
+        # Entries come out sorted, so sorting is part of this stage
+        with timer('normalize'):
+            result = await run_in_threadpool(
+                DataNormalizer.process_csv_data, df, csv_format=csv_format, with_lines=True
+            )
+    else:
+        loop = asyncio.get_running_loop()
+        with timer('normalize'):
+            results = await asyncio.gather(*(
+                loop.run_in_executor(executor, normalize_chunk, part, csv_format, True)
+                for part in split_frame(df, PART_ROWS)
+            ))
+        with timer('sort'):
+            result = await run_in_threadpool(merge_results, results)
+    
+    await run_in_threadpool(record_rows, df, result[1], csv_format)
+    return result
+
+def parse_schema_override(csv_format: Optional[int], columns: Optional[str]):
+    """
+    Validate the format / column mapping overrides of an upload; the mapped
+    columns are checked against the file header later, see check_mapping
+    Returns (mapping, variant) where variant keys the result cache by the overrides
+    """
+    mapping = None
+    if columns:
+        if csv_format:
+            raise HTTPException(status_code=422, detail="Use either format or columns, not both")
+        try:
+            mapping = json.loads(columns)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"columns is not valid JSON: {e}")
+        if not isinstance(mapping, dict) or not all(isinstance(v, str) for v in mapping.values()):
+            raise HTTPException(status_code=422, detail="columns must map field names to column names")
+        from app.utils.normalizer import DataNormalizer, MappingError
+        try:
+            DataNormalizer.mapping_format(mapping)
+        except MappingError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    if not csv_format and not mapping:
+        return None, ''
+    return mapping, json.dumps({'format': csv_format, 'columns': mapping}, sort_keys=True)
+
+def check_mapping(source, mapping: Optional[Dict[str, str]]) -> None:
+    """422 when a column mapping names columns missing from the header of a file (blocking, reads the header only)"""
+    from app.utils.normalizer import MappingError
+    from app.utils.reader import resolve_schema
+    if not mapping:
+        return
+    try:
+        resolve_schema(source, columns=mapping)
+    except MappingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        # An unreadable file is reported where it is processed, like without a mapping
+        logger.debug("Could not read the header to check the column mapping: %s", e)
+
+def cache_headers(status: str, original_id: Optional[int]) -> Dict[str, str]:
+    """Response headers describing the cache outcome of an upload"""
+    headers = {"X-Cache": status}
+    if original_id:
+        headers["X-Original-Id"] = str(original_id)
+    return headers
+
+def result_media_type(output: str) -> str:
+    """Content type of an upload response: the result JSON, or a zip of entries and errors"""
+    return "application/json" if output == 'json' else "application/zip"
+
+def export_bytes(entries: List[Entry], errors: List[int], output: str) -> bytes:
+    """Result as a zip of the entries in the output format and the errors sidecar (blocking)"""
+    from app.utils.exporter import write_result
+    buffer = io.BytesIO()
+    write_result(buffer, entries, errors, output)
+    return buffer.getvalue()
+
+def export_cached(body: bytes, output: str) -> bytes:
+    """A cached result.json converted to another output format (blocking)"""
+    result = json.loads(body)
+    entries = [Entry.from_dict(entry) for entry in result['entries']]
+    return export_bytes(entries, result['errors'], output)
+
+def save_upload(db: DatabaseManager, df: 'pd.DataFrame', contents: bytes,
+                entries: List[Entry], lines: List[int]) -> Optional[int]:
+    """Write original and normalized data as one transaction (blocking), returns the original_id if saved"""
+    original_id = db.insert_original_frame(df, raw_file=contents, commit=False)
+    logger.debug("Original data inserted with ID: %s", original_id)
+    
+    if original_id and entries:
+        success = db.insert_normalized_data(entries, original_id, commit=False, lines=lines)
+        if not success:
+            logger.error("Failed to insert normalized data, upload rolled back")
+    else:
+        success = bool(original_id)
+        logger.debug("Skipping normalized insert - original_id=%s, entries=%s", original_id, len(entries))
+    db.commit()
+    return original_id if success else None
+
+async def upload_csv_streaming(
+    file: UploadFile,
+    chunksize: int,
+    db: Optional[DatabaseManager],
+    executor: Optional[Executor],
+    csv_format: Optional[int] = None,
+    columns: Optional[Dict[str, str]] = None,
+    output: str = 'json'
+) -> StreamingResponse:
+    """
+    Streaming variant of upload_csv
+    The chunked pipeline runs in the thread pool; the response merges the
+    sorted runs while it is being sent. Other outputs than json are written
+    into a temporary file first, a zip archive needs its directory at the end
+    """
+    from app.utils.exporter import write_result
+    from app.utils.pipeline import iter_sorted_entries, process_csv_stream
+    from app.utils.records import RECORD_SPOOL_BYTES
+    
+    if not db:
+        logger.error("Database connection failed")
+    
+    try:
+        file.file.seek(0)
+        sorter, errors, original_id = await run_in_threadpool(
+            process_csv_stream, file.file, chunksize, db=db, executor=executor,
+            csv_format=csv_format, columns=columns
+        )
+        logger.info("Streamed %s entries, %s errors, original_id=%s", sorter.count, len(errors), original_id)
+    finally:
+        # Hand the connection back before the (possibly long) response is sent
+        if db:
+            await run_in_threadpool(db.close)
+    
+    if output == 'json':
+        return StreamingResponse(iter_result_json(iter_sorted_entries(sorter), errors), media_type="application/json")
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=RECORD_SPOOL_BYTES)
+    try:
+        with timer('serialize'):
+            await run_in_threadpool(write_result, spool, iter_sorted_entries(sorter), errors, output)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return StreamingResponse(iter_spool(spool), media_type=result_media_type(output))
+
+def iter_spool(spool, chunk_size: int = 1 << 20):
+    """Contents of a temporary file in chunks, closing it at the end"""
+    try:
+        for chunk in iter(lambda: spool.read(chunk_size), b''):
+            yield chunk
+    finally:
+        spool.close()
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    file: UploadFile = File(...),
+    chunksize: int = Query(50000, gt=0, description="Rows per chunk"),
+    csv_format: Optional[int] = Query(None, alias="format", ge=1, le=3, description="Skip detection and use this format"),
+    columns: Optional[str] = Form(None, description="JSON mapping of field name to CSV column, instead of a format")
+):
+    """
+    Queue a CSV file for background processing
+    Returns the job ID right away; poll GET /jobs/{id} for progress, then
+    fetch the result from GET /jobs/{id}/result
+    Accepts the same format / columns overrides as /upload
+    """
+    mapping, _ = parse_schema_override(csv_format, columns)
+    # A mapping that does not fit the header fails here, not inside the job
+    await run_in_threadpool(check_mapping, file.file, mapping)
+    job = await run_in_threadpool(
+        request.app.state.jobs.submit, file.file, file.filename, chunksize, csv_format, mapping
+    )
+    logger.info("Job %s queued for %s", job.id, file.filename)
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    """Job status and rows processed so far; once done, result_url points to the result"""
+    job = request.app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    
+    content = job.to_dict()
+    if job.status == DONE:
+        content["result_url"] = f"/jobs/{job.id}/result"
+    return content
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str, request: Request):
+    """
+    Normalized result of a finished job (entries and errors), sent from its
+    result file as written, without loading it into memory
+    """
+    job = request.app.state.jobs.get(job_id)
+    if job is None or (job.status == DONE and not os.path.exists(job.result_path)):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    return FileResponse(job.result_path, media_type="application/json")
+
+@app.post("/normalize")
+async def normalize_records(
+    request: Request,
+    batch_size: Optional[int] = Query(None, gt=0, description="Records per batch")
+):
+    """
+    Normalize JSON records with the CSV rules, without a CSV file
+    
+    The body is NDJSON (one object per line) or a JSON array of objects with
+    the fields firstname and lastname (or fullname), phonenumber, zipcode and
+    color. Nothing is stored.
+    
+    NDJSON bodies are split into batches as they arrive and each batch is
+    normalized on the worker processes right away, so the work overlaps the
+    upload. The response is NDJSON with one line per record, in input order:
+    {"line": n, "entry": {...}} or {"line": n, "error": reason}, where reason
+    is the first rule the record fails (name, phone, zip, color), or record
+    when it is not a JSON object
+    """
+    from app.utils.pipeline import STREAM_WINDOW
+    from app.utils.records import RECORD_SPOOL_BYTES, RecordBatcher, iter_batches, normalize_batch, parse_array
+    
+    loop = asyncio.get_running_loop()
+    executor = request.app.state.executor
+    pending = deque()
+    # Results of the batches finished while the body is still being received
+    output = tempfile.SpooledTemporaryFile(max_size=RECORD_SPOOL_BYTES)
+    
+    async def finish_oldest() -> bytes:
+        # With an executor this is the time spent waiting for the worker
+        with timer('normalize'):
+            body, rows, reasons = await pending.popleft()
+        record_rejections(rows, reasons)
+        return body
+    
+    async def submit(batches):
+        for batch in batches:
+            pending.append(loop.run_in_executor(executor, normalize_batch, batch))
+            # One batch beyond the window stays queued, as in process_csv_stream
+            if len(pending) > STREAM_WINDOW:
+                output.write(await finish_oldest())
+    
+    try:
+        chunks = request.stream()
+        head = b''
+        async for chunk in chunks:
+            head += chunk
+            if head.strip():
+                break
+        
+        if head.lstrip().startswith(b'['):
+            # A JSON array has to be complete before it can be parsed
+            body = head + b''.join([chunk async for chunk in chunks])
+            try:
+                with timer('parse'):
+                    records = await run_in_threadpool(parse_array, body)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON array: {e}")
+            await submit(iter_batches(records, batch_size))
+        else:
+            batcher = RecordBatcher(batch_size)
+            await submit(batcher.feed(head))
+            async for chunk in chunks:
+                await submit(batcher.feed(chunk))
+            await submit(batcher.close())
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        output.close()
+        raise
+    output.seek(0)
+    
+    async def stream_results():
+        try:
+            while True:
+                data = await run_in_threadpool(output.read, 1 << 20)
+                if not data:
+                    break
+                yield data
+            while pending:
+                yield await finish_oldest()
+        finally:
+            for future in pending:
+                future.cancel()
+            output.close()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/entries")
+def search_entries(
+    lastname: Optional[str] = Query(None, min_length=1, description="Lastname prefix, case-insensitive"),
+    zipcode: Optional[str] = Query(None, description="ZIP code"),
+    phonenumber: Optional[str] = Query(None, description="Phone number, in any notation"),
+    color: Optional[str] = Query(None, description="Color"),
+    original_id: Optional[int] = Query(None, description="Upload the entries come from"),
+    limit: int = Query(50, ge=1, le=1000, description="Entries per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Optional[DatabaseManager] = Depends(get_db)
+):
+    """
+    Search stored normalized entries
+    
+    Filters are combined; entries come sorted by lastname and firstname.
+    Pass next_cursor back as cursor to get the following page, it is null
+    on the last page
+    """
+    from app.utils.normalizer import DataNormalizer
+    
+    if not db:
+        raise HTTPException(status_code=503, detail="Database connection failed")
+    if phonenumber is not None:
+        phonenumber = DataNormalizer.normalize_phone(phonenumber)
+        if phonenumber is None:
+            raise HTTPException(status_code=422, detail="phonenumber is not a valid phone number")
+    if zipcode is not None:
+        zipcode = DataNormalizer.validate_zip(zipcode)
+        if zipcode is None:
+            raise HTTPException(status_code=422, detail="zipcode is not a valid ZIP code")
+    
+    entries, next_after = db.search_normalized(
+        lastname_prefix=lastname, zipcode=zipcode, phonenumber=phonenumber, color=color,
+        original_id=original_id, limit=limit, after=decode_cursor(cursor) if cursor else None
+    )
+    return {"entries": entries, "next_cursor": encode_cursor(next_after) if next_after else None}
+
+def encode_cursor(key: tuple) -> str:
+    """Opaque page cursor for a search sort key"""
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Search sort key of a page cursor"""
+    try:
+        lastname, firstname, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(lastname, str) or not isinstance(firstname, str) or not isinstance(entry_id, int):
+            raise ValueError("unexpected cursor contents")
+        return lastname, firstname, entry_id
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,15 +1,29 @@
 import pandas as pd
-import numpy as np
 import streamlit as st
+import io
 import json
+import logging
+import os
 from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
 from dotenv import load_dotenv
 
+from utils.cache import ResultCache, hash_upload
 from utils.database import DatabaseManager
+from utils.entry import ENTRY_FIELDS, Entry
+from utils.exporter import MEDIA_TYPES, available_formats, errors_name, file_name, write_entries, write_errors
+from utils.json_writer import result_json_bytes
+from utils.metrics import collect_timings, configure_logging, record_rows, timer
 from utils.normalizer import DataNormalizer
+from utils.reader import normalizer_frame, read_csv_typed, resolve_schema
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger("streamlit_app")
+
+# Choices for the rows shown per page of entries / error lines
+PAGE_SIZES = [50, 100, 500, 1000]
 
 # Page configuration
 st.set_page_config(
@@ -29,111 +43,236 @@ st.markdown("Upload a CSV file to normalize data and export to JSON format")
 # Initialize database connection
 @st.cache_resource
 def init_database():
-    """Initialize database connection and create tables"""
+    """Initialize the database connection (the schema comes from python app/manage.py migrate)"""
     db = DatabaseManager()
     if db.connect():
-        db.create_tables()
         return db
     return None
 
 db = init_database()
 
+@st.cache_resource
+def init_result_cache():
+    """Cache of upload results keyed on the file contents"""
+    return ResultCache()
+
+result_cache = init_result_cache()
+
 if db is None:
     st.error("⚠️ Unable to connect to database. Please check your database configuration.")
     st.info("Make sure PostgreSQL is running and the environment variables are set correctly.")
 else:
     st.success("✅ Database connected successfully")
 
+# Uploads whose parsed frame and results are kept between reruns
+UI_CACHE_UPLOADS = int(os.getenv("UI_CACHE_UPLOADS", "4"))
+
+def upload_hash(uploaded_file) -> str:
+    """Content hash of an upload, computed once per uploaded file"""
+    hashes = st.session_state.setdefault('upload_hashes', {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = hash_upload(uploaded_file)
+    return hashes[uploaded_file.file_id]
+
+# Reruns (every widget click) reuse the parsed file and the results of the
+# same contents instead of parsing and normalizing again
+@st.cache_data(show_spinner=False, max_entries=UI_CACHE_UPLOADS)
+def parse_upload(content_hash: str, _uploaded_file) -> Tuple[pd.DataFrame, List[int], int, Dict[str, float]]:
+    """Format, parsed frame and the columns the format reads of an upload, with the time each step took"""
+    # Settle the format on the first rows, then parse every column as strings:
+    # the whole rows are saved as original data and shown next to the errors
+    with collect_timings() as timings:
+        csv_format, usecols = resolve_schema(_uploaded_file)
+        with timer('parse'):
+            df = read_csv_typed(_uploaded_file)
+    return df, usecols, csv_format, timings
+
+@st.cache_data(show_spinner=False, max_entries=UI_CACHE_UPLOADS)
+def normalize_upload(content_hash: str, csv_format: int, usecols: List[int], _df: pd.DataFrame,
+                     _cached: Tuple[int, bytes] = None) -> Dict:
+    """
+    Normalized result of an upload: entries as a DataFrame, error lines and
+    the source line of each entry (None when served from the result cache)
+    _cached is the result cache entry of the upload, looked up by the caller
+    """
+    with collect_timings() as timings:
+        # Files processed before are served from the result cache
+        if _cached:
+            result = json.loads(_cached[1])
+            entries = pd.DataFrame(result["entries"], columns=list(ENTRY_FIELDS))
+            errors, lines = result["errors"], None
+        else:
+            # Process and normalize data (lines: source line of each entry)
+            frame = normalizer_frame(_df, usecols)
+            with timer('normalize'):
+                entries, errors, lines = DataNormalizer.process_csv_data(
+                    frame, csv_format=csv_format, with_lines=True
+                )
+            record_rows(frame, errors, csv_format)
+            entries = pd.DataFrame.from_records([entry.values() for entry in entries], columns=list(ENTRY_FIELDS))
+    return {
+        'entries': entries,
+        'errors': errors,
+        'lines': lines,
+        'timings': timings
+    }
+
+def frame_entries(entries: pd.DataFrame) -> Iterator[Entry]:
+    """Rows of an entries DataFrame as Entry records, built one at a time"""
+    return map(Entry, *(entries[field].tolist() for field in ENTRY_FIELDS))
+
+@st.cache_data(show_spinner=False, max_entries=UI_CACHE_UPLOADS)
+def result_json(content_hash: str, _entries: pd.DataFrame, _errors: List[int], pretty: bool = True) -> bytes:
+    """Serialized result of an upload"""
+    return result_json_bytes(frame_entries(_entries), _errors, pretty=pretty)
+
+@st.cache_data(show_spinner=False, max_entries=UI_CACHE_UPLOADS)
+def result_export(content_hash: str, output: str, _entries: pd.DataFrame) -> bytes:
+    """Entries of an upload in an export format other than json"""
+    buffer = io.BytesIO()
+    write_entries(buffer, frame_entries(_entries), output)
+    return buffer.getvalue()
+
+def show_page(label: str, total: int, key: str) -> slice:
+    """Page size and page number controls, returns the slice of rows to show"""
+    col1, col2, col3 = st.columns([1, 1, 3])
+    with col1:
+        size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_size")
+    pages = max(1, -(-total // size))
+    with col2:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page")
+    with col3:
+        st.caption(f"{label} {(page - 1) * size + 1 if total else 0}-{min(page * size, total)} of {total}")
+    return slice((page - 1) * size, page * size)
+
 # File uploader
 uploaded_file = st.file_uploader("Choose a CSV file", type=['csv'])
 
 if uploaded_file is not None:
     try:
         # Read CSV file
-        df = pd.read_csv(uploaded_file)
-        
-        # Replace NaN with None for JSON compatibility
-        df = df.replace({pd.NA: None, pd.NaT: None})
-        df = df.where(pd.notna(df), None)
+        content_hash = upload_hash(uploaded_file)
+        df, usecols, csv_format, read_timings = parse_upload(content_hash, uploaded_file)
         
         st.subheader("Original Data Preview")
         st.dataframe(df.head(10))
         
         # Process button
         if st.button("Process and Normalize Data", type="primary"):
-            with st.spinner("Processing data..."):
-                # Convert DataFrame to list of dicts for original data storage
-                original_data = df.to_dict('records')
-                
-                # Process and normalize data
-                entries, errors = DataNormalizer.process_csv_data(df)
-                
-                # Create result JSON
-                result = {
-                    "entries": entries,
-                    "errors": errors
-                }
-                
-                # Display results
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.metric("Successfully Processed", len(entries))
-                with col2:
-                    st.metric("Errors", len(errors))
+            st.session_state['processed'] = content_hash
+            with st.spinner("Processing data..."), collect_timings() as timings:
+                # Looked up on every click, normalize_upload's own cache does
+                # not know whether the file has been saved since
+                cached = result_cache.get(content_hash, db)
+                result = normalize_upload(content_hash, csv_format, usecols, df, cached)
+                entries, errors, lines = result['entries'], result['errors'], result['lines']
                 
-                # Show normalized data
-                if entries:
-                    st.subheader("Normalized Entries")
-                    st.json(entries)
-                
-                # Show errors
-                if errors:
-                    st.subheader("Error Lines")
-                    st.warning(f"Lines with errors: {errors}")
-                
-                # Save to database
-                if db:
+                # Save to database, unless this file was saved before
+                if cached:
+                    st.info(f"♻️ This file was already processed (Original ID = {cached[0]}), nothing new was saved")
+                elif db:
                     try:
-                        # Insert original data
-                        original_id = db.insert_original_data(original_data)
-                        st.write(f"DEBUG: Original ID = {original_id}, Entries count = {len(entries)}")
+                        # Insert original data (committed together with the normalized data)
+                        original_id = db.insert_original_frame(df, raw_file=uploaded_file.getvalue(), commit=False)
+                        logger.debug("Original ID = %s, Entries count = %s", original_id, len(entries))
                         
-                        if original_id and entries:
+                        if original_id and len(entries):
                             # Insert normalized data
-                            success = db.insert_normalized_data(entries, original_id)
+                            success = db.insert_normalized_data(
+                                list(frame_entries(entries)), original_id, commit=False, lines=lines
+                            )
                             if success:
+                                db.commit()
+                                result_cache.put(content_hash, original_id, result_json(content_hash, entries, errors, False), db)
                                 st.success("✅ Data saved to database successfully!")
                             else:
                                 st.error("❌ Failed to save normalized data")
                         elif not original_id:
                             st.error("❌ Failed to save original data")
-                        elif not entries:
+                        else:
+                            db.commit()
+                            result_cache.put(content_hash, original_id, result_json(content_hash, entries, errors, False), db)
                             st.warning("⚠️ No valid entries to save")
                     except Exception as e:
                         st.error(f"Error saving to database: {e}")
                         import traceback
                         st.code(traceback.format_exc())
                 
-                # Save to JSON file
+                # Save to JSON file (serialized once, reused for the download)
                 output_dir = Path(__file__).parent.parent / "output"
                 output_dir.mkdir(exist_ok=True)
                 output_path = output_dir / "result.json"
                 try:
-                    with open(output_path, 'w') as f:
-                        json.dump(result, f, indent=2, sort_keys=True)
-                    
+                    with timer('serialize'):
+                        output_path.write_bytes(result_json(content_hash, entries, errors))
                     st.success(f"✅ JSON file created: output/result.json")
-                    
-                    # Provide download button
+                except Exception as e:
+                    st.error(f"Error creating JSON file: {e}")
+            st.session_state['timings'] = {**read_timings, **result['timings'], **timings}
+        
+        # Results stay on screen while paging through them
+        if st.session_state.get('processed') == content_hash:
+            result = normalize_upload(content_hash, csv_format, usecols, df)
+            entries, errors = result['entries'], result['errors']
+            
+            # Display results
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.metric("Successfully Processed", len(entries))
+            with col2:
+                st.metric("Errors", len(errors))
+            
+            # Show normalized data, one page at a time
+            if len(entries):
+                st.subheader("Normalized Entries")
+                rows = show_page("Entries", len(entries), "entries")
+                st.dataframe(entries.iloc[rows], use_container_width=True, hide_index=True)
+            
+            # Show errors with the content of their lines
+            if errors:
+                st.subheader("Error Lines")
+                rows = show_page("Error lines", len(errors), "errors")
+                error_rows = df.loc[errors[rows]]
+                st.dataframe(error_rows.rename_axis('Line').reset_index(), use_container_width=True, hide_index=True)
+            
+            # Provide download buttons: result.json, or the entries plus an errors sidecar
+            output = st.selectbox("Download format", available_formats(), key="output_format")
+            if output == 'json':
+                st.download_button(
+                    label="📥 Download result.json",
+                    data=result_json(content_hash, entries, errors),
+                    file_name="result.json",
+                    mime="application/json"
+                )
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
                     st.download_button(
-                        label="📥 Download result.json",
-                        data=json.dumps(result, indent=2, sort_keys=True),
-                        file_name="result.json",
+                        label=f"📥 Download {file_name('result', output)}",
+                        data=result_export(content_hash, output, entries),
+                        file_name=file_name('result', output),
+                        mime=MEDIA_TYPES[output]
+                    )
+                with col2:
+                    sidecar = io.BytesIO()
+                    write_errors(sidecar, errors)
+                    st.download_button(
+                        label=f"📥 Download {errors_name('result')}",
+                        data=sidecar.getvalue(),
+                        file_name=errors_name('result'),
                         mime="application/json"
                     )
-                except Exception as e:
-                    st.error(f"Error creating JSON file: {e}")
+            
+            # Time spent per stage in this run
+            st.subheader("⏱️ Stage Timings")
+            st.dataframe(
+                pd.DataFrame(
+                    [(stage, round(seconds * 1000, 1)) for stage, seconds in st.session_state.get('timings', {}).items()],
+                    columns=['Stage', 'Milliseconds']
+                ),
+                use_container_width=True
+            )
         
     except Exception as e:
         st.error(f"Error reading CSV file: {e}")
@@ -0,0 +1,185 @@
+"""
+Maintenance commands for the Streaver database
+
+    python app/manage.py migrate
+    python app/manage.py reconcile-colors [--fix]
+    python app/manage.py rebuild-colors
+    python app/manage.py normalize datasets/ 'incoming/**/*.csv' -o output/batch [--merge] [--no-db] [--output-format parquet]
+    python app/manage.py prune --days 365 [--dry-run]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from utils.database import ConnectionPool, DatabaseManager
+from utils.exporter import EXPORT_FORMATS, check_format
+from utils.metrics import configure_logging
+from utils.parallel import create_executor
+
+
+def connect() -> DatabaseManager:
+    """Connected DatabaseManager; the schema comes from migrate"""
+    db = DatabaseManager()
+    if not db.connect():
+        sys.exit("Unable to connect to database")
+    return db
+
+
+def migrate(args) -> int:
+    """Create the tables, indexes and upcoming partitions; safe to run on every deploy"""
+    configure_logging()
+    db = connect()
+    try:
+        if not db.create_tables():
+            print("Failed to create the schema, see the log")
+            return 1
+        print("Schema up to date")
+        return 0
+    finally:
+        db.close()
+
+
+def reconcile_colors(args) -> int:
+    """Check color_counts against normalized_data, optionally fixing drift"""
+    db = connect()
+    drift = db.reconcile_color_counts(fix=args.fix)
+    db.close()
+    if not drift:
+        print("color_counts is in sync with normalized_data")
+        return 0
+    for color, (stored, actual) in sorted(drift.items()):
+        print(f"{color}: stored={stored} actual={actual}")
+    if args.fix:
+        print(f"Rebuilt color_counts ({len(drift)} colors drifted)")
+        return 0
+    return 1
+
+
+def rebuild_colors(args) -> int:
+    """Recompute color_counts from scratch"""
+    db = connect()
+    success = db.rebuild_color_counts()
+    db.close()
+    print("color_counts rebuilt" if success else "Failed to rebuild color_counts")
+    return 0 if success else 1
+
+
+def normalize(args) -> int:
+    """Normalize a set of CSV files in parallel, resuming an earlier run into the same output directory"""
+    # The pipeline loads pandas, only this command needs it
+    from utils.batch import BatchRunner, expand_inputs
+
+    configure_logging()
+    try:
+        check_format(args.output_format)
+    except ValueError as e:
+        print(e)
+        return 1
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("No CSV files found")
+        return 1
+
+    db_pool = None
+    if not args.no_db:
+        connect().close()
+        db_pool = ConnectionPool(maxconn=args.workers)
+    executor = create_executor()
+    runner = BatchRunner(
+        args.output, db_pool=db_pool, executor=executor, workers=args.workers, chunksize=args.chunksize,
+        merge=args.merge, pretty=not args.compact, csv_format=args.csv_format, output_format=args.output_format
+    )
+    done = len(paths) - len(runner.pending(paths))
+
+    def report(path, record):
+        nonlocal done
+        done += 1
+        if record['status'] == 'done':
+            print(f"[{done}/{len(paths)}] {path}: {record['entries']} entries, {record['errors']} errors "
+                  f"in {record['seconds']:.1f}s")
+        else:
+            print(f"[{done}/{len(paths)}] {path}: failed, {record['error']}")
+
+    try:
+        results = runner.run(paths, progress=report)
+    finally:
+        if executor:
+            executor.shutdown()
+        if db_pool:
+            db_pool.closeall()
+
+    failed = [path for path, record in results.items() if record.get('status') != 'done']
+    print(f"{len(paths) - len(failed)} of {len(paths)} files done, output in {args.output}")
+    if failed:
+        print("Run the same command again to retry the failed files")
+    return 1 if failed else 0
+
+
+def prune(args) -> int:
+    """Create the upcoming partitions and drop the ones past the retention period"""
+    configure_logging()
+    db = connect()
+    try:
+        if not db.partitioned_tables():
+            print("The upload tables are not partitioned (DB_PARTITIONING), nothing to prune")
+            return 1
+        if not args.dry_run:
+            for name in db.ensure_partitions():
+                print(f"Created {name}")
+        days = args.days if args.days is not None else int(os.getenv("DB_RETENTION_DAYS", "0"))
+        if days <= 0:
+            print("No retention period set (--days or DB_RETENTION_DAYS), nothing dropped")
+            return 0
+        before = datetime.now() - timedelta(days=days)
+        dropped = db.drop_partitions(before, dry_run=args.dry_run)
+        for name in dropped:
+            print(f"{'Would drop' if args.dry_run else 'Dropped'} {name}")
+        print(f"{len(dropped)} partitions ending before {before:%Y-%m-%d %H:%M} "
+              f"{'would be dropped' if args.dry_run else 'dropped'}")
+        return 0
+    finally:
+        db.close()
+
+
+def main() -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    schema = commands.add_parser('migrate', help="Create or update the database schema")
+    schema.set_defaults(func=migrate)
+
+    reconcile = commands.add_parser('reconcile-colors', help="Check color_counts for drift")
+    reconcile.add_argument('--fix', action='store_true', help="Rebuild the table if drift is found")
+    reconcile.set_defaults(func=reconcile_colors)
+
+    rebuild = commands.add_parser('rebuild-colors', help="Recompute color_counts from normalized_data")
+    rebuild.set_defaults(func=rebuild_colors)
+
+    batch = commands.add_parser('normalize', help="Normalize CSV files in parallel (resumable)")
+    batch.add_argument('inputs', nargs='+', help="CSV files, directories or glob patterns")
+    batch.add_argument('-o', '--output', default='output/batch', help="Output directory, also holds the progress")
+    batch.add_argument('--merge', action='store_true', help="One globally sorted merged.json instead of one JSON per file")
+    batch.add_argument('--compact', action='store_true', help="Compact JSON instead of the indented result.json layout")
+    batch.add_argument('--output-format', choices=EXPORT_FORMATS, default='json',
+                       help="Format of the entries; other than json the errors go to a .errors.json sidecar")
+    batch.add_argument('--no-db', action='store_true', help="Only write the output files, skip PostgreSQL")
+    batch.add_argument('--workers', type=int, default=None, help="Files processed at a time (BATCH_WORKERS)")
+    batch.add_argument('--chunksize', type=int, default=None, help="Rows per chunk (BATCH_CHUNKSIZE)")
+    batch.add_argument('--format', type=int, choices=[1, 2, 3], dest='csv_format', help="Skip format detection")
+    batch.set_defaults(func=normalize)
+
+    retention = commands.add_parser('prune', help="Create upcoming partitions and drop expired ones")
+    retention.add_argument('--days', type=int, default=None, help="Keep this many days of uploads (DB_RETENTION_DAYS)")
+    retention.add_argument('--dry-run', action='store_true', help="Only list the partitions that would be dropped")
+    retention.set_defaults(func=prune)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
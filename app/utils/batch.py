@@ -0,0 +1,254 @@
+import glob
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from .database import ConnectionPool, DatabaseManager
+from .entry import Entry
+from .exporter import write_output
+from .json_writer import entry_encoder
+from .metrics import collect_timings, timer
+from .pipeline import iter_sorted_entries, process_csv_stream
+from .sorting import sort_key
+
+logger = logging.getLogger(__name__)
+
+# Progress of a batch, kept in its output directory
+STATE_FILE = '.batch_state.json'
+# Sorted entries (and error lines, in a sidecar) of every file in merge
+# mode, merged into MERGED_STEM at the end
+RUNS_DIR = '.batch_runs'
+MERGED_STEM = 'merged'
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """CSV files named by directories (their *.csv files), glob patterns or paths, sorted and without duplicates"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '*.csv'))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.update(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(paths)
+
+
+class BatchRunner:
+    """
+    Normalize many CSV files into an output directory
+
+    Files are handled by a pool of threads with the chunked pipeline, like
+    background jobs: chunks of every file are normalized on a shared process
+    pool and, when a connection pool is given, each file is loaded into
+    PostgreSQL as one transaction. Each file gets its own result JSON, or with
+    merge=True all entries go into one globally sorted merged.json. With
+    output_format set to ndjson, parquet or arrow the entries are written in
+    that format and the errors to a <name>.errors.json sidecar.
+
+    Finished files are recorded in a state file in the output directory, so a
+    run that is interrupted and started again skips them; a file that changed
+    since (size or modification time) is processed again. The state only
+    holds counts and paths: in merge mode the error lines of each file wait
+    in a sidecar next to its sorted entries.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        db_pool: Optional[ConnectionPool] = None,
+        executor: Optional[Executor] = None,
+        workers: int = None,
+        chunksize: int = None,
+        merge: bool = False,
+        pretty: bool = True,
+        csv_format: int = None,
+        output_format: str = 'json'
+    ):
+        self.output_dir = output_dir
+        self.db_pool = db_pool
+        self.executor = executor
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", "4"))
+        self.chunksize = chunksize or int(os.getenv("BATCH_CHUNKSIZE", "50000"))
+        self.merge = merge
+        self.pretty = pretty
+        self.csv_format = csv_format
+        self.output_format = output_format
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+
+    def run(self, paths: List[str], progress: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """
+        Process every file not finished yet, returns the state of each file
+        progress is called with the path and its state as each file finishes
+        """
+        os.makedirs(os.path.join(self.output_dir, RUNS_DIR) if self.merge else self.output_dir, exist_ok=True)
+        root = os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else ''
+        pending = self.pending(paths)
+        logger.info("%s files, %s already done", len(paths), len(paths) - len(pending))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-worker") as workers:
+            futures = {
+                workers.submit(self._process, path, os.path.relpath(path, root)): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logger.exception("Failed to process %s: %s", path, e)
+                    record = {'status': 'failed', 'error': str(e)}
+                self._save(path, record)
+                if progress:
+                    progress(path, record)
+
+        results = {path: self.state['files'].get(path, {}) for path in paths}
+        if self.merge and all(record.get('status') == 'done' for record in results.values()):
+            with timer('serialize'):
+                self._write_merged([results[path] for path in paths])
+        return results
+
+    def _process(self, path: str, name: str) -> Dict:
+        """Normalize one file and write its output (runs in a batch worker thread)"""
+        started = time.time()
+        db = None
+        try:
+            if self.db_pool:
+                db = DatabaseManager(pool=self.db_pool)
+                if not db.connect():
+                    raise RuntimeError("Unable to connect to database")
+
+            with collect_timings() as timings:
+                sorter, errors, original_id = process_csv_stream(
+                    path, self.chunksize, db=db, executor=self.executor, csv_format=self.csv_format
+                )
+                if db:
+                    db.close()
+                    db = None
+                    if not original_id and (sorter.count or errors):
+                        sorter.close()
+                        raise RuntimeError("Database write failed, the file was rolled back")
+
+                errors_path = None
+                if self.merge:
+                    output = os.path.join(self.output_dir, RUNS_DIR, os.path.splitext(name)[0] + '.jsonl')
+                    errors_path = os.path.splitext(output)[0] + '.errors.json'
+                    os.makedirs(os.path.dirname(output), exist_ok=True)
+                    with timer('serialize'):
+                        self._write_run(output, iter_sorted_entries(sorter))
+                        self._write_errors(errors_path, errors)
+                else:
+                    directory = os.path.join(self.output_dir, os.path.dirname(name))
+                    stem = os.path.splitext(os.path.basename(name))[0]
+                    os.makedirs(directory, exist_ok=True)
+                    with timer('serialize'):
+                        output = write_output(
+                            directory, stem, iter_sorted_entries(sorter), errors, self.output_format, pretty=self.pretty
+                        )
+        finally:
+            if db:
+                db.close()
+
+        stat = os.stat(path)
+        return {
+            'status': 'done',
+            'name': name,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'output': output,
+            'errors_path': errors_path,
+            'entries': sorter.count,
+            'errors': len(errors),
+            'original_id': original_id,
+            'seconds': time.time() - started,
+            'timings': timings,
+        }
+
+    def pending(self, paths: List[str]) -> List[str]:
+        """The files a run still has to process"""
+        return [path for path in paths if not self._finished(path)]
+
+    def _finished(self, path: str) -> bool:
+        """Whether a file was already processed, with the same contents and output mode"""
+        record = self.state['files'].get(path)
+        if not record or record.get('status') != 'done' or not os.path.exists(record['output']):
+            return False
+        if self.merge and not (record.get('errors_path') and os.path.exists(record['errors_path'])):
+            return False
+        stat = os.stat(path)
+        return (record['size'], record['mtime']) == (stat.st_size, stat.st_mtime)
+
+    def _load_state(self) -> Dict:
+        """Progress of an earlier run into the same output directory, if it used the same mode"""
+        mode = {
+            'merge': self.merge, 'pretty': self.pretty, 'format': self.csv_format, 'db': bool(self.db_pool),
+            'output': self.output_format,
+        }
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = None
+        except ValueError as e:
+            logger.warning("Ignoring unreadable batch state %s: %s", self.state_path, e)
+            state = None
+        if not state or state.get('mode') != mode:
+            return {'mode': mode, 'files': {}}
+        return state
+
+    def _save(self, path: str, record: Dict):
+        """Record a file's outcome, replacing the state file atomically"""
+        with self._lock:
+            self.state['files'][path] = record
+            temporary = self.state_path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(temporary, self.state_path)
+
+    @staticmethod
+    def _write_run(path: str, entries: Iterable[Entry]):
+        """Sorted entries of one file, one JSON object per line"""
+        encode = entry_encoder(False)
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(encode(entry))
+                f.write('\n')
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _read_run(path: str) -> Iterator[Entry]:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                yield Entry.from_dict(json.loads(line))
+
+    @staticmethod
+    def _write_errors(path: str, errors: List[int]):
+        """Error lines of one file, until the merged result is written"""
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(errors, f)
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _read_errors(path: str) -> List[int]:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_merged(self, records: List[Dict]):
+        """
+        Merge the sorted entries of every file into one result; ties keep the
+        order of the files. Errors name the file of each rejected line
+        """
+        entries = heapq.merge(*(self._read_run(record['output']) for record in records), key=sort_key)
+        errors = [
+            {'file': record['name'], 'line': line}
+            for record in records for line in self._read_errors(record['errors_path'])
+        ]
+        write_output(self.output_dir, MERGED_STEM, entries, errors, self.output_format, pretty=self.pretty)
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional, Tuple
+
+# Bump when normalization output changes so earlier cached results are not reused
+CACHE_VERSION = 3
+
+
+def hash_upload(fileobj: BinaryIO, chunk_size: int = 1 << 20, variant: str = '') -> str:
+    """
+    SHA-256 of an uploaded file, read in chunks; rewinds the file afterwards
+    variant tells apart uploads of the same file processed with different options
+    """
+    digest = hashlib.sha256(f"v{CACHE_VERSION}:{variant}:".encode())
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of upload results
+    An in-process LRU in front of the upload_cache table; values are the
+    serialized result and the original_id of the upload that produced it
+    """
+
+    def __init__(self, max_bytes: int = None, ttl: float = None, max_result_bytes: int = None):
+        # Total size of results kept in memory
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("CACHE_MAX_BYTES", str(256 << 20)))
+        # Seconds a result stays valid, 0 disables the cache
+        self.ttl = ttl if ttl is not None else float(os.getenv("CACHE_TTL_SECONDS", "86400"))
+        # Larger results are not cached at all
+        self.max_result_bytes = (
+            max_result_bytes if max_result_bytes is not None
+            else int(os.getenv("CACHE_MAX_RESULT_BYTES", str(32 << 20)))
+        )
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached at all (CACHE_TTL_SECONDS > 0)"""
+        return self.ttl > 0
+
+    def get(self, content_hash: str, db=None) -> Optional[Tuple[Optional[int], bytes]]:
+        """Cached (original_id, result) for a content hash, from memory or the database"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            cached = self._entries.get(content_hash)
+            if cached and time.time() - cached[0] > self.ttl:
+                self._evict(content_hash)
+                cached = None
+            if cached:
+                self._entries.move_to_end(content_hash)
+                self.hits += 1
+                return cached[1], cached[2]
+
+        stored = db.get_cached_result(content_hash, self.ttl) if db else None
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            original_id, result, age = stored
+            self._remember(content_hash, original_id, result, time.time() - age)
+        return original_id, result
+
+    def put(self, content_hash: str, original_id: Optional[int], result: bytes, db=None):
+        """Cache a result in memory and, when a database is given, in upload_cache"""
+        if not self.enabled or len(result) > self.max_result_bytes:
+            return
+        with self._lock:
+            self._remember(content_hash, original_id, result, time.time())
+        if db:
+            db.store_cached_result(content_hash, original_id, result, self.ttl)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache hit/miss counters and memory usage"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl
+            }
+
+    def _remember(self, content_hash: str, original_id: Optional[int], result: bytes, created_at: float):
+        if content_hash in self._entries:
+            self._evict(content_hash)
+        self._entries[content_hash] = (created_at, original_id, result)
+        self._size += len(result)
+        while self._size > self.max_bytes and self._entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, content_hash: str):
+        _, _, result = self._entries.pop(content_hash)
+        self._size -= len(result)
@@ -1,34 +1,268 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+import json
+import logging
 import os
-from typing import List, Dict
+import re
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
+
+from .entry import ENTRY_FIELDS, Entry
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Columns written for each normalized entry, in COPY / INSERT order
+NORMALIZED_COLUMNS = ENTRY_FIELDS + ('original_id',)
+
+# Fields of the entries returned by search_normalized
+SEARCH_COLUMNS = ('id', 'firstname', 'lastname', 'phonenumber', 'zipcode', 'color', 'original_id', 'source_line')
+
+# Bulk write methods for insert_normalized_data
+INSERT_METHODS = ('copy', 'batch', 'row')
+
+# Layouts for original data: one JSONB blob per upload, or one original_rows row per CSV line
+ORIGINAL_STORAGES = ('blob', 'rows')
+
+# Range partitioning of the upload tables on upload_timestamp: 'none' keeps
+# plain tables, 'monthly' / 'daily' create one partition per period
+PARTITIONINGS = ('none', 'monthly', 'daily')
+
+# Tables partitioned when partitioning is enabled; every row of an upload
+# shares its transaction's CURRENT_TIMESTAMP, so an upload lives in one partition
+PARTITIONED_TABLES = ('original_data', 'original_rows', 'normalized_data')
+
+# Range of a partition as shown by pg_get_expr(relpartbound)
+_PARTITION_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Start of the newest partition per process; uploads check the partitions
+# again once the clock reaches it
+_partitions_refresh_at: Optional[datetime] = None
+
+# Escapes for PostgreSQL COPY text format
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class FeedKeyError(ValueError):
+    """A feed was uploaded before with different key fields"""
+
+
+class CopyBuffer:
+    """
+    File-like object that feeds rows to COPY ... FROM STDIN in text format
+    Rows are formatted lazily from an iterator, so only one read() worth of
+    data is buffered at a time
+    """
+    
+    def __init__(self, rows: Iterable[tuple]):
+        self._lines = (self.format_row(row) for row in rows)
+        self._buffer = ''
+    
+    @staticmethod
+    def format_row(row: tuple) -> str:
+        """Format one row as a COPY text line (None becomes NULL)"""
+        return '\t'.join(
+            '\\N' if value is None else str(value).translate(_COPY_ESCAPES)
+            for value in row
+        ) + '\n'
+    
+    def read(self, size: int = -1) -> str:
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        if size < 0 or length < size:
+            for line in self._lines:
+                chunks.append(line)
+                length += len(line)
+                if 0 <= size <= length:
+                    break
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def connection_params() -> Dict[str, str]:
+    """PostgreSQL connection parameters from the environment"""
+    return {
+        'host': os.getenv("DB_HOST", "localhost"),
+        'database': os.getenv("DB_NAME", "streaver_db"),
+        'user': os.getenv("DB_USER", "postgres"),
+        'password': os.getenv("DB_PASSWORD", "postgres"),
+        'port': os.getenv("DB_PORT", "5432")
+    }
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections
+    Wraps ThreadedConnectionPool so callers wait for a free connection instead
+    of failing when all maxconn connections are checked out, and keeps usage metrics
+    
+    A lazy pool connects on first use instead of in the constructor, and
+    retries on every later getconn while the database cannot be reached, so
+    a service started before PostgreSQL picks it up once it is back
+    """
+    
+    def __init__(self, minconn: int = None, maxconn: int = None, timeout: float = None, lazy: bool = False):
+        self.minconn = minconn or int(os.getenv("DB_POOL_MIN", "1"))
+        self.maxconn = maxconn or int(os.getenv("DB_POOL_MAX", "10"))
+        # Seconds to wait for a free connection, None waits forever
+        self.timeout = timeout if timeout is not None else float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self._pool = None
+        self._open_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        if not lazy:
+            self.open()
+    
+    @property
+    def connected(self) -> bool:
+        """Whether the underlying pool has been created"""
+        return self._pool is not None
+    
+    def open(self) -> ThreadedConnectionPool:
+        """Create the underlying pool unless it exists, raises if the database cannot be reached"""
+        with self._open_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **connection_params())
+            return self._pool
+    
+    def getconn(self):
+        """Borrow a connection, waiting up to timeout seconds for one to be free"""
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self.waiting -= 1
+        if not acquired:
+            raise PoolError(f"No free connection after {self.timeout}s")
+        try:
+            conn = (self._pool or self.open()).getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+        return conn
+    
+    def putconn(self, conn):
+        """Return a borrowed connection, discarding it if it is broken"""
+        close = bool(conn.closed)
+        if not close and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+    
+    def stats(self) -> Dict[str, int]:
+        """Pool usage metrics"""
+        with self._lock:
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'connected': int(self.connected),
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts
+            }
+    
+    def closeall(self):
+        """Close every connection in the pool"""
+        if self._pool is not None:
+            self._pool.closeall()
+
+
+def period_start(moment: datetime, partitioning: str) -> datetime:
+    """Start of the partition period (day or month) a timestamp falls in"""
+    day = datetime(moment.year, moment.month, moment.day)
+    return day if partitioning == 'daily' else day.replace(day=1)
+
+
+def next_period(moment: datetime, partitioning: str) -> datetime:
+    """Start of the partition period after the one a timestamp falls in"""
+    start = period_start(moment, partitioning)
+    if partitioning == 'daily':
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
 
 class DatabaseManager:
     """Manages PostgreSQL database connections and operations"""
     
-    def __init__(self):
+    def __init__(self, batch_size: int = None, pool: ConnectionPool = None, original_storage: str = None,
+                 partitioning: str = None):
         self.conn = None
         self.cursor = None
+        # Rows per execute_values page
+        self.batch_size = batch_size or int(os.getenv("DB_BATCH_SIZE", "5000"))
+        # When set, connections are borrowed from the pool instead of opened
+        self.pool = pool
+        # Layout used by insert_original_frame / append_original_frame
+        self.original_storage = original_storage or os.getenv("ORIGINAL_STORAGE", "blob")
+        if self.original_storage not in ORIGINAL_STORAGES:
+            raise ValueError(f"Unknown original storage '{self.original_storage}', expected one of {ORIGINAL_STORAGES}")
+        # Keep a compressed copy of the uploaded file for byte-exact replay
+        self.keep_raw_file = os.getenv("ORIGINAL_KEEP_FILE", "0") == "1"
+        # Partitioning used when create_tables creates the upload tables
+        self.partitioning = partitioning or os.getenv("DB_PARTITIONING", "none")
+        if self.partitioning not in PARTITIONINGS:
+            raise ValueError(f"Unknown partitioning '{self.partitioning}', expected one of {PARTITIONINGS}")
+        # Periods created ahead of the current one
+        self.partitions_ahead = int(os.getenv("DB_PARTITIONS_AHEAD", "3"))
         
+    @timed('db_connect')
     def connect(self):
         """Establish connection to PostgreSQL database"""
         try:
-            self.conn = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                database=os.getenv("DB_NAME", "streaver_db"),
-                user=os.getenv("DB_USER", "postgres"),
-                password=os.getenv("DB_PASSWORD", "postgres"),
-                port=os.getenv("DB_PORT", "5432")
-            )
+            if self.pool:
+                self.conn = self.pool.getconn()
+            else:
+                self.conn = psycopg2.connect(**connection_params())
             self.cursor = self.conn.cursor()
             return True
         except Exception as e:
-            print(f"Error connecting to database: {e}")
+            logger.error("Error connecting to database: %s", e)
+            return False
+    
+    @timed('db_ping')
+    def ping(self) -> bool:
+        """Check that the connection is alive"""
+        try:
+            self.cursor.execute("SELECT 1")
+            self.cursor.fetchone()
+            return True
+        except Exception as e:
+            logger.warning("Database ping failed: %s", e)
             return False
     
     def create_tables(self):
         """Create the original and normalized data tables"""
         try:
+            # A new database gets the upload tables partitioned when configured;
+            # existing plain tables are kept as they are
+            if self.partitioning != 'none':
+                self.cursor.execute("SELECT to_regclass('original_data')")
+                if self.cursor.fetchone()[0] is None:
+                    self._create_partitioned_tables()
+            
             # Table for original data
             self.cursor.execute("""
                 CREATE TABLE IF NOT EXISTS original_data (
@@ -52,80 +286,762 @@ class DatabaseManager:
                 )
             """)
             
+            # Row-level layout for original data: column names and the optional
+            # compressed file live on original_data, each CSV line in original_rows
+            self.cursor.execute("ALTER TABLE original_data ALTER COLUMN raw_data DROP NOT NULL")
+            self.cursor.execute("ALTER TABLE original_data ADD COLUMN IF NOT EXISTS columns JSONB")
+            self.cursor.execute("ALTER TABLE original_data ADD COLUMN IF NOT EXISTS raw_file BYTEA")
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS original_rows (
+                    original_id INTEGER REFERENCES original_data(id),
+                    line_number INTEGER NOT NULL,
+                    data JSONB NOT NULL,
+                    PRIMARY KEY (original_id, line_number)
+                )
+            """)
+            
+            # CSV line an entry came from (same numbering as errors and original_rows)
+            self.cursor.execute("ALTER TABLE normalized_data ADD COLUMN IF NOT EXISTS source_line INTEGER")
+            
+            # Summary of normalized_data colors, maintained by insert_normalized_data
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS color_counts (
+                    color VARCHAR(50) PRIMARY KEY,
+                    count BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+            
+            # Results of earlier uploads keyed on a hash of the file contents
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS upload_cache (
+                    content_hash CHAR(64) PRIMARY KEY,
+                    original_id INTEGER REFERENCES original_data(id),
+                    result BYTEA NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Delta uploads: the key fields of each feed, and the content hash and
+            # current normalized_data row of every record of its last snapshot
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS feeds (
+                    feed VARCHAR(255) PRIMARY KEY,
+                    key_fields VARCHAR(255) NOT NULL,
+                    original_id INTEGER,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS feed_rows (
+                    feed VARCHAR(255) NOT NULL REFERENCES feeds(feed),
+                    record_key TEXT NOT NULL,
+                    row_hash BIGINT NOT NULL,
+                    normalized_id INTEGER,
+                    PRIMARY KEY (feed, record_key)
+                )
+            """)
+            
+            # Lookups and keyset pagination on normalized_data (search_normalized).
+            # Names are ordered by code point (COLLATE "C"), the order entries
+            # are sorted in, which also lets lastname prefix LIKEs use the index
+            self.cursor.execute("""
+                CREATE INDEX IF NOT EXISTS normalized_data_name_idx ON normalized_data
+                ((lower(lastname)) COLLATE "C", (lower(firstname)) COLLATE "C", id)
+            """)
+            for column in ('zipcode', 'phonenumber', 'original_id'):
+                self.cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS normalized_data_{column}_idx ON normalized_data ({column})"
+                )
+            
+            # Seed the summary for databases created before it existed
+            self.cursor.execute("SELECT EXISTS (SELECT 1 FROM color_counts)")
+            if not self.cursor.fetchone()[0]:
+                self._rebuild_color_counts()
+            
+            if self.partitioning != 'none':
+                if self.partitioned_tables():
+                    self._create_partitions()
+                else:
+                    logger.warning("DB_PARTITIONING=%s but the tables already exist unpartitioned, "
+                                   "keeping them as they are", self.partitioning)
+            
             self.conn.commit()
             return True
         except Exception as e:
-            print(f"Error creating tables: {e}")
+            logger.error("Error creating tables: %s", e)
             self.conn.rollback()
             return False
     
-    def insert_original_data(self, data: List[Dict]) -> int:
+    def _create_partitioned_tables(self):
+        """
+        Upload tables range-partitioned on upload_timestamp (caller commits)
+        The primary keys include the partition key, so nothing can reference
+        original_data(id) alone and these tables go without foreign keys
+        """
+        self.cursor.execute("""
+            CREATE TABLE original_data (
+                id SERIAL,
+                upload_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                raw_data JSONB,
+                columns JSONB,
+                raw_file BYTEA,
+                PRIMARY KEY (id, upload_timestamp)
+            ) PARTITION BY RANGE (upload_timestamp)
+        """)
+        self.cursor.execute("""
+            CREATE TABLE original_rows (
+                original_id INTEGER NOT NULL,
+                line_number INTEGER NOT NULL,
+                data JSONB NOT NULL,
+                upload_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (original_id, line_number, upload_timestamp)
+            ) PARTITION BY RANGE (upload_timestamp)
+        """)
+        self.cursor.execute("""
+            CREATE TABLE normalized_data (
+                id SERIAL,
+                upload_timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                firstname VARCHAR(255),
+                lastname VARCHAR(255),
+                phonenumber VARCHAR(20),
+                zipcode VARCHAR(10),
+                color VARCHAR(50),
+                original_id INTEGER,
+                source_line INTEGER,
+                PRIMARY KEY (id, upload_timestamp)
+            ) PARTITION BY RANGE (upload_timestamp)
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS upload_cache (
+                content_hash CHAR(64) PRIMARY KEY,
+                original_id INTEGER,
+                result BYTEA NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    def partitioned_tables(self) -> List[str]:
+        """The upload tables that are partitioned in this database"""
+        self.cursor.execute("""
+            SELECT relname FROM pg_class
+            WHERE oid IN (SELECT to_regclass(name) FROM unnest(%s) AS name) AND relkind = 'p'
+        """, (list(PARTITIONED_TABLES),))
+        found = {row[0] for row in self.cursor.fetchall()}
+        return [table for table in PARTITIONED_TABLES if table in found]
+    
+    def partitions(self, table: str) -> List[Tuple[str, datetime, datetime]]:
+        """(name, start, end) of the range partitions of a table, oldest first"""
+        self.cursor.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, (table,))
+        partitions = []
+        for name, bound in self.cursor.fetchall():
+            match = _PARTITION_BOUND.search(bound or '')
+            if match:
+                partitions.append((name, datetime.fromisoformat(match[1]), datetime.fromisoformat(match[2])))
+        return sorted(partitions, key=lambda partition: partition[1])
+    
+    def create_partitions(self, table: str, start: datetime, end: datetime) -> List[str]:
+        """
+        Create the missing partitions of a table from start up to end, one per
+        period (caller commits). Ranges already covered are skipped and gaps
+        are filled up to the next existing partition, so changing the
+        granularity never leaves holes or overlaps. Returns the names created
+        """
+        covered = self.partitions(table)
+        created = []
+        lower = start
+        while lower < end:
+            upper = next_period(lower, self.partitioning)
+            clashes = [p for p in covered if p[1] < upper and lower < p[2]]
+            if any(p[1] <= lower for p in clashes):
+                lower = max(p[2] for p in clashes if p[1] <= lower)
+                continue
+            if clashes:
+                # Fill the gap up to the next existing partition
+                upper = min(p[1] for p in clashes)
+            name = f"{table}_p{lower:%Y%m%d}"
+            self.cursor.execute(
+                sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+                    sql.Identifier(name), sql.Identifier(table)
+                ),
+                (lower, upper)
+            )
+            covered.append((name, lower, upper))
+            created.append(name)
+            lower = upper
+        return created
+    
+    def _create_partitions(self) -> List[str]:
+        """Partitions for the current period and partitions_ahead more (caller commits)"""
+        global _partitions_refresh_at
+        self.cursor.execute("SELECT LOCALTIMESTAMP")
+        now = self.cursor.fetchone()[0]
+        start = period_start(now, self.partitioning)
+        end = start
+        for _ in range(self.partitions_ahead + 1):
+            end = next_period(end, self.partitioning)
+        created = []
+        for table in self.partitioned_tables():
+            created += self.create_partitions(table, start, end)
+        if created:
+            logger.info("Created partitions %s", ', '.join(created))
+        _partitions_refresh_at = period_start(end - timedelta(microseconds=1), self.partitioning)
+        return created
+    
+    def ensure_partitions(self) -> List[str]:
+        """Create upcoming partitions of the partitioned upload tables, returns the names created"""
+        try:
+            created = self._create_partitions()
+            self.conn.commit()
+            return created
+        except Exception as e:
+            logger.error("Error creating partitions: %s", e)
+            self.conn.rollback()
+            return []
+    
+    def _refresh_partitions(self):
+        """
+        Before an upload starts, create the next partitions once the newest one
+        is reached, so long-running processes never run out of them. Runs in
+        its own short transaction, never inside an upload's
+        """
+        if self.partitioning == 'none':
+            return
+        if _partitions_refresh_at is not None and datetime.now() < _partitions_refresh_at:
+            return
+        if self.conn.get_transaction_status() == TRANSACTION_STATUS_IDLE:
+            self.ensure_partitions()
+    
+    def drop_partitions(self, before: datetime, dry_run: bool = False) -> List[str]:
+        """
+        Drop the partitions of the upload tables that end on or before a
+        timestamp, instead of DELETEing their rows
+
+        color_counts is decremented by the colors of the dropped
+        normalized_data partitions, and upload_cache entries and feed records
+        pointing to dropped rows are removed, in the same transaction as the
+        drops.
+        Returns the names of the partitions dropped (or that would be)
+        """
+        expired = {
+            table: [name for name, _, end in self.partitions(table) if end <= before]
+            for table in self.partitioned_tables()
+        }
+        names = [name for table in PARTITIONED_TABLES for name in expired.get(table, [])]
+        if dry_run or not names:
+            self.conn.commit()
+            return names
+        try:
+            for name in expired.get('normalized_data', []):
+                self.cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(sql.Identifier(name)))
+                self.cursor.execute(sql.SQL("""
+                    SELECT color, COUNT(*) FROM {}
+                    WHERE color IS NOT NULL AND color != ''
+                    GROUP BY color
+                """).format(sql.Identifier(name)))
+                # Sorted so concurrent uploads lock the summary rows in the same order
+                rows = sorted(self.cursor.fetchall())
+                if rows:
+                    execute_values(self.cursor, """
+                        UPDATE color_counts SET count = color_counts.count - dropped.count
+                        FROM (VALUES %s) AS dropped (color, count)
+                        WHERE color_counts.color = dropped.color
+                    """, rows, page_size=self.batch_size)
+                # Feed records whose entry is dropped come back as new in the next snapshot
+                self.cursor.execute(sql.SQL(
+                    "DELETE FROM feed_rows WHERE normalized_id IN (SELECT id FROM {})"
+                ).format(sql.Identifier(name)))
+            for name in expired.get('original_data', []):
+                self.cursor.execute(sql.SQL(
+                    "DELETE FROM upload_cache WHERE original_id IN (SELECT id FROM {})"
+                ).format(sql.Identifier(name)))
+            for name in names:
+                self.cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+            self.conn.commit()
+            logger.info("Dropped partitions %s", ', '.join(names))
+            return names
+        except Exception as e:
+            logger.error("Error dropping partitions: %s", e)
+            self.conn.rollback()
+            raise
+    
+    def insert_original_data(self, data: List[Dict], commit: bool = True) -> int:
         """Insert original CSV data"""
+        self._refresh_partitions()
         try:
-            import json
             self.cursor.execute(
                 "INSERT INTO original_data (raw_data) VALUES (%s) RETURNING id",
                 (json.dumps(data),)
             )
             original_id = self.cursor.fetchone()[0]
-            self.conn.commit()
+            if commit:
+                self.conn.commit()
             return original_id
         except Exception as e:
-            print(f"Error inserting original data: {e}")
+            logger.error("Error inserting original data: %s", e)
             self.conn.rollback()
             return None
     
-    def insert_normalized_data(self, entries: List[Dict], original_id: int):
-        """Insert normalized data"""
-        try:
-            print(f"DEBUG: Inserting {len(entries)} entries with original_id {original_id}")
-            for i, entry in enumerate(entries):
-                print(f"DEBUG: Entry {i}: {entry}")
-                self.cursor.execute("""
-                    INSERT INTO normalized_data 
-                    (firstname, lastname, phonenumber, zipcode, color, original_id)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    entry.get('firstname'),
-                    entry.get('lastname'),
-                    entry.get('phonenumber'),
-                    entry.get('zipcode'),
-                    entry.get('color'),
-                    original_id
-                ))
-            self.conn.commit()
-            print(f"DEBUG: Successfully inserted {len(entries)} entries")
+    @timed('db_insert_original')
+    def insert_original_frame(self, df, raw_file: bytes = None, commit: bool = True,
+                              storage: str = None) -> int:
+        """
+        Insert an uploaded DataFrame as original data using the configured layout
+        (or storage, when given); raw_file (the uploaded bytes) is stored
+        compressed when ORIGINAL_KEEP_FILE=1
+        """
+        if (storage or self.original_storage) == 'blob':
+            return self.insert_original_data(df.to_dict('records'), commit=commit)
+        self._refresh_partitions()
+        try:
+            compressed = zlib.compress(raw_file) if raw_file is not None and self.keep_raw_file else None
+            self.cursor.execute(
+                "INSERT INTO original_data (columns, raw_file) VALUES (%s, %s) RETURNING id",
+                (json.dumps([str(col) for col in df.columns]),
+                 psycopg2.Binary(compressed) if compressed is not None else None)
+            )
+            original_id = self.cursor.fetchone()[0]
+            self._copy_original_rows(original_id, df)
+            if commit:
+                self.conn.commit()
+            return original_id
+        except Exception as e:
+            logger.error("Error inserting original rows: %s", e)
+            self.conn.rollback()
+            return None
+    
+    @timed('db_insert_original')
+    def append_original_frame(self, original_id: int, df, commit: bool = True) -> bool:
+        """
+        Append a chunk of an upload to its original_rows. Uploads that grow by
+        chunks are always stored as rows: appending to the JSONB blob rewrites
+        the whole document on every chunk
+        """
+        try:
+            self._copy_original_rows(original_id, df)
+            if commit:
+                self.conn.commit()
             return True
         except Exception as e:
-            print(f"Error inserting normalized data: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error("Error appending original rows: %s", e)
             self.conn.rollback()
             return False
     
-    def get_color_counts(self) -> Dict[str, int]:
-        """Get count of each color from normalized_data table"""
+    def _copy_original_rows(self, original_id: int, df):
+        """COPY one original_rows row per DataFrame row, keyed on its line number"""
+        rows = (
+            (original_id, line, json.dumps(values, default=str))
+            for line, values in zip(df.index.tolist(), df.to_numpy(dtype=object).tolist())
+        )
+        self.cursor.copy_expert(
+            "COPY original_rows (original_id, line_number, data) FROM STDIN",
+            CopyBuffer(rows),
+            size=65536
+        )
+    
+    @timed('db_insert_normalized')
+    def insert_normalized_data(self, entries: List[Entry], original_id: int, method: str = 'copy',
+                               commit: bool = True, lines: List[int] = None, ids: List[int] = None) -> bool:
+        """
+        Insert normalized data
+        
+        Args:
+            entries: Normalized entries (Entry records)
+            original_id: ID of the original_data record they come from
+            method: 'copy' (COPY FROM STDIN, falls back to 'batch' if COPY fails),
+                    'batch' (execute_values pages of batch_size rows) or 'row' (one INSERT per entry)
+            commit: Commit when done; pass False to keep the whole upload in one transaction
+            lines: Source line of each entry, stored in source_line
+            ids: Ids reserved with reserve_normalized_ids, instead of the defaults
+        """
+        if method not in INSERT_METHODS:
+            raise ValueError(f"Unknown insert method '{method}', expected one of {INSERT_METHODS}")
         try:
-            self.cursor.execute("""
-                SELECT color, COUNT(*) as count
+            if method == 'copy':
+                # Savepoint so a failed COPY does not abort the surrounding transaction
+                self.cursor.execute("SAVEPOINT bulk_copy")
+                try:
+                    self._copy_normalized(entries, original_id, lines, ids)
+                    self.cursor.execute("RELEASE SAVEPOINT bulk_copy")
+                except psycopg2.Error as e:
+                    logger.warning("COPY failed, falling back to batched inserts: %s", e)
+                    self.cursor.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+                    self._batch_insert_normalized(entries, original_id, lines, ids)
+            elif method == 'batch':
+                self._batch_insert_normalized(entries, original_id, lines, ids)
+            else:
+                columns = self._normalized_columns(lines, ids)
+                for row in self._normalized_rows(entries, original_id, lines, ids):
+                    self.cursor.execute(f"""
+                        INSERT INTO normalized_data ({', '.join(columns)})
+                        VALUES ({', '.join(['%s'] * len(columns))})
+                    """, row)
+            self._add_color_counts(entry.color for entry in entries)
+            if commit:
+                self.conn.commit()
+            return True
+        except Exception as e:
+            logger.exception("Error inserting normalized data: %s", e)
+            self.conn.rollback()
+            return False
+    
+    @staticmethod
+    def _normalized_columns(lines: List[int] = None, ids: List[int] = None) -> Tuple[str, ...]:
+        """normalized_data columns written, with source_line / id when lines / ids are known"""
+        columns = NORMALIZED_COLUMNS + ('source_line',) if lines is not None else NORMALIZED_COLUMNS
+        return columns + ('id',) if ids is not None else columns
+    
+    @staticmethod
+    def _normalized_rows(entries: Iterable[Entry], original_id: int, lines: List[int] = None,
+                         ids: List[int] = None) -> Iterator[tuple]:
+        """Rows for normalized_data in _normalized_columns order"""
+        for i, entry in enumerate(entries):
+            row = entry.values() + (original_id,)
+            if lines is not None:
+                row += (lines[i],)
+            yield row + (ids[i],) if ids is not None else row
+    
+    def _copy_normalized(self, entries: Iterable[Entry], original_id: int, lines: List[int] = None,
+                         ids: List[int] = None):
+        """Stream entries into normalized_data with COPY FROM STDIN"""
+        self.cursor.copy_expert(
+            f"COPY normalized_data ({', '.join(self._normalized_columns(lines, ids))}) FROM STDIN",
+            CopyBuffer(self._normalized_rows(entries, original_id, lines, ids)),
+            size=65536
+        )
+    
+    def _batch_insert_normalized(self, entries: Iterable[Entry], original_id: int, lines: List[int] = None,
+                                 ids: List[int] = None):
+        """Insert entries into normalized_data with multi-row INSERTs"""
+        execute_values(
+            self.cursor,
+            f"INSERT INTO normalized_data ({', '.join(self._normalized_columns(lines, ids))}) VALUES %s",
+            self._normalized_rows(entries, original_id, lines, ids),
+            page_size=self.batch_size
+        )
+    
+    def _add_color_counts(self, colors: Iterable[str], sign: int = 1):
+        """Add (or with sign=-1 subtract) the colors of a batch of entries to color_counts (same transaction)"""
+        counts = Counter(colors)
+        # Sorted so concurrent uploads lock the summary rows in the same order
+        rows = sorted((color, sign * count) for color, count in counts.items() if color)
+        if rows:
+            execute_values(self.cursor, """
+                INSERT INTO color_counts (color, count) VALUES %s
+                ON CONFLICT (color) DO UPDATE SET count = color_counts.count + EXCLUDED.count
+            """, rows, page_size=self.batch_size)
+    
+    def _rebuild_color_counts(self):
+        """Recompute color_counts from normalized_data (caller commits)"""
+        # Block concurrent inserts so no batch is lost or counted twice
+        self.cursor.execute("LOCK TABLE normalized_data IN SHARE MODE")
+        self.cursor.execute("DELETE FROM color_counts")
+        self.cursor.execute("""
+            INSERT INTO color_counts (color, count)
+            SELECT color, COUNT(*)
+            FROM normalized_data
+            WHERE color IS NOT NULL AND color != ''
+            GROUP BY color
+        """)
+    
+    def rebuild_color_counts(self) -> bool:
+        """Recompute the color_counts summary from scratch"""
+        try:
+            self._rebuild_color_counts()
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error("Error rebuilding color counts: %s", e)
+            self.conn.rollback()
+            return False
+    
+    def reconcile_color_counts(self, fix: bool = False) -> Dict[str, Tuple[int, int]]:
+        """
+        Compare color_counts with a full GROUP BY over normalized_data
+        Returns {color: (stored, actual)} for every color that drifted; with fix=True
+        the summary is rebuilt when drift is found
+        """
+        self.cursor.execute("""
+            SELECT COALESCE(s.color, a.color), COALESCE(s.count, 0), COALESCE(a.count, 0)
+            FROM color_counts s
+            FULL OUTER JOIN (
+                SELECT color, COUNT(*) AS count
                 FROM normalized_data
                 WHERE color IS NOT NULL AND color != ''
                 GROUP BY color
+            ) a ON a.color = s.color
+            WHERE COALESCE(s.count, 0) != COALESCE(a.count, 0)
+        """)
+        drift = {row[0]: (row[1], row[2]) for row in self.cursor.fetchall()}
+        self.conn.commit()
+        if drift and fix:
+            self.rebuild_color_counts()
+        return drift
+    
+    def lock_feed(self, feed: str, key_fields: Tuple[str, ...]):
+        """
+        Start a delta upload of a feed (caller's transaction): registers the
+        feed with its key fields and locks it, so uploads of the same feed run
+        one at a time. FeedKeyError if the feed was keyed on other fields
+        """
+        key = ','.join(key_fields)
+        self.cursor.execute("""
+            INSERT INTO feeds (feed, key_fields) VALUES (%s, %s)
+            ON CONFLICT (feed) DO NOTHING
+        """, (feed, key))
+        self.cursor.execute("SELECT key_fields FROM feeds WHERE feed = %s FOR UPDATE", (feed,))
+        stored = self.cursor.fetchone()[0]
+        if stored != key:
+            self.conn.rollback()
+            raise FeedKeyError(f"Feed '{feed}' is keyed on {stored}, not {key}")
+    
+    @timed('db_feed_diff')
+    def diff_feed_snapshot(self, feed: str, records: Iterable[Tuple[str, int, int]]
+                           ) -> Tuple[List[Tuple[int, Optional[int], bool]], List[Tuple[str, Optional[int]]]]:
+        """
+        Compare a snapshot of a feed with the stored one (caller's transaction)
+        
+        records are (record_key, row_hash, line) with unique keys; they are
+        loaded into a temporary table with COPY and joined with feed_rows, so
+        only the differences come back to Python. Call after lock_feed and
+        follow with save_feed_rows in the same transaction
+        
+        Returns:
+            Tuple of (line, normalized_id it replaces, is_new) for every new or
+            changed record, and (record_key, normalized_id) for every stored
+            record missing from the snapshot
+        """
+        self.cursor.execute("""
+            CREATE TEMP TABLE feed_snapshot (
+                record_key TEXT NOT NULL,
+                row_hash BIGINT NOT NULL,
+                line INTEGER NOT NULL
+            ) ON COMMIT DROP
+        """)
+        self.cursor.copy_expert(
+            "COPY feed_snapshot (record_key, row_hash, line) FROM STDIN",
+            CopyBuffer(records),
+            size=65536
+        )
+        self.cursor.execute("ANALYZE feed_snapshot")
+        self.cursor.execute("""
+            CREATE TEMP TABLE feed_changes ON COMMIT DROP AS
+            SELECT s.line, s.record_key, s.row_hash, f.normalized_id AS old_id, f.record_key IS NULL AS is_new
+            FROM feed_snapshot s
+            LEFT JOIN feed_rows f ON f.feed = %s AND f.record_key = s.record_key
+            WHERE f.row_hash IS DISTINCT FROM s.row_hash
+        """, (feed,))
+        self.cursor.execute("SELECT line, old_id, is_new FROM feed_changes ORDER BY line")
+        changes = self.cursor.fetchall()
+        self.cursor.execute("""
+            SELECT f.record_key, f.normalized_id
+            FROM feed_rows f
+            WHERE f.feed = %s
+              AND NOT EXISTS (SELECT 1 FROM feed_snapshot s WHERE s.record_key = f.record_key)
+        """, (feed,))
+        gone = self.cursor.fetchall()
+        return changes, gone
+    
+    def reserve_normalized_ids(self, count: int) -> List[int]:
+        """Take count ids from the normalized_data sequence, to know the ids of entries before COPYing them"""
+        if not count:
+            return []
+        self.cursor.execute("""
+            SELECT nextval(pg_get_serial_sequence('normalized_data', 'id'))
+            FROM generate_series(1, %s)
+        """, (count,))
+        return [row[0] for row in self.cursor.fetchall()]
+    
+    @timed('db_delete_normalized')
+    def delete_normalized(self, ids: List[int]) -> Dict[int, Dict]:
+        """Delete normalized_data rows by id and their colors from color_counts (caller's transaction), returns them by id"""
+        if not ids:
+            return {}
+        self.cursor.execute("""
+            DELETE FROM normalized_data WHERE id = ANY(%s)
+            RETURNING id, firstname, lastname, phonenumber, zipcode, color, original_id, source_line
+        """, (list(ids),))
+        removed = {row[0]: dict(zip(SEARCH_COLUMNS, row)) for row in self.cursor.fetchall()}
+        self._add_color_counts((row['color'] for row in removed.values()), sign=-1)
+        return removed
+    
+    @timed('db_feed_save')
+    def save_feed_rows(self, feed: str, entry_ids: Dict[int, int], gone: List[str], original_id: Optional[int]):
+        """
+        Store the outcome of a delta upload (caller commits): the hash and the
+        entry id (by line, None for rejected lines) of every new or changed
+        record found by diff_feed_snapshot, and forget the gone ones
+        """
+        self.cursor.execute("""
+            CREATE TEMP TABLE feed_entries (line INTEGER PRIMARY KEY, normalized_id INTEGER NOT NULL) ON COMMIT DROP
+        """)
+        self.cursor.copy_expert(
+            "COPY feed_entries (line, normalized_id) FROM STDIN",
+            CopyBuffer(entry_ids.items()),
+            size=65536
+        )
+        self.cursor.execute("""
+            INSERT INTO feed_rows (feed, record_key, row_hash, normalized_id)
+            SELECT %s, c.record_key, c.row_hash, e.normalized_id
+            FROM feed_changes c
+            LEFT JOIN feed_entries e ON e.line = c.line
+            ON CONFLICT (feed, record_key) DO UPDATE
+            SET row_hash = EXCLUDED.row_hash, normalized_id = EXCLUDED.normalized_id
+        """, (feed,))
+        if gone:
+            self.cursor.execute(
+                "DELETE FROM feed_rows WHERE feed = %s AND record_key = ANY(%s)",
+                (feed, list(gone))
+            )
+        self.cursor.execute(
+            "UPDATE feeds SET original_id = %s, updated_at = CURRENT_TIMESTAMP WHERE feed = %s",
+            (original_id, feed)
+        )
+    
+    @timed('db_cache_get')
+    def get_cached_result(self, content_hash: str, ttl: float) -> Optional[Tuple[int, bytes, float]]:
+        """Cached (original_id, result, age in seconds) for an upload hash, if not older than ttl seconds"""
+        try:
+            self.cursor.execute("""
+                SELECT original_id, result, EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - created_at)
+                FROM upload_cache
+                WHERE content_hash = %s
+                  AND created_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """, (content_hash, ttl))
+            row = self.cursor.fetchone()
+            self.conn.commit()
+            if row is None:
+                return None
+            return row[0], bytes(row[1]), float(row[2])
+        except Exception as e:
+            logger.error("Error reading upload cache: %s", e)
+            self.conn.rollback()
+            return None
+    
+    @timed('db_cache_put')
+    def store_cached_result(self, content_hash: str, original_id: int, result: bytes, ttl: float) -> bool:
+        """Store an upload result in upload_cache, dropping expired entries"""
+        try:
+            self.cursor.execute(
+                "DELETE FROM upload_cache WHERE created_at <= CURRENT_TIMESTAMP - make_interval(secs => %s)",
+                (ttl,)
+            )
+            self.cursor.execute("""
+                INSERT INTO upload_cache (content_hash, original_id, result)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (content_hash) DO UPDATE
+                SET original_id = EXCLUDED.original_id, result = EXCLUDED.result, created_at = CURRENT_TIMESTAMP
+            """, (content_hash, original_id, psycopg2.Binary(result)))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error("Error storing upload cache: %s", e)
+            self.conn.rollback()
+            return False
+    
+    @timed('db_commit')
+    def commit(self):
+        """Commit the current transaction"""
+        self.conn.commit()
+    
+    def rollback(self):
+        """Roll back the current transaction"""
+        self.conn.rollback()
+    
+    @timed('db_color_counts')
+    def get_color_counts(self) -> Dict[str, int]:
+        """Get count of each color from the color_counts summary table"""
+        try:
+            self.cursor.execute("""
+                SELECT color, count
+                FROM color_counts
+                WHERE count > 0
                 ORDER BY count DESC
             """)
             results = self.cursor.fetchall()
             color_dict = {row[0]: row[1] for row in results}
-            print(f"Color counts retrieved: {color_dict}")  # Debug
+            logger.debug("Color counts retrieved: %s", color_dict)
             return color_dict
         except Exception as e:
-            print(f"Error getting color counts: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error getting color counts: %s", e)
+            self.conn.rollback()
             return {}
     
+    @timed('db_search')
+    def search_normalized(
+        self,
+        lastname_prefix: str = None,
+        zipcode: str = None,
+        phonenumber: str = None,
+        color: str = None,
+        original_id: int = None,
+        limit: int = 50,
+        after: Tuple[str, str, int] = None
+    ) -> Tuple[List[Dict], Optional[Tuple[str, str, int]]]:
+        """
+        Normalized entries matching every given filter, ordered by lastname
+        and firstname (case-insensitive) then id
+        
+        Pages are read with keyset pagination: after is the sort key of the
+        last entry of the previous page, so every page is an index range scan
+        no matter how deep it is
+        
+        Returns:
+            Tuple of (up to limit entries, sort key to pass as after for the
+            next page, or None on the last page)
+        """
+        conditions = []
+        params = []
+        if lastname_prefix:
+            escaped = lastname_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append('lower(lastname) COLLATE "C" LIKE lower(%s)')
+            params.append(escaped + '%')
+        for column, value in (('zipcode', zipcode), ('phonenumber', phonenumber),
+                              ('color', color), ('original_id', original_id)):
+            if value is not None:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        if after:
+            conditions.append('(lower(lastname) COLLATE "C", lower(firstname) COLLATE "C", id) > (%s, %s, %s)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        try:
+            # One row more than asked tells whether there is a next page
+            self.cursor.execute(f"""
+                SELECT id, firstname, lastname, phonenumber, zipcode, color, original_id, source_line,
+                       lower(lastname), lower(firstname)
+                FROM normalized_data
+                {where}
+                ORDER BY lower(lastname) COLLATE "C", lower(firstname) COLLATE "C", id
+                LIMIT %s
+            """, params + [limit + 1])
+            rows = self.cursor.fetchall()
+            self.conn.commit()
+        except Exception as e:
+            logger.exception("Error searching normalized data: %s", e)
+            self.conn.rollback()
+            raise
+        
+        entries = [dict(zip(SEARCH_COLUMNS, row)) for row in rows[:limit]]
+        next_after = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_after = (last[-2], last[-1], last[0])
+        return entries, next_after
+    
     def close(self):
-        """Close database connection"""
+        """Close database connection, or return it to the pool"""
         if self.cursor:
-            self.cursor.close()
+            if not self.cursor.closed:
+                self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
+            if self.pool:
+                self.pool.putconn(self.conn)
+            else:
+                self.conn.close()
+            self.conn = None
@@ -0,0 +1,147 @@
+import logging
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .database import DatabaseManager
+from .metrics import record_rows, timer
+from .normalizer import DataNormalizer
+
+logger = logging.getLogger(__name__)
+
+# Normalized fields a feed's records can be keyed on
+KEY_FIELDS = ('phonenumber', 'zipcode', 'firstname', 'lastname', 'color')
+
+# Default key of a feed, comma separated KEY_FIELDS
+DELTA_KEY = os.getenv("DELTA_KEY", "phonenumber")
+
+# Joins the parts of a composite key
+_KEY_SEPARATOR = '\x1f'
+
+
+def parse_key_fields(spec: str = None) -> Tuple[str, ...]:
+    """Key fields from a comma separated list (DELTA_KEY by default); ValueError if unknown"""
+    fields = tuple(field.strip() for field in (spec or DELTA_KEY).split(',') if field.strip())
+    unknown = [field for field in fields if field not in KEY_FIELDS]
+    if not fields or unknown:
+        raise ValueError(f"Key fields must be a comma separated list of {', '.join(KEY_FIELDS)}")
+    return fields
+
+
+def record_keys(df: pd.DataFrame, csv_format: int, key_fields: Tuple[str, ...]) -> np.ndarray:
+    """
+    Key of every row from its normalized key fields, None when one of them is
+    invalid (such a row is always rejected, the key fields are all required).
+    Only the key fields are normalized here, the rest of an entry waits for
+    the rows that turn out to be new or changed
+    """
+    fields = DataNormalizer.normalized_fields(df, csv_format, key_fields)
+    if len(key_fields) == 1:
+        return fields[key_fields[0]]
+    parts = [fields[field] for field in key_fields]
+    return np.array([
+        None if None in values else _KEY_SEPARATOR.join(values)
+        for values in zip(*parts)
+    ], dtype=object)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of the raw values of every row, to spot changed records without normalizing them"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64)
+
+
+def apply_snapshot(
+    db: DatabaseManager,
+    feed: str,
+    df: pd.DataFrame,
+    csv_format: int,
+    key_fields: Tuple[str, ...],
+    frame: pd.DataFrame = None
+) -> Dict:
+    """
+    Apply a full snapshot of a feed as a delta against its previous upload (blocking)
+
+    Each row is identified by its key and compared with the stored snapshot
+    by a hash of its raw values, so only new and changed rows are normalized
+    and written. Entries of changed rows replace their previous ones, and
+    entries of records missing from the snapshot are deleted. Only the new
+    and changed rows are stored as the upload's original data. Rows with an
+    invalid key are always processed (they are rejected). When a key repeats,
+    the last row wins and the earlier ones are reported as duplicates.
+    Everything is one transaction, committed at the end.
+
+    Args:
+        db: Connected DatabaseManager
+        feed: Name of the feed the snapshot belongs to
+        df: Uploaded rows, as stored in original data
+        csv_format: Format of frame
+        key_fields: Fields that identify a record (see KEY_FIELDS)
+        frame: The columns of df the normalizer reads (see normalizer_frame), df by default
+
+    Returns:
+        Dict with the sorted entries of the new and changed rows, the lines
+        rejected among them, the entries deleted, the duplicate lines, the
+        number of inserted / changed / deleted / unchanged records (delta)
+        and the original_id of the upload
+
+    Raises:
+        FeedKeyError: The feed is keyed on other fields
+        RuntimeError: A database write failed and the upload was rolled back
+    """
+    frame = df if frame is None else frame
+    lines = df.index.to_numpy()
+    with timer('diff'):
+        keys = record_keys(frame, csv_format, key_fields)
+        hashes = row_hashes(frame)
+        keyed = pd.notna(keys)
+        duplicate = keyed & pd.Series(keys).duplicated(keep='last').to_numpy()
+        staged = keyed & ~duplicate
+
+    try:
+        db.lock_feed(feed, key_fields)
+        changes, gone = db.diff_feed_snapshot(
+            feed, zip(keys[staged].tolist(), hashes[staged].tolist(), lines[staged].tolist())
+        )
+        removed = db.delete_normalized(
+            [old_id for _, old_id, _ in changes if old_id] + [old_id for _, old_id in gone if old_id]
+        )
+
+        # New and changed rows, plus the ones without a valid key (rejected)
+        process = np.isin(lines, [line for line, _, _ in changes]) | ~keyed
+        part = frame[process]
+        with timer('normalize'):
+            entries, errors, entry_lines = DataNormalizer.process_csv_data(
+                part, csv_format=csv_format, with_lines=True
+            )
+        record_rows(part, errors, csv_format)
+
+        original_id = db.insert_original_frame(df[process], commit=False)
+        if original_id is None:
+            raise RuntimeError("Database write failed, the upload was rolled back")
+        ids = db.reserve_normalized_ids(len(entries))
+        if entries and not db.insert_normalized_data(entries, original_id, commit=False, lines=entry_lines, ids=ids):
+            raise RuntimeError("Database write failed, the upload was rolled back")
+        db.save_feed_rows(feed, dict(zip(entry_lines, ids)), [key for key, _ in gone], original_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    inserted = sum(1 for _, _, is_new in changes if is_new)
+    delta = {
+        'inserted': inserted,
+        'changed': len(changes) - inserted,
+        'deleted': len(gone),
+        'unchanged': int(staged.sum()) - len(changes),
+    }
+    logger.info("Feed %s: %s", feed, delta)
+    return {
+        'entries': entries,
+        'errors': errors,
+        'deleted': [removed[old_id] for _, old_id in gone if old_id in removed],
+        'duplicates': lines[duplicate].tolist(),
+        'delta': delta,
+        'original_id': original_id,
+    }
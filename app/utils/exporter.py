@@ -0,0 +1,199 @@
+import json
+import os
+import zipfile
+from itertools import islice
+from operator import attrgetter
+from typing import BinaryIO, Iterable, Iterator, List
+
+from .entry import ENTRY_FIELDS, Entry
+from .json_writer import entry_encoder, write_result_json
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:  # optional, needed for parquet and arrow
+    pyarrow = None
+
+# Output formats of a result; json is result.json with the errors inline,
+# the others hold only the entries and leave the errors to a sidecar file
+EXPORT_FORMATS = ('json', 'ndjson', 'parquet', 'arrow')
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+EXTENSIONS = {'json': '.json', 'ndjson': '.ndjson', 'parquet': '.parquet', 'arrow': '.arrow'}
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+# Columns with few distinct values, stored dictionary encoded
+DICTIONARY_FIELDS = ('zipcode', 'color')
+
+# Entries per Arrow record batch / Parquet row group
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "131072"))
+
+# Parquet compression codec: snappy, zstd, gzip or none
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "snappy")
+
+
+def available_formats() -> List[str]:
+    """Export formats usable here, the columnar ones need pyarrow"""
+    return [fmt for fmt in EXPORT_FORMATS if pyarrow is not None or fmt not in COLUMNAR_FORMATS]
+
+
+def check_format(fmt: str):
+    """ValueError if fmt is unknown or needs pyarrow and it is not installed"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', use one of {', '.join(EXPORT_FORMATS)}")
+    if fmt not in available_formats():
+        raise ValueError(f"Export format '{fmt}' requires pyarrow, which is not installed")
+
+
+def file_name(stem: str, fmt: str) -> str:
+    """Name of the output file of a result"""
+    return stem + EXTENSIONS[fmt]
+
+
+def errors_name(stem: str) -> str:
+    """Name of the sidecar holding the errors of a result"""
+    return stem + '.errors.json'
+
+
+def _schema():
+    return pyarrow.schema([
+        (field, pyarrow.dictionary(pyarrow.int32(), pyarrow.string()) if field in DICTIONARY_FIELDS else pyarrow.string())
+        for field in ENTRY_FIELDS
+    ])
+
+
+def _record_batches(entries: Iterable[Entry], size: int) -> Iterator:
+    """
+    Entries as Arrow record batches of at most size rows
+
+    The dictionary of each encoded column grows across batches and always
+    starts with the values of the previous batches, so the Arrow file format
+    can write it as deltas instead of replacing it
+    """
+    schema = _schema()
+    dictionaries = {field: pyarrow.array([], pyarrow.string()) for field in DICTIONARY_FIELDS}
+    entries = iter(entries)
+    while True:
+        rows = list(islice(entries, size))
+        if not rows:
+            return
+        columns = []
+        for field in ENTRY_FIELDS:
+            # pyarrow converts lists much faster than tuples
+            array = pyarrow.array(list(map(attrgetter(field), rows)), pyarrow.string())
+            if field in dictionaries:
+                # Encode the batch, append its new values to the running
+                # dictionary and point the batch's codes into it
+                encoded = array.dictionary_encode()
+                known = pyarrow.compute.index_in(encoded.dictionary, value_set=dictionaries[field])
+                dictionary = pyarrow.concat_arrays([
+                    dictionaries[field], encoded.dictionary.filter(pyarrow.compute.is_null(known))
+                ])
+                codes = pyarrow.compute.index_in(encoded.dictionary, value_set=dictionary).cast(pyarrow.int32())
+                array = pyarrow.DictionaryArray.from_arrays(pyarrow.compute.take(codes, encoded.indices), dictionary)
+                dictionaries[field] = dictionary
+            columns.append(array)
+        yield pyarrow.RecordBatch.from_arrays(columns, schema=schema)
+        if len(rows) < size:
+            return
+
+
+def write_entries(fileobj: BinaryIO, entries: Iterable[Entry], fmt: str, batch_rows: int = None) -> int:
+    """
+    Stream entries into a binary file as NDJSON, Parquet or Arrow IPC
+    (file format), returns the entries written. Entries are consumed in
+    batches of batch_rows, so an iterator of any length can be exported
+    """
+    check_format(fmt)
+    if fmt == 'json':
+        raise ValueError("json output holds the errors too, use write_result")
+    count = 0
+    if fmt == 'ndjson':
+        encode = entry_encoder(False)
+        buffer = []
+        for entry in entries:
+            buffer.append(encode(entry))
+            count += 1
+            if len(buffer) >= 4096:
+                buffer.append('')
+                fileobj.write('\n'.join(buffer).encode('utf-8'))
+                buffer = []
+        if buffer:
+            buffer.append('')
+            fileobj.write('\n'.join(buffer).encode('utf-8'))
+        return count
+
+    batches = _record_batches(entries, batch_rows or EXPORT_BATCH_ROWS)
+    if fmt == 'parquet':
+        writer = pyarrow_parquet.ParquetWriter(
+            fileobj, _schema(), compression=PARQUET_COMPRESSION, use_dictionary=list(DICTIONARY_FIELDS)
+        )
+    else:
+        writer = pyarrow.ipc.new_file(fileobj, _schema(), options=pyarrow.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+    with writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+def write_errors(fileobj: BinaryIO, errors: List) -> int:
+    """Sidecar of a result: {"errors": [...]} as compact JSON, returns the bytes written"""
+    data = json.dumps({'errors': errors}, separators=(",", ":")).encode('utf-8')
+    fileobj.write(data)
+    return len(data)
+
+
+def write_result(
+    fileobj: BinaryIO,
+    entries: Iterable[Entry],
+    errors: List,
+    fmt: str = 'json',
+    stem: str = 'result',
+    pretty: bool = False
+):
+    """
+    A whole result in one binary file: the result JSON for json, otherwise a
+    zip archive with the entries file and the errors sidecar (stored, not
+    compressed, so the entries can be read straight out of it)
+    """
+    if fmt == 'json':
+        write_result_json(fileobj, entries, errors, pretty=pretty)
+        return
+    check_format(fmt)
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as archive:
+        with archive.open(file_name(stem, fmt), 'w', force_zip64=True) as member:
+            write_entries(member, entries, fmt)
+        with archive.open(errors_name(stem), 'w') as member:
+            write_errors(member, errors)
+
+
+def write_output(directory: str, stem: str, entries: Iterable[Entry], errors: List,
+                 fmt: str = 'json', pretty: bool = True) -> str:
+    """
+    Write a result into a directory as stem.<ext>, plus stem.errors.json for
+    formats other than json; files are replaced atomically. Returns the path
+    of the entries file
+    """
+    check_format(fmt)
+    path = os.path.join(directory, file_name(stem, fmt))
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        if fmt == 'json':
+            write_result_json(f, entries, errors, pretty=pretty)
+        else:
+            write_entries(f, entries, fmt)
+    if fmt != 'json':
+        sidecar = os.path.join(directory, errors_name(stem))
+        with open(sidecar + '.tmp', 'wb') as f:
+            write_errors(f, errors)
+        os.replace(sidecar + '.tmp', sidecar)
+    os.replace(temporary, path)
+    return path
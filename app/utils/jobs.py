@@ -0,0 +1,172 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import BinaryIO, Dict, Optional
+
+from .database import ConnectionPool, DatabaseManager
+from .json_writer import write_result_json
+from .metrics import collect_timings, timer
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """A CSV upload processed in the background"""
+
+    def __init__(self, filename: str, chunksize: int, spool_dir: str,
+                 csv_format: int = None, columns: Dict[str, str] = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.chunksize = chunksize
+        # Explicit format / column mapping, detected from the file when unset
+        self.csv_format = csv_format
+        self.columns = columns
+        self.input_path = os.path.join(spool_dir, f"{self.id}.csv")
+        self.result_path = os.path.join(spool_dir, f"{self.id}.json")
+        self.status = QUEUED
+        self.rows_processed = 0
+        self.entries = 0
+        self.errors = 0
+        self.original_id = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Seconds spent per processing stage
+        self.timings = {}
+
+    def to_dict(self) -> Dict:
+        """Job status for API responses"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_processed': self.rows_processed,
+            'entries': self.entries,
+            'errors': self.errors,
+            'original_id': self.original_id,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'timings': dict(self.timings)
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue for large CSV uploads
+    Uploads are spooled to disk and processed by a pool of worker threads with
+    the chunked pipeline; normalization itself runs on the shared process pool
+    """
+
+    def __init__(
+        self,
+        db_pool: Optional[ConnectionPool] = None,
+        executor: Optional[Executor] = None,
+        workers: int = None,
+        spool_dir: str = None,
+        retention: float = None
+    ):
+        self.db_pool = db_pool
+        self.executor = executor
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.spool_dir = spool_dir or os.getenv("JOB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "streaver_jobs"))
+        # Seconds finished jobs (and their result files) are kept
+        self.retention = retention if retention is not None else float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+
+    def submit(self, fileobj: BinaryIO, filename: str, chunksize: int,
+               csv_format: int = None, columns: Dict[str, str] = None) -> Job:
+        """Spool an uploaded file and queue it for processing (blocking)"""
+        self._prune()
+        job = Job(filename, chunksize, self.spool_dir, csv_format, columns)
+        with open(job.input_path, 'wb') as spool:
+            shutil.copyfileobj(fileobj, spool)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._workers.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by ID"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self):
+        """Stop accepting jobs and wait for the running ones"""
+        self._workers.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job: Job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            with collect_timings() as job.timings:
+                self._process(job)
+            job.status = DONE
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job.id, e)
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            if os.path.exists(job.input_path):
+                os.remove(job.input_path)
+
+    def _process(self, job: Job):
+        # The pipeline loads pandas, imported on the first job rather than at startup
+        from .pipeline import iter_sorted_entries, process_csv_stream
+        db = None
+        try:
+            if self.db_pool:
+                db = DatabaseManager(pool=self.db_pool)
+                if not db.connect():
+                    db = None
+
+            def progress(rows):
+                job.rows_processed = rows
+
+            sorter, errors, original_id = process_csv_stream(
+                job.input_path, job.chunksize, db=db, executor=self.executor, progress=progress,
+                csv_format=job.csv_format, columns=job.columns
+            )
+            if db:
+                db.close()
+                db = None
+
+            job.entries = sorter.count
+            job.errors = len(errors)
+            job.original_id = original_id
+            with open(job.result_path, 'wb') as f, timer('serialize'):
+                write_result_json(f, iter_sorted_entries(sorter), errors)
+        finally:
+            if db:
+                db.close()
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_at and job.finished_at < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if os.path.exists(job.result_path):
+                os.remove(job.result_path)
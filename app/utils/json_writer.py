@@ -0,0 +1,134 @@
+import json
+import os
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List
+
+from .entry import Entry
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+# 'auto' uses orjson when installed, 'json' forces the standard library
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+
+
+def _as_dict(value) -> Dict:
+    """Serialize Entry records (and entries nested in other values) as their dict"""
+    if isinstance(value, Entry):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_encoder(pretty: bool) -> Callable[[Dict], str]:
+    """Standard library encoder for a single entry"""
+    if pretty:
+        return lambda entry: json.dumps(entry, indent=2, sort_keys=True, default=_as_dict)
+    return lambda entry: json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=_as_dict)
+
+
+def _orjson_encoder(pretty: bool) -> Callable[[Dict], str]:
+    """
+    orjson encoder for a single entry with the exact output of _json_encoder
+    orjson never escapes non-ASCII, so pretty (ensure_ascii) output falls back
+    to json for entries that are not plain ASCII
+    """
+    fallback = _json_encoder(pretty)
+    option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS if pretty else 0
+
+    def encode(entry):
+        try:
+            data = orjson.dumps(entry.to_dict() if type(entry) is Entry else entry, default=_as_dict, option=option)
+        except TypeError:
+            return fallback(entry)
+        if pretty and (not data.isascii() or b'\x7f' in data):
+            return fallback(entry)
+        return data.decode('utf-8')
+    return encode
+
+
+def entry_encoder(pretty: bool, backend: str = None) -> Callable[[Dict], str]:
+    """Encoder for single entries using the configured backend"""
+    backend = backend or JSON_BACKEND
+    if backend not in ('auto', 'json', 'orjson'):
+        raise ValueError(f"Unknown JSON backend '{backend}'")
+    if backend == 'orjson' and orjson is None:
+        raise ValueError("JSON backend 'orjson' requested but orjson is not installed")
+    if backend != 'json' and orjson is not None:
+        return _orjson_encoder(pretty)
+    return _json_encoder(pretty)
+
+
+def iter_result_json(
+    entries: Iterable[Dict],
+    errors: List[int],
+    pretty: bool = False,
+    backend: str = None,
+    buffer_size: int = 65536
+) -> Iterator[bytes]:
+    """
+    Serialize {"entries": ..., "errors": ...} incrementally, one entry at a time
+
+    pretty=True matches json.dumps(result, indent=2, sort_keys=True) byte for
+    byte (the result.json format); otherwise the output matches the compact
+    JSON of FastAPI's JSONResponse. If entries is a generator it is closed
+    when serialization ends, so it can release its resources.
+    """
+    encode = entry_encoder(pretty, backend)
+    if pretty:
+        opening, separator, closing = '{\n  "entries": [\n    ', ',\n    ', '\n  ],\n'
+        empty = '{\n  "entries": [],\n'
+    else:
+        opening, separator, closing = '{"entries":[', ',', '],'
+        empty = opening + closing
+    try:
+        buffer = []
+        size = 0
+        count = 0
+        for entry in entries:
+            item = encode(entry)
+            if pretty:
+                item = item.replace('\n', '\n    ')
+            buffer.append(separator + item if count else opening + item)
+            count += 1
+            size += len(item)
+            if size >= buffer_size:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+        buffer.append(closing if count else empty)
+        buffer.append(_errors_json(errors, pretty))
+        yield ''.join(buffer).encode('utf-8')
+    finally:
+        close = getattr(entries, 'close', None)
+        if close:
+            close()
+
+
+def _errors_json(errors: List[int], pretty: bool) -> str:
+    """Closing "errors" member of the result object"""
+    if not pretty:
+        return '"errors":' + json.dumps(errors, separators=(",", ":")) + '}'
+    if not errors:
+        return '  "errors": []\n}'
+    return '  "errors": [\n    ' + ',\n    '.join(json.dumps(line) for line in errors) + '\n  ]\n}'
+
+
+def result_json_bytes(entries: Iterable[Dict], errors: List[int], pretty: bool = False, backend: str = None) -> bytes:
+    """Whole serialized result, for callers that need the bytes more than once"""
+    return b''.join(iter_result_json(entries, errors, pretty=pretty, backend=backend))
+
+
+def write_result_json(
+    fileobj: BinaryIO,
+    entries: Iterable[Dict],
+    errors: List[int],
+    pretty: bool = False,
+    backend: str = None
+) -> int:
+    """Stream the serialized result into a binary file, returns the bytes written"""
+    written = 0
+    for chunk in iter_result_json(entries, errors, pretty=pretty, backend=backend):
+        fileobj.write(chunk)
+        written += len(chunk)
+    return written
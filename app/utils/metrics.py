@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Upper bounds of the stage duration histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def configure_logging(level: str = None):
+    """Leveled logging for the app; LOG_LEVEL (default INFO) picks what is emitted"""
+    logging.basicConfig(
+        level=(level or os.getenv("LOG_LEVEL", "INFO")).upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """Add amount to the series with the given labels"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Current value of one series"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def expose(self) -> List[str]:
+        """Prometheus text lines for this counter"""
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values (durations), optionally split by labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count per bucket..., count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """Record one observation in the series with the given labels"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def expose(self) -> List[str]:
+        """Prometheus text lines for this histogram (cumulative buckets, _count and _sum)"""
+        with self._lock:
+            values = sorted((key, list(series)) for key, series in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in values:
+            for bound, count in zip(self.buckets, series):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Set of metrics exposed together on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Add a metric and return it"""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines += metric.expose()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+ROWS_PROCESSED = REGISTRY.register(Counter(
+    'csv_rows_processed_total', 'CSV rows run through normalization'
+))
+ROWS_REJECTED = REGISTRY.register(Counter(
+    'csv_rows_rejected_total', 'CSV rows rejected, by the first field that failed validation', ('reason',)
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'pipeline_stage_seconds', 'Time spent in each processing stage', ('stage',)
+))
+
+# Per-run stage timings, collected by collect_timings() for the current context
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect the seconds spent per stage by every timer run inside the block"""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def timer(stage: str):
+    """Time a block as one observation of a stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def timed(stage: str):
+    """Decorator form of timer"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_rows(df, errors: List[int], csv_format: int = None):
+    """Count the rows of a normalized DataFrame and its rejected rows by reason"""
+    ROWS_PROCESSED.inc(len(df))
+    if errors:
+        # Imported here so importing metrics does not load pandas
+        from .normalizer import DataNormalizer
+        record_rejections(0, DataNormalizer.rejection_reasons(df, errors, csv_format))
+
+
+def record_rejections(rows: int, reasons: Dict[str, int]):
+    """Count rows normalized without a DataFrame and their rejections by reason"""
+    if rows:
+        ROWS_PROCESSED.inc(rows)
+    for reason, count in reasons.items():
+        if count:
+            ROWS_REJECTED.inc(count, reason=reason)
+
+
+def render_gauges(prefix: str, values: Dict[str, float], documentation: str) -> str:
+    """Prometheus text for a dict of current values (e.g. pool or cache stats)"""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines += [f"# HELP {name} {documentation}: {key}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return '\n'.join(lines) + '\n' if lines else ''
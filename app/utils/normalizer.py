@@ -1,5 +1,84 @@
-import re
-from typing import List, Dict, Tuple
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_object_dtype
+
+from . import rules
+from .entry import ENTRY_FIELDS, Entry
+from .sorting import compact_keys, gc_paused, sort_order
+
+# Column positions for each supported CSV format
+FORMAT_LAYOUTS = {
+    1: {'lastname': 0, 'firstname': 1, 'phonenumber': 2, 'color': 3, 'zipcode': 4},
+    2: {'fullname': 0, 'color': 1, 'zipcode': 2, 'phonenumber': 3},
+    3: {'firstname': 0, 'lastname': 1, 'zipcode': 2, 'phonenumber': 3, 'color': 4},
+}
+
+# Processing engines: 'vectorized' works on whole columns, 'rows' is the
+# original row-by-row loop kept as the reference implementation
+ENGINES = ('vectorized', 'rows')
+
+# Field order of each format, in column order
+FORMAT_FIELDS = {
+    csv_format: tuple(sorted(layout, key=layout.get))
+    for csv_format, layout in FORMAT_LAYOUTS.items()
+}
+
+# Headers of the supported formats (see header_signature); files with these
+# headers skip content-based detection
+HEADER_FINGERPRINTS = {
+    ('lastname', 'firstname', 'phonenumber', 'color', 'zipcode'): 1,
+    ('firstname lastname', 'color', 'zipcode', 'phonenumber'): 2,
+    ('fullname', 'color', 'zipcode', 'phonenumber'): 2,
+    ('firstname', 'lastname', 'zipcode', 'phonenumber', 'color'): 3,
+}
+
+# Rows scored per candidate format when the header is not recognized
+DETECT_SAMPLE_ROWS = int(os.getenv("DETECT_SAMPLE_ROWS", "200"))
+
+# Validation rules in the order the row loop applies them; a rejected row is
+# attributed to the first one it fails
+REJECTION_REASONS = ('name', 'phone', 'zip', 'color')
+
+
+class MappingError(ValueError):
+    """An explicit column mapping does not fit the format fields or the file header"""
+
+
+class SchemaCache:
+    """Formats detected for unrecognized headers, keyed on the header signature (LRU)"""
+    
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv("SCHEMA_CACHE_SIZE", "1024"))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, signature: Tuple[str, ...]) -> Optional[int]:
+        with self._lock:
+            csv_format = self._entries.get(signature)
+            if csv_format:
+                self._entries.move_to_end(signature)
+            return csv_format
+    
+    def put(self, signature: Tuple[str, ...], csv_format: int):
+        with self._lock:
+            self._entries[signature] = csv_format
+            self._entries.move_to_end(signature)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_schema_cache = SchemaCache()
+
 
 class DataNormalizer:
     """Handles CSV data normalization according to specified rules"""
@@ -8,23 +87,13 @@ class DataNormalizer:
     def normalize_phone(phone_str: str) -> str:
         """
         Normalize phone number to xxx-xxx-xxxx format
-        Extracts digits and formats them
+        Extracts digits and formats them; repeated values are served from a memo
         """
-        if not phone_str:
-            return None
-        
-        # Extract all digits from the phone string
-        digits = re.sub(r'\D', '', str(phone_str))
-        
-        # Check if we have exactly 10 digits
-        if len(digits) == 10:
-            return f"{digits[0:3]}-{digits[3:6]}-{digits[6:10]}"
-        elif len(digits) == 11 and digits[0] == '1':
-            # Handle case where number starts with country code 1
-            return f"{digits[1:4]}-{digits[4:7]}-{digits[7:11]}"
-        else:
-            # Invalid phone number
-            return None
+        try:
+            return rules.normalize_phone(phone_str)
+        except TypeError:
+            # Unhashable values skip the memo
+            return rules.normalize_phone.__wrapped__(phone_str)
     
     @staticmethod
     def validate_zip(zip_str: str) -> str:
@@ -32,29 +101,51 @@ class DataNormalizer:
         Validate and normalize ZIP code
         Accept only 5-digit format
         """
-        if not zip_str:
-            return None
-        
-        zip_clean = str(zip_str).strip()
-        
-        # Check for 5-digit ZIP
-        if re.match(r'^\d{5}$', zip_clean):
-            return zip_clean
-        
-        # Check if it's just digits that could be a ZIP
-        digits = re.sub(r'\D', '', zip_clean)
-        if len(digits) == 5:
-            return digits
-        
-        return None
+        try:
+            return rules.validate_zip(zip_str)
+        except TypeError:
+            return rules.validate_zip.__wrapped__(zip_str)
     
     @staticmethod
-    def detect_format(df) -> int:
+    def header_signature(columns) -> Tuple[str, ...]:
+        """Normalized header of a file, the key for fingerprints and the schema cache"""
+        return tuple(' '.join(str(col).split()).lower() for col in columns)
+    
+    @staticmethod
+    def detect_format(df, sample_rows: int = None) -> int:
         """
         Detect which CSV format is being used
         Returns: 1, 2, or 3 based on the format detected
+        
+        Known headers are recognized by their fingerprint. Otherwise every
+        format is scored on the first sample_rows rows (rows that would be
+        valid under it) and the best one wins; the decision is cached per
+        header so repeated feeds skip the scoring
         """
-        columns = [col.strip().lower() for col in df.columns]
+        signature = DataNormalizer.header_signature(df.columns)
+        csv_format = HEADER_FINGERPRINTS.get(signature) or _schema_cache.get(signature)
+        if csv_format:
+            return csv_format
+        
+        sample = df.head(sample_rows or DETECT_SAMPLE_ROWS)
+        scores = {
+            candidate: int(np.count_nonzero(DataNormalizer._valid_rows(sample, candidate)))
+            for candidate in FORMAT_LAYOUTS
+        }
+        best = max(scores.values())
+        leaders = [candidate for candidate, score in scores.items() if score == best]
+        if best and len(leaders) == 1:
+            _schema_cache.put(signature, leaders[0])
+            return leaders[0]
+        
+        # No clear winner (e.g. every sampled row is invalid): header and content heuristics
+        heuristic = DataNormalizer._detect_by_heuristics(sample)
+        return heuristic if heuristic in leaders or not best else leaders[0]
+    
+    @staticmethod
+    def _detect_by_heuristics(sample) -> int:
+        """Header order, then whether most sampled values of a name column contain a space"""
+        columns = [str(col).strip().lower() for col in sample.columns]
         
         # Format 1: Lastname, Firstname, phonenumber, color, zipcode
         if 'lastname' in columns and 'firstname' in columns and columns.index('lastname') < columns.index('firstname'):
@@ -62,33 +153,237 @@ class DataNormalizer:
         
         # Format 2: Firstname Lastname (combined), color, zipcode, phonenumber
         # Check for a column that might contain full names
-        for col in df.columns:
-            if col.strip().lower() not in ['color', 'zipcode', 'phonenumber', 'zip', 'phone']:
-                # Could be the full name column
-                sample_value = str(df[col].iloc[0]) if len(df) > 0 else ''
-                if ' ' in sample_value:
+        for pos, col in enumerate(columns):
+            if col not in ['color', 'zipcode', 'phonenumber', 'zip', 'phone']:
+                values = sample.iloc[:, pos].dropna().astype(str).str.strip()
+                if len(values) and values.str.contains(' ', regex=False).mean() > 0.5:
                     return 2
         
         # Format 3: Firstname, Lastname, zipcode, phonenumber, color (default)
         return 3
     
     @staticmethod
-    def process_csv_data(df) -> Tuple[List[Dict], List[int]]:
+    def mapping_format(mapping: Dict[str, str]) -> int:
+        """
+        Format whose layout an explicit field -> column mapping fills: 2 when
+        'fullname' is mapped, 3 otherwise; MappingError if the fields do not fit
+        """
+        csv_format = 2 if 'fullname' in mapping else 3
+        fields = FORMAT_FIELDS[csv_format]
+        unknown = set(mapping) - set(fields)
+        missing = [field for field in fields if field not in mapping]
+        if unknown or missing:
+            raise MappingError(
+                f"Column mapping needs exactly the fields {list(fields)}"
+                + (f", missing {missing}" if missing else '')
+                + (f", unknown {sorted(unknown)}" if unknown else '')
+            )
+        return csv_format
+    
+    @staticmethod
+    def apply_mapping(df, mapping: Dict[str, str]) -> Tuple[pd.DataFrame, int]:
+        """
+        Select the columns named in an explicit field -> column mapping
+        Returns the columns in the layout of format 2 (when 'fullname' is
+        mapped) or format 3, and that format; the index is kept.
+        MappingError when a mapped column is not in the frame
+        """
+        csv_format = DataNormalizer.mapping_format(mapping)
+        fields = FORMAT_FIELDS[csv_format]
+        absent = [mapping[field] for field in fields if mapping[field] not in df.columns]
+        if absent:
+            raise MappingError(f"Mapped columns not found in the file: {absent}")
+        return df[[mapping[field] for field in fields]], csv_format
+    
+    @staticmethod
+    def process_csv_data(df, engine: str = 'vectorized', csv_format: int = None,
+                         with_lines: bool = False) -> Tuple[List[Entry], List[int]]:
         """
         Process CSV data and return normalized entries and error line numbers
         Supports 3 different CSV formats
         
         Args:
             df: pandas DataFrame containing the CSV data
+            engine: 'vectorized' (default) or 'rows' for the row-by-row reference loop
+            csv_format: Known format (1, 2 or 3), skips detection, e.g. for later chunks of a file
+            with_lines: Also return the source line number of each entry
             
         Returns:
-            Tuple of (entries list, errors list)
+            Tuple of (entries list of Entry records, errors list), plus the lines list if with_lines is set
         """
-        entries = []
-        errors = []
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
         
         # Detect format
-        csv_format = DataNormalizer.detect_format(df)
+        if csv_format is None:
+            csv_format = DataNormalizer.detect_format(df)
+        
+        if engine == 'rows':
+            result = DataNormalizer._process_rows(df, csv_format)
+        else:
+            result = DataNormalizer._process_vectorized(df, csv_format)
+        return result if with_lines else result[:2]
+    
+    @staticmethod
+    def rejection_reasons(df, errors: List[int], csv_format: int = None) -> Dict[str, int]:
+        """
+        Count rejected rows by the first check they fail, in the row loop's order
+        Only the rows listed in errors (index labels) are inspected
+        """
+        if csv_format is None:
+            csv_format = DataNormalizer.detect_format(df)
+        reasons = dict.fromkeys(REJECTION_REASONS, 0)
+        if not errors:
+            return reasons
+        checks = DataNormalizer._checks(DataNormalizer._fields(df.loc[errors], csv_format))
+        remaining = np.ones(len(errors), dtype=bool)
+        for reason in REJECTION_REASONS:
+            failed = remaining & ~checks[reason]
+            reasons[reason] = int(failed.sum())
+            remaining &= ~failed
+        return reasons
+    
+    @staticmethod
+    def normalized_fields(df, csv_format: int, names: Tuple[str, ...] = None) -> Dict[str, np.ndarray]:
+        """
+        Every field of every row as it would be normalized, None where the
+        field itself fails its rule (the row as a whole is not checked).
+        Only the fields in names are computed when given
+        """
+        names = names or ENTRY_FIELDS
+        fields = DataNormalizer._fields(df, csv_format, names)
+        normalized = {}
+        for name in ('firstname', 'lastname'):
+            if name in names:
+                normalized[name] = np.where(fields[name] != '', fields[name].to_numpy(dtype=object), None)
+        if 'phonenumber' in names:
+            valid = DataNormalizer._phone_check(fields)
+            normalized['phonenumber'] = np.array([
+                f"{digits[-10:-7]}-{digits[-7:-4]}-{digits[-4:]}" if ok else None
+                for digits, ok in zip(fields['phone_digits'].to_numpy(dtype=object), valid)
+            ], dtype=object)
+        if 'zipcode' in names:
+            normalized['zipcode'] = np.where(fields['zip_len'] == 5, fields['zip_digits'].to_numpy(dtype=object), None)
+        if 'color' in names:
+            normalized['color'] = np.where(fields['color'] != '', fields['color'].to_numpy(dtype=object), None)
+        return normalized
+    
+    @staticmethod
+    def _fields(df, csv_format: int, names: Tuple[str, ...] = None) -> Dict[str, pd.Series]:
+        """
+        Column-wise fields of a frame, as the row loop reads them
+        names limits them to the ones needed for those entry fields
+        """
+        names = names or ENTRY_FIELDS
+        # iterrows() upcasts all-numeric frames to a single dtype, mirror it
+        if len(df.columns) and not any(is_object_dtype(dtype) for dtype in df.dtypes):
+            df = df.astype(df.values.dtype)
+        
+        layout = FORMAT_LAYOUTS[csv_format]
+        
+        def raw_column(field):
+            pos = layout[field]
+            if pos < df.shape[1]:
+                return df.iloc[:, pos]
+            return pd.Series('', index=df.index, dtype=object)
+        
+        def column(field):
+            # str() of every value, exactly like the row loop does
+            return raw_column(field).astype(str)
+        
+        fields = {}
+        if 'firstname' in names or 'lastname' in names:
+            if csv_format == 2:
+                # An empty frame partitions into no columns at all
+                name_parts = column('fullname').str.strip().str.partition(' ').reindex(columns=[0, 1, 2], fill_value='')
+                fields['firstname'] = name_parts[0]
+                fields['lastname'] = name_parts[2]
+            else:
+                fields['firstname'] = column('firstname').str.strip()
+                fields['lastname'] = column('lastname').str.strip()
+        if 'phonenumber' in names:
+            fields['phone_digits'], fields['phone_len'] = rules.digits_column(raw_column('phonenumber'))
+        if 'zipcode' in names:
+            fields['zip_digits'], fields['zip_len'] = rules.digits_column(raw_column('zipcode'))
+        if 'color' in names:
+            fields['color'] = column('color').str.strip()
+        return fields
+    
+    @staticmethod
+    def _phone_check(fields: Dict[str, pd.Series]) -> np.ndarray:
+        """Phone rule mask: 10 digits, or 11 digits with a leading country code 1"""
+        phone_len = fields['phone_len']
+        has_country_code = phone_len == 11
+        if has_country_code.any():
+            has_country_code[has_country_code] = [
+                digits[0] == '1' for digits in fields['phone_digits'].to_numpy()[has_country_code]
+            ]
+        return (phone_len == 10) | has_country_code
+    
+    @staticmethod
+    def _checks(fields: Dict[str, pd.Series]) -> Dict[str, np.ndarray]:
+        """Boolean mask per validation rule (True = passes), keyed like REJECTION_REASONS"""
+        return {
+            'name': ((fields['firstname'] != '') & (fields['lastname'] != '')).to_numpy(),
+            'phone': DataNormalizer._phone_check(fields),
+            # ZIP: exactly 5 digits once non-digits are removed
+            'zip': fields['zip_len'] == 5,
+            'color': (fields['color'] != '').to_numpy(),
+        }
+    
+    @staticmethod
+    def _valid_rows(df, csv_format: int, fields: Dict[str, pd.Series] = None) -> np.ndarray:
+        """Mask of the rows that pass every rule when read in the given format"""
+        checks = DataNormalizer._checks(fields or DataNormalizer._fields(df, csv_format))
+        return checks['name'] & checks['phone'] & checks['zip'] & checks['color']
+    
+    @staticmethod
+    def _process_vectorized(df, csv_format: int) -> Tuple[List[Entry], List[int], List[int]]:
+        """
+        Column-wise implementation of process_csv_data
+        Produces the same entries and errors as the row loop
+        """
+        fields = DataNormalizer._fields(df, csv_format)
+        valid = DataNormalizer._valid_rows(df, csv_format, fields)
+        
+        errors = df.index[~valid].tolist()
+        
+        firstname = fields['firstname'][valid]
+        lastname = fields['lastname'][valid]
+        # Valid numbers have 10 digits, or 11 starting with the country code 1
+        phonenumber = pd.Series(
+            [f"{digits[-10:-7]}-{digits[-7:-4]}-{digits[-4:]}" for digits in fields['phone_digits'].to_numpy()[valid]],
+            index=firstname.index, dtype=object
+        )
+        
+        # Sort entries by lastname, then firstname (lexsort is stable, like list.sort)
+        order = sort_order(
+            compact_keys(lastname.str.lower().to_numpy(dtype=object)),
+            compact_keys(firstname.str.lower().to_numpy(dtype=object)),
+        )
+        
+        # Names, ZIP codes and colors repeat across rows: interned, their
+        # entries share one string per distinct value instead of a copy each
+        columns = [
+            list(map(sys.intern, series.to_numpy(dtype=object)[order].tolist()))
+            for series in (firstname, lastname, fields['zip_digits'][valid], fields['color'][valid])
+        ]
+        columns.insert(2, phonenumber.to_numpy(dtype=object)[order].tolist())
+        with gc_paused():
+            entries = list(map(Entry, *columns))
+        lines = df.index[valid][order].tolist()
+        
+        return entries, errors, lines
+    
+    @staticmethod
+    def _process_rows(df, csv_format: int) -> Tuple[List[Entry], List[int], List[int]]:
+        """
+        Row-by-row implementation of process_csv_data
+        Kept as the reference for the vectorized engine
+        """
+        entries = []
+        errors = []
+        lines = []
         
         for idx, row in df.iterrows():
             try:
@@ -148,19 +443,14 @@ class DataNormalizer:
                     continue
                 
                 # Add successfully processed entry
-                entries.append({
-                    'firstname': firstname,
-                    'lastname': lastname,
-                    'phonenumber': normalized_phone,
-                    'zipcode': normalized_zip,
-                    'color': color
-                })
+                entries.append(Entry(firstname, lastname, normalized_phone, normalized_zip, color))
+                lines.append(idx)
                 
             except Exception as e:
                 # If any error occurs processing this line, add to errors
                 errors.append(idx)
         
         # Sort entries by lastname, then firstname (ascending alphabetical order)
-        entries.sort(key=lambda x: (x['lastname'].lower(), x['firstname'].lower()))
+        order = sorted(range(len(entries)), key=lambda i: (entries[i]['lastname'].lower(), entries[i]['firstname'].lower()))
         
-        return entries, errors
+        return [entries[i] for i in order], errors, [lines[i] for i in order]
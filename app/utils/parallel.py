@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from .sorting import entry_keys, merge_order
+
+# Rows per part when a DataFrame is split across worker processes
+PART_ROWS = int(os.getenv("NORMALIZER_PART_ROWS", "50000"))
+
+
+def create_executor(workers: int = None) -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool for CPU-bound normalization
+    Size comes from NORMALIZER_WORKERS (defaults to the CPU count); 0 disables it
+    """
+    if workers is None:
+        workers = int(os.getenv("NORMALIZER_WORKERS", os.cpu_count() or 1))
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def normalize_chunk(df, csv_format: int, with_lines: bool = False) -> Tuple:
+    """
+    Normalize one chunk of a file in a worker process
+    Returns the process_csv_data result followed by the sort keys of its
+    entries (entry_keys), computed here so merging does not have to
+    """
+    from .normalizer import DataNormalizer
+    result = DataNormalizer.process_csv_data(df, csv_format=csv_format, with_lines=with_lines)
+    return (*result, entry_keys(result[0]))
+
+
+def split_frame(df, part_rows: int) -> List:
+    """Split a DataFrame into consecutive parts of at most part_rows rows"""
+    return [df.iloc[start:start + part_rows] for start in range(0, len(df), part_rows)] or [df]
+
+
+def merge_results(results: List[Tuple]) -> Tuple:
+    """
+    Merge per-part results of normalize_chunk, given in file order, into one result
+    Each part is already sorted and carries its sort keys, so the global order
+    is a stable sort of the keys alone (merge_order) that keeps ties in part
+    order, and the output matches sorting the whole file at once. Results that
+    carry source lines (with_lines) keep them aligned with their entries
+    """
+    errors = [line for result in results for line in result[1]]
+    order = merge_order([result[-1] for result in results]).tolist()
+    entries = [entry for result in results for entry in result[0]]
+    entries = [entries[index] for index in order]
+    if results and len(results[0]) == 4:
+        lines = [line for result in results for line in result[2]]
+        return entries, errors, [lines[index] for index in order]
+    return entries, errors
+
+
+def process_in_parallel(df, executor: Executor, part_rows: int = None, with_lines: bool = False) -> Tuple:
+    """Normalize a whole DataFrame across the executor's workers (blocking)"""
+    from .normalizer import DataNormalizer
+    csv_format = DataNormalizer.detect_format(df)
+    futures = [
+        executor.submit(normalize_chunk, part, csv_format, with_lines)
+        for part in split_frame(df, part_rows or PART_ROWS)
+    ]
+    return merge_results([future.result() for future in futures])
@@ -0,0 +1,145 @@
+import logging
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .database import DatabaseManager
+from .metrics import record_rows, timer
+from .parallel import normalize_chunk
+from .reader import none_for_missing, normalizer_frame, read_csv_typed_chunks, resolve_schema
+from .sorting import ExternalSorter
+
+logger = logging.getLogger(__name__)
+
+# Chunks normalized concurrently in streaming mode, bounds memory to a few chunks
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", os.cpu_count() or 1))
+
+
+def read_csv_chunks(source, chunksize: int, usecols: Optional[List[int]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV file or buffer in chunks, values as strings and None when missing
+    The index keeps counting across chunks, so line numbers stay global
+    """
+    reader = read_csv_typed_chunks(source, chunksize, usecols)
+    while True:
+        with timer('parse'):
+            chunk = next(reader, None)
+            if chunk is not None:
+                chunk = none_for_missing(chunk)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def process_csv_stream(
+    source,
+    chunksize: int,
+    db: Optional[DatabaseManager] = None,
+    executor: Optional[Executor] = None,
+    progress: Optional[Callable[[int], None]] = None,
+    window: int = STREAM_WINDOW,
+    csv_format: int = None,
+    columns: Dict[str, str] = None
+) -> Tuple[ExternalSorter, List[int], Optional[int]]:
+    """
+    Normalize a CSV in chunks with bounded memory (blocking)
+
+    Chunks are normalized in parallel on the executor (window at a time)
+    and handled in file order. Each one is written to the database (original
+    data as original_rows, entries with their source line) and spilled
+    as a sorted run. The whole upload is one transaction, committed at the end.
+    The format is settled up front from the header and first rows, and the
+    values are parsed as strings (see reader.py); only the columns the format
+    reads are parsed unless the original data is saved, which keeps every
+    column.
+
+    Args:
+        source: Path or binary file object with the CSV
+        chunksize: Rows per chunk
+        db: Connected DatabaseManager, or None to skip persistence
+        executor: Process pool for normalization, or None to run inline
+        progress: Called with the number of rows processed after each chunk
+        window: Chunks normalized at once, one more is queued behind them
+        csv_format: Known format, skips detection
+        columns: Explicit field -> column mapping, overrides the format
+
+    Returns:
+        Tuple of (sorter with the sorted runs, errors list, original_id or None)
+    """
+    sorter = ExternalSorter()
+    errors = []
+    pending = deque()
+    rows = 0
+    csv_format, usecols = resolve_schema(source, csv_format, columns)
+
+    saving = db is not None
+    original_id = None
+
+    def finish_oldest():
+        nonlocal saving, original_id, rows
+        chunk, part, future = pending.popleft()
+        # With an executor this is the time spent waiting for the worker
+        with timer('normalize'):
+            entries, chunk_errors, lines, keys = future.result()
+        errors.extend(chunk_errors)
+        record_rows(part, chunk_errors, csv_format)
+        with timer('sort'):
+            sorter.add_run(entries, keys)
+
+        if saving:
+            if original_id is None:
+                # Streamed uploads always use the rows layout, so later chunks are a COPY
+                original_id = db.insert_original_frame(chunk, commit=False, storage='rows')
+                saved = original_id is not None
+            else:
+                saved = db.append_original_frame(original_id, chunk, commit=False)
+            if saved and entries:
+                saved = db.insert_normalized_data(entries, original_id, commit=False, lines=lines)
+            if not saved:
+                # The transaction was rolled back, stop writing the remaining chunks
+                logger.error("Failed to save chunk, upload rolled back")
+                saving = False
+                original_id = None
+
+        rows += len(chunk)
+        if progress:
+            progress(rows)
+
+    try:
+        for chunk in read_csv_chunks(source, chunksize, None if saving else usecols):
+            part = normalizer_frame(chunk, usecols, columns)
+            if executor:
+                future = executor.submit(normalize_chunk, part, csv_format, True)
+            else:
+                future = Future()
+                with timer('normalize'):
+                    future.set_result(normalize_chunk(part, csv_format, True))
+            pending.append((chunk, part, future))
+            # One chunk beyond the window stays queued, so a worker that
+            # finishes never waits for the next chunk to be read
+            if len(pending) > window:
+                finish_oldest()
+
+        while pending:
+            finish_oldest()
+
+        if original_id:
+            db.commit()
+    except Exception:
+        for *_, future in pending:
+            future.cancel()
+        sorter.close()
+        raise
+
+    return sorter, errors, original_id
+
+
+def iter_sorted_entries(sorter: ExternalSorter) -> Iterator[Dict]:
+    """Globally sorted entries of a sorter, deleting its runs once consumed or closed"""
+    try:
+        yield from sorter.merge()
+    finally:
+        sorter.close()
@@ -0,0 +1,168 @@
+import logging
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .metrics import timer
+from .normalizer import DETECT_SAMPLE_ROWS, FORMAT_FIELDS, FORMAT_LAYOUTS, DataNormalizer
+
+try:
+    import pyarrow
+    import pyarrow.csv as pyarrow_csv
+except ImportError:  # optional fast parser
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# 'auto' uses the pyarrow parser when installed, 'c' forces the pandas C parser
+CSV_ENGINE = os.getenv("CSV_ENGINE", "auto")
+
+# Cells read as missing, the pandas read_csv defaults
+NA_VALUES = (
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+)
+
+
+def none_for_missing(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    None for missing values (JSON compatibility) in a frame read as strings,
+    in place: only the columns holding NaN are rewritten
+    """
+    for pos in range(df.shape[1]):
+        values = df.iloc[:, pos].to_numpy()
+        missing = pd.isna(values)
+        if missing.any() and any(value is not None for value in values[missing]):
+            values = values.copy()
+            values[missing] = None
+            df.isetitem(pos, values)
+    return df
+
+
+def csv_engine(engine: str = None) -> str:
+    """Parser to use for whole-file reads: 'pyarrow' or 'c'"""
+    engine = engine or CSV_ENGINE
+    if engine == 'auto':
+        return 'pyarrow' if pyarrow is not None else 'c'
+    if engine == 'pyarrow' and pyarrow is None:
+        raise ValueError("CSV_ENGINE=pyarrow but pyarrow is not installed")
+    if engine not in ('pyarrow', 'c'):
+        raise ValueError(f"Unknown CSV engine '{engine}', expected auto, pyarrow or c")
+    return engine
+
+
+def _is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def _c_options(source, usecols: Optional[List[int]]) -> Dict:
+    """read_csv arguments of a typed read with the C parser"""
+    # Files on disk are memory-mapped instead of read through a buffer
+    return {'dtype': str, 'usecols': usecols, 'memory_map': _is_path(source)}
+
+
+def probe_csv(source, sample_rows: int = DETECT_SAMPLE_ROWS) -> pd.DataFrame:
+    """
+    Header and first sample_rows rows of a CSV file or buffer as strings,
+    without parsing the rest. File objects are rewound to where they were
+    """
+    position = source.tell() if hasattr(source, 'seek') else None
+    try:
+        return none_for_missing(pd.read_csv(source, nrows=sample_rows, dtype=str))
+    finally:
+        if position is not None:
+            source.seek(position)
+
+
+def projection(header, csv_format: int, columns: Dict[str, str] = None) -> List[int]:
+    """
+    Positions of the columns a format (or an explicit field -> column
+    mapping) reads; any other column is skipped while parsing
+    """
+    header = pd.Index(header)
+    if columns:
+        return sorted(header.get_loc(columns[field]) for field in FORMAT_FIELDS[csv_format])
+    return list(range(min(len(FORMAT_LAYOUTS[csv_format]), len(header))))
+
+
+def normalizer_frame(df: pd.DataFrame, usecols: Optional[List[int]], columns: Dict[str, str] = None) -> pd.DataFrame:
+    """
+    Part of a frame the normalizer reads: the columns of an explicit mapping,
+    or the format's columns at usecols. A frame read whole keeps the other
+    columns for the stored original; one read with usecols is returned as is
+    """
+    if columns:
+        return DataNormalizer.apply_mapping(df, columns)[0]
+    if usecols is None or df.shape[1] == len(usecols):
+        return df
+    return df.iloc[:, usecols]
+
+
+def resolve_schema(source, csv_format: int = None, columns: Dict[str, str] = None) -> Tuple[int, List[int]]:
+    """
+    Format to read a CSV file or buffer with and the positions of its columns
+    The format is the layout of an explicit column mapping (checked against
+    the header), the explicit format, or the one detected on the first rows;
+    only the header / first rows are read
+    """
+    sample = probe_csv(source, 0 if csv_format or columns else DETECT_SAMPLE_ROWS)
+    if columns:
+        csv_format = DataNormalizer.apply_mapping(sample, columns)[1]
+    elif not csv_format:
+        with timer('detect'):
+            csv_format = DataNormalizer.detect_format(sample)
+    return csv_format, projection(sample.columns, csv_format, columns)
+
+
+def read_csv_typed(source, usecols: Optional[List[int]] = None, engine: str = None) -> pd.DataFrame:
+    """
+    Read a whole CSV file or buffer with every value as a string (None when missing)
+
+    Only the columns at usecols are parsed. The pyarrow parser is used when
+    available and files on disk are memory-mapped; rows pyarrow rejects (e.g.
+    a different number of fields) fall back to the pandas C parser
+    """
+    if csv_engine(engine) == 'pyarrow':
+        position = source.tell() if hasattr(source, 'seek') else None
+        try:
+            return none_for_missing(_read_pyarrow(source, usecols))
+        except pyarrow.ArrowInvalid as e:
+            logger.debug("pyarrow could not parse the file, using the C parser: %s", e)
+            if position is not None:
+                source.seek(position)
+    return none_for_missing(pd.read_csv(source, **_c_options(source, usecols)))
+
+
+def read_csv_typed_chunks(source, chunksize: int, usecols: Optional[List[int]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Chunked variant of read_csv_typed with the C parser (pyarrow splits by
+    bytes, not rows); missing values are left as NaN
+    """
+    return pd.read_csv(source, chunksize=chunksize, **_c_options(source, usecols))
+
+
+def _read_pyarrow(source, usecols: Optional[List[int]]) -> pd.DataFrame:
+    """Typed read with pyarrow, columns named like the C parser names them"""
+    header = probe_csv(source, 0).columns
+    positions = range(len(header)) if usecols is None else usecols
+    # Positional names, so duplicated headers are told apart like pandas does
+    names = [f"f{pos}" for pos in range(len(header))]
+    options = {
+        'read_options': pyarrow_csv.ReadOptions(column_names=names, skip_rows=1),
+        'parse_options': pyarrow_csv.ParseOptions(newlines_in_values=True),
+        'convert_options': pyarrow_csv.ConvertOptions(
+            column_types={names[pos]: pyarrow.string() for pos in positions},
+            include_columns=[names[pos] for pos in positions],
+            null_values=list(NA_VALUES),
+            strings_can_be_null=True
+        ),
+    }
+    if _is_path(source):
+        with pyarrow.memory_map(os.fspath(source)) as mapped:
+            table = pyarrow_csv.read_csv(mapped, **options)
+    else:
+        table = pyarrow_csv.read_csv(source, **options)
+    df = table.to_pandas()
+    df.columns = [header[pos] for pos in positions]
+    return df
@@ -0,0 +1,160 @@
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .json_writer import entry_encoder
+from .normalizer import REJECTION_REASONS, DataNormalizer
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+# Records normalized per batch by /normalize
+RECORD_BATCH_SIZE = int(os.getenv("RECORD_BATCH_SIZE", "5000"))
+
+# Normalized NDJSON kept in memory while the request body is still being
+# received, larger results spill to a temporary file
+RECORD_SPOOL_BYTES = int(os.getenv("RECORD_SPOOL_BYTES", str(16 << 20)))
+
+# Reason given for input that is not a JSON object, on top of the rule reasons
+INVALID_RECORD = 'record'
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _text(value) -> str:
+    """A field as stripped text, with a missing or null field as empty"""
+    return '' if value is None else str(value).strip()
+
+
+def normalize_record(record: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Normalize one record with explicit field names: firstname and lastname,
+    or fullname split on its first space like format 2, plus phonenumber,
+    zipcode and color. A missing or null field counts as empty and the
+    record is rejected for it; a record without any name field is read
+    through fullname
+    Returns (entry, None) when valid, or (None, reason) with the first rule it
+    fails, in the same order as REJECTION_REASONS
+    """
+    get = record.get
+    if 'firstname' in record or 'lastname' in record:
+        firstname = _text(get('firstname'))
+        lastname = _text(get('lastname'))
+    else:
+        firstname, _, lastname = _text(get('fullname')).partition(' ')
+    if not firstname or not lastname:
+        return None, 'name'
+
+    phonenumber = DataNormalizer.normalize_phone(get('phonenumber'))
+    if not phonenumber:
+        return None, 'phone'
+
+    zipcode = DataNormalizer.validate_zip(get('zipcode'))
+    if not zipcode:
+        return None, 'zip'
+
+    color = _text(get('color'))
+    if not color:
+        return None, 'color'
+
+    return {
+        'firstname': firstname,
+        'lastname': lastname,
+        'phonenumber': phonenumber,
+        'zipcode': zipcode,
+        'color': color
+    }, None
+
+
+def normalize_batch(records: List[Tuple[int, Union[bytes, Dict]]]) -> Tuple[bytes, int, Dict[str, int]]:
+    """
+    Normalize a batch of records into NDJSON (runs in a worker process when available)
+
+    records holds (line, record) pairs where record is a raw NDJSON line or an
+    already decoded value. Every record gives one output line, in input order:
+    {"line": n, "entry": {...}} or {"line": n, "error": reason}
+
+    Returns (NDJSON bytes, records handled, rejected records by reason)
+    """
+    encode = entry_encoder(False)
+    reasons = dict.fromkeys(REJECTION_REASONS + (INVALID_RECORD,), 0)
+    out = []
+    for line, record in records:
+        if isinstance(record, (bytes, str)):
+            try:
+                record = _loads(record)
+            except ValueError:
+                record = None
+        if isinstance(record, dict):
+            entry, reason = normalize_record(record)
+        else:
+            entry, reason = None, INVALID_RECORD
+        if reason:
+            reasons[reason] += 1
+            out.append(encode({'line': line, 'error': reason}))
+        else:
+            out.append(encode({'line': line, 'entry': entry}))
+    out.append('')
+    return '\n'.join(out).encode('utf-8'), len(records), reasons
+
+
+class RecordBatcher:
+    """
+    Splits an NDJSON byte stream, fed in arbitrary chunks, into batches of
+    (line, text) records. Lines count from 0 and include blank lines, which
+    are skipped, so they point into the input
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size or RECORD_BATCH_SIZE
+        self.line = 0
+        self._rest = b''
+        self._batch = []
+
+    def feed(self, chunk: bytes) -> List[List[Tuple[int, bytes]]]:
+        """Batches completed by a chunk of the stream"""
+        lines = (self._rest + chunk).split(b'\n')
+        self._rest = lines.pop()
+        return self._add(lines)
+
+    def close(self) -> List[List[Tuple[int, bytes]]]:
+        """The remaining records at the end of the stream"""
+        batches = self._add([self._rest])
+        self._rest = b''
+        if self._batch:
+            batches.append(self._batch)
+            self._batch = []
+        return batches
+
+    def _add(self, lines: List[bytes]) -> List[List[Tuple[int, bytes]]]:
+        records = self._batch
+        records.extend((line, text) for line, text in enumerate(lines, self.line) if text.strip())
+        self.line += len(lines)
+        if len(records) < self.size:
+            return []
+        cut = len(records) - len(records) % self.size
+        self._batch = records[cut:]
+        return [records[start:start + self.size] for start in range(0, cut, self.size)]
+
+
+def iter_batches(records: Iterable[Tuple[int, Union[bytes, Dict]]], size: int = None) -> Iterator[List]:
+    """Consecutive lists of at most size (line, record) pairs"""
+    size = size or RECORD_BATCH_SIZE
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_array(body: bytes) -> List[Tuple[int, object]]:
+    """(index, value) of every element of a JSON array body; ValueError if it is not one"""
+    values = _loads(body)
+    if not isinstance(values, list):
+        raise ValueError("expected a JSON array of records")
+    return list(enumerate(values))
@@ -0,0 +1,87 @@
+import os
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_integer_dtype, is_unsigned_integer_dtype
+
+# Anything that is not a decimal digit (Unicode aware, like the original rules)
+NON_DIGITS = re.compile(r'\D')
+
+# Separators found in phone numbers and ZIP codes, removed before the ASCII fast path
+_SEPARATORS = str.maketrans('', '', ' -().+/')
+
+# Distinct raw values remembered by normalize_phone / validate_zip
+MEMO_SIZE = int(os.getenv("NORMALIZER_MEMO_SIZE", "65536"))
+
+# Columns are normalized once per distinct value when the sampled rows repeat
+# at least this much (distinct / sampled below 1 - REPEAT_RATIO)
+REPEAT_RATIO = 0.5
+REPEAT_SAMPLE = 10000
+
+# 10**1 .. 10**19, to count the digits of unsigned 64-bit integers
+_POWERS_OF_TEN = np.array([10 ** k for k in range(1, 20)], dtype=np.uint64)
+
+
+def extract_digits(text: str) -> str:
+    """Decimal digits of a string, the same as re.sub(r'\\D', '', text)"""
+    stripped = text.translate(_SEPARATORS)
+    if stripped.isascii() and stripped.isdigit():
+        return stripped
+    return NON_DIGITS.sub('', text)
+
+
+@lru_cache(maxsize=MEMO_SIZE, typed=True)
+def normalize_phone(value) -> Optional[str]:
+    """xxx-xxx-xxxx for 10 digits, or 11 digits with a leading country code 1; None otherwise"""
+    if not value:
+        return None
+    digits = extract_digits(str(value))
+    if len(digits) == 10:
+        return f"{digits[0:3]}-{digits[3:6]}-{digits[6:10]}"
+    if len(digits) == 11 and digits[0] == '1':
+        return f"{digits[1:4]}-{digits[4:7]}-{digits[7:11]}"
+    return None
+
+
+@lru_cache(maxsize=MEMO_SIZE, typed=True)
+def validate_zip(value) -> Optional[str]:
+    """The 5 digits of a ZIP code, None if it does not have exactly 5"""
+    if not value:
+        return None
+    digits = extract_digits(str(value).strip())
+    return digits if len(digits) == 5 else None
+
+
+def digits_column(column: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    """
+    Digits of str(value) for every value of a column, and how many there are
+
+    Integer columns are handled arithmetically without going through strings
+    for validation; text columns that repeat a lot are normalized once per
+    distinct value
+    """
+    if is_integer_dtype(column.dtype):
+        values = column.to_numpy()
+        if is_unsigned_integer_dtype(column.dtype):
+            magnitude = values.astype(np.uint64)
+        else:
+            # abs() of the minimum int64 wraps around, its uint64 view is still right
+            magnitude = np.abs(values.astype(np.int64)).view(np.uint64)
+        lengths = np.searchsorted(_POWERS_OF_TEN, magnitude, side='right') + 1
+        digits = magnitude.astype(str).astype(object)
+        return pd.Series(digits, index=column.index), lengths
+
+    texts = column.astype(str).to_numpy(dtype=object)
+    sample = texts[:REPEAT_SAMPLE]
+    if len(sample) and len(pd.unique(sample)) <= len(sample) * (1 - REPEAT_RATIO):
+        # A dict, not pd.factorize: factorize hashes strings up to their
+        # first NUL, so '12345\x006' would take the digits of '12345'
+        memo = {text: extract_digits(text) for text in set(texts)}
+        digits = np.array(list(map(memo.__getitem__, texts)), dtype=object)
+    else:
+        digits = np.array([extract_digits(text) for text in texts], dtype=object)
+    lengths = np.fromiter(map(len, digits), dtype=np.int64, count=len(digits))
+    return pd.Series(digits, index=column.index), lengths
@@ -0,0 +1,188 @@
+import gc
+import heapq
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .entry import Entry
+
+# Sort keys up to this many characters are kept as a fixed-width unicode
+# array, which numpy sorts without calling back into Python; a longer key
+# makes the whole array fall back to Python strings
+KEY_WIDTH = int(os.getenv("SORT_KEY_WIDTH", "32"))
+
+# Entries an ExternalSorter keeps in memory before spilling its runs to disk,
+# 0 spills every run
+SORT_MEMORY_ROWS = int(os.getenv("SORT_MEMORY_ROWS", "0"))
+
+# Entries per pickled block of a spilled run, one block per run is in memory while merging
+RUN_BLOCK_ROWS = 4096
+
+
+def sort_key(entry: Dict) -> Tuple[str, str]:
+    """Ordering used for normalized entries: lastname, then firstname (case-insensitive)"""
+    return (entry['lastname'].lower(), entry['firstname'].lower())
+
+
+def compact_keys(keys: Iterable[str]):
+    """
+    Lowercased names as an array numpy can sort on its own
+    Fixed-width unicode compares code point by code point, like str, except
+    that trailing NULs are dropped; keys longer than KEY_WIDTH or holding a NUL
+    stay an object array, so the order is always the one of sort_key
+    """
+    import numpy as np
+    keys = np.asarray(keys, dtype=object)
+    if len(keys) and (max(map(len, keys)) > KEY_WIDTH or any('\0' in key for key in keys)):
+        return keys
+    return keys.astype(str)
+
+
+def entry_keys(entries: List[Entry]) -> Tuple:
+    """Sort keys of entries as (lastname, firstname) arrays, see sort_key"""
+    return (
+        compact_keys([entry.lastname.lower() for entry in entries]),
+        compact_keys([entry.firstname.lower() for entry in entries]),
+    )
+
+
+def sort_order(lastname, firstname):
+    """Stable order of rows by (lastname, firstname) key arrays, like list.sort with sort_key"""
+    import numpy as np
+    return np.lexsort((firstname, lastname))
+
+
+def merge_order(keys: List[Tuple]):
+    """
+    Global order of sorted runs given their entry_keys, as indices into the
+    runs concatenated. The sort is stable, so ties keep run order like heapq.merge
+    """
+    import numpy as np
+    if not keys:
+        return np.empty(0, dtype=np.intp)
+    return sort_order(np.concatenate([key[0] for key in keys]), np.concatenate([key[1] for key in keys]))
+
+
+@contextmanager
+def gc_paused():
+    """
+    Suspend the cyclic garbage collector, restoring its previous state
+    Building and unpickling runs allocates millions of tuples and dicts that
+    cannot form cycles, and each burst would otherwise trigger collections
+    that walk every live object
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class ExternalSorter:
+    """
+    External merge sort for normalized entries
+    Each sorted chunk is a run that stores every entry with its sort key, so
+    keys are computed once. Runs stay in memory up to memory_rows entries,
+    then they are spilled to temporary files in pickled blocks, and the runs
+    are merged lazily so only one block per spilled run is held in memory
+    """
+
+    def __init__(self, max_runs: int = 64, memory_rows: int = None):
+        self.max_runs = max_runs
+        self.memory_rows = SORT_MEMORY_ROWS if memory_rows is None else memory_rows
+        self.runs = []
+        # Times the entries of each run have been merged into a bigger run
+        self.levels = []
+        self.count = 0
+        self.buffered = 0
+
+    def add_run(self, entries: List[Entry], keys: Tuple = None):
+        """Add an already sorted list of entries as a new run, keys as from entry_keys when known"""
+        if not entries:
+            return
+        if keys is None:
+            keys = entry_keys(entries)
+        with gc_paused():
+            self.runs.append(list(zip(zip(keys[0].tolist(), keys[1].tolist()), entries)))
+        self.levels.append(0)
+        self.count += len(entries)
+        self.buffered += len(entries)
+
+        if self.buffered > self.memory_rows:
+            self.runs = [self._write_run(run) if isinstance(run, list) else run for run in self.runs]
+
+        # Once the last max_runs runs share a level they are merged into one
+        # run of the next level, so open files stay bounded (under max_runs
+        # per level) and each entry is rewritten once per level, not on every
+        # collapse. Merging neighbouring runs keeps ties in run order
+        while len(self.runs) >= self.max_runs and len(set(self.levels[-self.max_runs:])) == 1:
+            runs = self.runs[-self.max_runs:]
+            if all(isinstance(run, list) for run in runs):
+                with gc_paused():
+                    merged = list(self._merge_runs(runs))
+            else:
+                merged = self._write_run(self._merge_runs(runs))
+                self._close_runs(runs)
+            self.runs[-self.max_runs:] = [merged]
+            self.levels[-self.max_runs:] = [self.levels[-1] + 1]
+        self.buffered = sum(len(run) for run in self.runs if isinstance(run, list))
+
+    def merge(self) -> Iterator[Entry]:
+        """Yield all entries in global sort order (stable across runs)"""
+        return map(itemgetter(1), self._merge_runs(self.runs))
+
+    def close(self):
+        """Delete all spilled runs"""
+        self._close_runs(self.runs)
+        self.runs = []
+        self.levels = []
+        self.buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @classmethod
+    def _merge_runs(cls, runs: List) -> Iterator[Tuple]:
+        return heapq.merge(*(cls._read_run(run) for run in runs), key=itemgetter(0))
+
+    @staticmethod
+    def _close_runs(runs: List):
+        for run in runs:
+            if not isinstance(run, list):
+                run.close()
+
+    @staticmethod
+    def _write_run(records: Iterable[Tuple]):
+        run = tempfile.TemporaryFile()
+        records = iter(records)
+        while True:
+            block = list(islice(records, RUN_BLOCK_ROWS))
+            if not block:
+                break
+            with gc_paused():
+                pickle.dump(block, run, protocol=pickle.HIGHEST_PROTOCOL)
+        run.flush()
+        return run
+
+    @staticmethod
+    def _read_run(run) -> Iterator[Tuple]:
+        if isinstance(run, list):
+            yield from run
+            return
+        run.seek(0)
+        while True:
+            try:
+                with gc_paused():
+                    block = pickle.load(run)
+            except EOFError:
+                return
+            yield from block
@@ -0,0 +1,75 @@
+"""
+Benchmark color statistics reads as normalized_data grows
+
+Grows normalized_data in steps and times get_color_counts (color_counts
+summary) against the full-table GROUP BY it replaced. The benchmark rows are
+removed and color_counts rebuilt at the end.
+
+    python benchmarks/bench_color_counts.py --step 250000 --steps 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.database import DatabaseManager
+from bench_db_insert import make_entries
+
+GROUP_BY_QUERY = """
+    SELECT color, COUNT(*) as count
+    FROM normalized_data
+    WHERE color IS NOT NULL AND color != ''
+    GROUP BY color
+    ORDER BY count DESC
+"""
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--step', type=int, default=250000, help="Rows added per step")
+    parser.add_argument('--steps', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if not db.connect():
+        sys.exit("Could not connect to PostgreSQL")
+    db.create_tables()
+
+    def group_by():
+        db.cursor.execute(GROUP_BY_QUERY)
+        db.cursor.fetchall()
+
+    entries = make_entries(args.step)
+    original_id = db.insert_original_data([])
+    print(f"{'rows':>12} {'group by ms':>12} {'summary ms':>12}")
+    try:
+        for _ in range(args.steps):
+            db.insert_normalized_data(entries, original_id)
+            db.cursor.execute("SELECT COUNT(*) FROM normalized_data")
+            rows = db.cursor.fetchone()[0]
+            full = best_of(args.repeat, group_by)
+            summary = best_of(args.repeat, db.get_color_counts)
+            print(f"{rows:>12} {full:>12.2f} {summary:>12.2f}")
+    finally:
+        db.cursor.execute("DELETE FROM normalized_data WHERE original_id = %s", (original_id,))
+        db.cursor.execute("DELETE FROM original_data WHERE id = %s", (original_id,))
+        db.commit()
+        db.rebuild_color_counts()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
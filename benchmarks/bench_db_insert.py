@@ -0,0 +1,67 @@
+"""
+Benchmark the normalized_data write paths against a local PostgreSQL
+
+Compares rows/sec for per-row INSERTs, execute_values batches and COPY.
+Uses the same DB_* environment variables as the application.
+
+    python benchmarks/bench_db_insert.py --rows 100000 --batch-size 5000
+"""
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.database import DatabaseManager, INSERT_METHODS
+from app.utils.entry import Entry
+
+
+def make_entries(rows: int):
+    """Random normalized entries"""
+    rng = random.Random(42)
+    colors = ['red', 'blue', 'green', 'yellow', 'purple']
+    return [
+        Entry(
+            firstname=''.join(rng.choices(string.ascii_letters, k=8)),
+            lastname=''.join(rng.choices(string.ascii_letters, k=10)),
+            phonenumber=f"{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            zipcode=f"{rng.randint(0, 99999):05d}",
+            color=rng.choice(colors)
+        )
+        for _ in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--methods', nargs='+', choices=INSERT_METHODS, default=list(INSERT_METHODS))
+    args = parser.parse_args()
+
+    db = DatabaseManager(batch_size=args.batch_size)
+    if not db.connect():
+        sys.exit("Could not connect to PostgreSQL")
+    db.create_tables()
+
+    entries = make_entries(args.rows)
+    print(f"{'method':<8} {'rows':>10} {'seconds':>10} {'rows/sec':>12}")
+    for method in args.methods:
+        original_id = db.insert_original_data([], commit=False)
+        start = time.perf_counter()
+        if not db.insert_normalized_data(entries, original_id, method=method, commit=False):
+            sys.exit(f"Insert with method '{method}' failed")
+        elapsed = time.perf_counter() - start
+        print(f"{method:<8} {args.rows:>10} {elapsed:>10.3f} {args.rows / elapsed:>12.0f}")
+
+        # Discard the benchmark rows (and their color_counts update) again
+        db.rollback()
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
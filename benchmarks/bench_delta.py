@@ -0,0 +1,118 @@
+"""
+Benchmark delta uploads of a feed against uploading the full snapshot
+
+A snapshot is generated and loaded once as a feed. Then for each change
+rate a copy with that fraction of rows edited (a tenth of them removed
+and as many new ones added) is uploaded both ways: the full path
+normalizes and stores every row like /upload, the delta path (feed
+uploads, app/utils/delta.py) only the rows that changed. Both run against
+a scratch schema that is dropped at the end. Times exclude parsing the
+CSV, which is the same for both; write volume is the WAL generated.
+
+    python benchmarks/bench_delta.py --rows 5000000 --change-rates 0.001 0.01 0.1
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.database import DatabaseManager
+from app.utils.delta import apply_snapshot, parse_key_fields
+from app.utils.normalizer import DataNormalizer
+from app.utils.reader import read_csv_typed
+from generate_dataset import generate_frame
+
+SCHEMA = 'bench_delta'
+
+
+def parse(df: pd.DataFrame) -> pd.DataFrame:
+    """A generated frame as the API reads it: through CSV, values as strings"""
+    return read_csv_typed(io.BytesIO(df.to_csv(index=False).encode('utf-8')))
+
+
+def edit(df: pd.DataFrame, rate: float, seed: int) -> pd.DataFrame:
+    """A snapshot with a fraction of its rows changed; a tenth of those are removed and as many added"""
+    rng = np.random.default_rng(seed)
+    count = int(len(df) * rate)
+    edited = df.copy()
+    rows = rng.choice(len(df), count, replace=False)
+    changed, removed = rows[count // 10:], rows[:count // 10]
+    edited.iloc[changed, 3] = np.where(edited.iloc[changed, 3] == 'red', 'blue', 'red')
+    edited = edited.drop(index=edited.index[removed])
+    added = generate_frame(len(removed), 1, rng=rng)
+    return pd.concat([edited, added], ignore_index=True)
+
+
+def measured(db: DatabaseManager, func):
+    """Seconds and WAL bytes of a call"""
+    db.cursor.execute("SELECT pg_current_wal_lsn()")
+    before = db.cursor.fetchone()[0]
+    db.commit()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    db.cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", (before,))
+    wal = float(db.cursor.fetchone()[0])
+    db.commit()
+    return seconds, wal, result
+
+
+def full_upload(db: DatabaseManager, df: pd.DataFrame):
+    """What /upload does with a whole snapshot, once parsed"""
+    entries, errors, lines = DataNormalizer.process_csv_data(df, csv_format=1, with_lines=True)
+    original_id = db.insert_original_frame(df, commit=False)
+    db.insert_normalized_data(entries, original_id, commit=False, lines=lines)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--change-rates', type=float, nargs='+', default=[0.001, 0.01, 0.1])
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--key', default='phonenumber', help="Key fields of the feed")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if not db.connect():
+        sys.exit("Could not connect to PostgreSQL")
+    db.cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    db.cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    db.cursor.execute(f"SET search_path TO {SCHEMA}")
+    db.commit()
+    try:
+        db.create_tables()
+        key_fields = parse_key_fields(args.key)
+        snapshot = generate_frame(args.rows, 1, args.error_rate)
+        base = parse(snapshot)
+
+        seconds, wal, result = measured(db, lambda: apply_snapshot(db, 'bench', base, 1, key_fields))
+        print(f"{args.rows} rows, initial load of the feed: {seconds:.1f} s, {wal / (1 << 20):.0f} MB WAL, "
+              f"{result['delta']}")
+        print(f"{'change rate':>12} {'changed':>9} {'full s':>8} {'full WAL MB':>12} {'delta s':>8} "
+              f"{'delta WAL MB':>13} {'speedup':>8}")
+        for i, rate in enumerate(args.change_rates):
+            current = parse(edit(snapshot, rate, seed=i + 1))
+            full_seconds, full_wal, _ = measured(db, lambda: full_upload(db, current))
+            delta_seconds, delta_wal, result = measured(db, lambda: apply_snapshot(db, 'bench', current, 1, key_fields))
+            delta = result['delta']
+            print(f"{rate:>12} {delta['inserted'] + delta['changed'] + delta['deleted']:>9} "
+                  f"{full_seconds:>8.1f} {full_wal / (1 << 20):>12.0f} {delta_seconds:>8.1f} "
+                  f"{delta_wal / (1 << 20):>13.1f} {full_seconds / delta_seconds:>7.1f}x")
+            # Back to the base snapshot for the next rate
+            apply_snapshot(db, 'bench', base, 1, key_fields)
+    finally:
+        db.rollback()
+        db.cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
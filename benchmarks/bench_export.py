@@ -0,0 +1,95 @@
+"""
+Benchmark the export formats of a result against result.json
+
+A generated upload is normalized once, then its entries are written in
+every format: result.json (indented, what Streamlit saves), compact JSON
+(what the API sends), NDJSON, Parquet and Arrow IPC. For each it reports
+the write time, the output size and the time a downstream job takes to load
+the entries back (json.loads, one json.loads per line, or pyarrow). The
+formats other than JSON leave the errors to a sidecar, its size is listed
+on its own.
+
+    python benchmarks/bench_export.py --rows 1000000
+"""
+import argparse
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils import exporter
+from app.utils.exporter import available_formats, write_entries, write_errors
+from app.utils.json_writer import write_result_json
+from app.utils.normalizer import DataNormalizer
+from generate_dataset import generate_frame
+
+CASES = ('result.json', 'compact json', 'ndjson', 'parquet', 'parquet zstd', 'arrow')
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def write_case(case: str, entries, errors) -> bytes:
+    buffer = io.BytesIO()
+    if case in ('result.json', 'compact json'):
+        write_result_json(buffer, entries, errors, pretty=case == 'result.json')
+    elif case == 'parquet zstd':
+        codec, exporter.PARQUET_COMPRESSION = exporter.PARQUET_COMPRESSION, 'zstd'
+        try:
+            write_entries(buffer, entries, 'parquet')
+        finally:
+            exporter.PARQUET_COMPRESSION = codec
+    else:
+        write_entries(buffer, entries, case)
+    return buffer.getvalue()
+
+
+def read_case(case: str, data: bytes) -> int:
+    """Entries loaded back from the output of a case"""
+    if case in ('result.json', 'compact json'):
+        return len(json.loads(data)['entries'])
+    if case == 'ndjson':
+        return len([json.loads(line) for line in data.splitlines()])
+    if case == 'arrow':
+        return exporter.pyarrow.ipc.open_file(exporter.pyarrow.BufferReader(data)).read_all().num_rows
+    return exporter.pyarrow_parquet.read_table(exporter.pyarrow.BufferReader(data)).num_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept")
+    args = parser.parse_args()
+
+    df = generate_frame(args.rows, 1, args.error_rate)
+    entries, errors = DataNormalizer.process_csv_data(df, csv_format=1)
+    cases = [case for case in CASES if case.split()[0] in available_formats() or 'json' in case]
+    sidecar = io.BytesIO()
+    write_errors(sidecar, errors)
+
+    print(f"{len(entries)} entries, {len(errors)} errors (sidecar {len(sidecar.getvalue()) / 1024:.0f} KB)")
+    print(f"{'format':<14} {'write s':>8} {'MB':>8} {'read s':>8} {'vs result.json':>15}")
+    baseline = None
+    for case in cases:
+        data = write_case(case, entries, errors)
+        assert read_case(case, data) == len(entries)
+        seconds = best_of(args.repeat, lambda: write_case(case, entries, errors))
+        read = best_of(args.repeat, lambda: read_case(case, data))
+        baseline = baseline or (seconds, len(data))
+        print(f"{case:<14} {seconds:>8.2f} {len(data) / (1 << 20):>8.1f} {read:>8.2f} "
+              f"{baseline[0] / seconds:>6.1f}x {len(data) / baseline[1]:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
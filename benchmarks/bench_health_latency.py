@@ -0,0 +1,86 @@
+"""
+Measure /health latency while large uploads are running
+
+Starts N concurrent /upload requests with a synthetic CSV and polls /health
+until they finish, then reports p50/p99 latency next to an idle baseline.
+Needs a running API and httpx (pip install httpx).
+
+    python benchmarks/bench_health_latency.py --url http://localhost:8000 --uploads 4 --rows 200000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+
+def make_csv(rows: int) -> bytes:
+    """Synthetic CSV in format 1"""
+    rng = random.Random(42)
+    lines = ["Lastname,Firstname,phonenumber,color,zipcode"]
+    for i in range(rows):
+        lines.append(
+            f"Last{rng.randint(0, 99999)},First{i},({rng.randint(200, 999)}) {rng.randint(100, 999)}-"
+            f"{rng.randint(1000, 9999)},{rng.choice(['red', 'blue', 'green'])},{rng.randint(10000, 99999)}"
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def poll_health(client: httpx.AsyncClient, done: asyncio.Event, interval: float):
+    """Latencies of /health requests (ms) until done is set"""
+    latencies = []
+    while not done.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(args):
+    data = make_csv(args.rows)
+    params = {"chunksize": args.chunksize} if args.chunksize else None
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        idle = asyncio.Event()
+        baseline_task = asyncio.create_task(poll_health(client, idle, args.interval))
+        await asyncio.sleep(2)
+        idle.set()
+        baseline = await baseline_task
+
+        done = asyncio.Event()
+        health_task = asyncio.create_task(poll_health(client, done, args.interval))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/upload", params=params, files={"file": ("bench.csv", data, "text/csv")})
+            for _ in range(args.uploads)
+        ))
+        upload_seconds = time.perf_counter() - start
+        done.set()
+        loaded = await health_task
+
+    print(f"uploads: {args.uploads} x {args.rows} rows in {upload_seconds:.2f}s "
+          f"(status {sorted({r.status_code for r in responses})})")
+    for name, samples in (("idle", baseline), ("under load", loaded)):
+        print(f"/health {name:<10} n={len(samples):<5} p50={statistics.median(samples):8.1f}ms "
+              f"p99={percentile(samples, 99):8.1f}ms max={max(samples):8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--uploads', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunksize', type=int, default=None, help="Use streaming mode with this chunk size")
+    parser.add_argument('--interval', type=float, default=0.05, help="Seconds between /health probes")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
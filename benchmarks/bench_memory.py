@@ -0,0 +1,76 @@
+"""
+Measure the memory held by normalized entries, in bytes per row
+
+A generated upload goes through CSV parsing and normalization like /upload
+does, and the entries it returns are measured next to the dicts entries
+used to be: one dict per entry with its own copy of every string (what
+parsing each CSV cell gave, rebuilt here by decoding the result JSON), and
+dicts sharing the interned strings of the Entry records, which separates
+the saving of the records from the saving of interning. The bytes of a
+case are those of the list, its records and every distinct string they
+point to, counted once. The size of the entries pickled, as the worker
+processes send them back, is listed too.
+
+    python benchmarks/bench_memory.py --rows 1000000
+"""
+import argparse
+import io
+import json
+import pickle
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.json_writer import result_json_bytes
+from app.utils.normalizer import DataNormalizer
+from app.utils.reader import read_csv_typed, resolve_schema
+from generate_dataset import generate_frame
+
+
+def held_bytes(entries) -> int:
+    """Bytes of a list of entries, their records and the distinct strings they hold"""
+    seen = set()
+    size = sys.getsizeof(entries)
+    for entry in entries:
+        size += sys.getsizeof(entry)
+        for value in entry.values():
+            if id(value) not in seen:
+                seen.add(id(value))
+                size += sys.getsizeof(value)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', type=int, default=1, choices=(1, 2, 3))
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    contents = generate_frame(args.rows, args.format, args.error_rate).to_csv(index=False).encode('utf-8')
+    source = io.BytesIO(contents)
+    csv_format, usecols = resolve_schema(source, None)
+    df = read_csv_typed(source, usecols)
+    del contents, source
+
+    entries = DataNormalizer.process_csv_data(df, csv_format=csv_format)[0]
+    cases = {
+        'dicts, own strings (before)': json.loads(result_json_bytes(entries, []))['entries'],
+        'dicts, interned strings': [entry.to_dict() for entry in entries],
+        'Entry, interned strings': entries,
+    }
+
+    count = len(entries)
+    print(f"{count} entries from {args.rows} rows (format {csv_format})")
+    print(f"{'entries':<30} {'bytes/row':>10} {'MB':>8} {'pickled bytes/row':>18}")
+    baseline = None
+    for name, value in cases.items():
+        size = held_bytes(value)
+        pickled = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        baseline = baseline or size
+        print(f"{name:<30} {size / count:>10.0f} {size / (1 << 20):>8.0f} {pickled / count:>18.0f}  {size / baseline:>5.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark original data storage layouts
+
+Stores the same synthetic upload with ORIGINAL_STORAGE=blob (one JSON document
+in original_data.raw_data) and rows (one original_rows row per CSV line), then
+reports insert time and on-disk size. The benchmark rows are removed at the end.
+
+    python benchmarks/bench_original_storage.py --rows 200000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.database import ORIGINAL_STORAGES, DatabaseManager
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """Synthetic upload in format 1 (Lastname, Firstname, phonenumber, color, zipcode)"""
+    return pd.DataFrame({
+        'Lastname': [f"Lastname{i % 997}" for i in range(rows)],
+        'Firstname': [f"Firstname{i % 101}" for i in range(rows)],
+        'phonenumber': [f"({i % 900 + 100}) {i % 1000:03d}-{i % 10000:04d}" for i in range(rows)],
+        'color': [('blue', 'red', 'green', 'yellow')[i % 4] for i in range(rows)],
+        'zipcode': [f"{i % 100000:05d}" for i in range(rows)],
+    })
+
+
+def stored_bytes(db: DatabaseManager, original_id: int) -> int:
+    """On-disk size of one upload's original data (TOAST included)"""
+    db.cursor.execute("""
+        SELECT COALESCE(pg_column_size(raw_data), 0) + COALESCE(pg_column_size(columns), 0)
+               + COALESCE(pg_column_size(raw_file), 0)
+        FROM original_data WHERE id = %s
+    """, (original_id,))
+    size = db.cursor.fetchone()[0]
+    db.cursor.execute("""
+        SELECT COALESCE(SUM(pg_column_size(r.*)), 0) FROM original_rows r WHERE original_id = %s
+    """, (original_id,))
+    return size + db.cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    raw_file = df.to_csv(index=False).encode()
+
+    print(f"{'storage':>8} {'insert s':>10} {'stored MB':>10} {'bytes/row':>10}")
+    for storage in ORIGINAL_STORAGES:
+        db = DatabaseManager(original_storage=storage)
+        if not db.connect():
+            sys.exit("Could not connect to PostgreSQL")
+        db.create_tables()
+        start = time.perf_counter()
+        original_id = db.insert_original_frame(df, raw_file=raw_file)
+        elapsed = time.perf_counter() - start
+        try:
+            size = stored_bytes(db, original_id)
+            print(f"{storage:>8} {elapsed:>10.2f} {size / (1 << 20):>10.2f} {size / args.rows:>10.1f}")
+        finally:
+            db.cursor.execute("DELETE FROM original_rows WHERE original_id = %s", (original_id,))
+            db.cursor.execute("DELETE FROM original_data WHERE id = %s", (original_id,))
+            db.commit()
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark plain against partitioned upload tables as history accumulates
+
+For each layout a scratch schema is filled month by month (oldest first,
+ending with the current month) with generated normalized_data rows. After
+each month it times an upload of --upload entries (rolled back), the color
+aggregate of the current month and the full color aggregate that
+rebuild-colors runs. At the end the oldest month is removed: DELETE on the
+plain table, drop_partitions on the partitioned one. The scratch schemas
+are dropped when done.
+
+    python benchmarks/bench_partitions.py --months 12 --rows-per-month 1000000
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.database import DatabaseManager, PARTITIONED_TABLES, period_start
+from bench_db_insert import make_entries
+
+LAYOUTS = ('none', 'monthly')
+QUERIES = ('insert', 'month agg', 'full agg')
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def month_starts(months: int) -> list:
+    """Starts of the last months months, oldest first, ending with the current one"""
+    starts = [period_start(datetime.now(), 'monthly')]
+    for _ in range(months - 1):
+        starts.insert(0, period_start(starts[0] - timedelta(days=1), 'monthly'))
+    return starts
+
+
+def run_layout(layout: str, args, entries) -> float:
+    """Fill one scratch schema month by month printing timings, returns the retention time in ms"""
+    schema = f"bench_partitions_{layout}"
+    db = DatabaseManager(partitioning=layout)
+    if not db.connect():
+        sys.exit("Could not connect to PostgreSQL")
+    db.cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    db.cursor.execute(f"CREATE SCHEMA {schema}")
+    db.cursor.execute(f"SET search_path TO {schema}")
+    db.commit()
+    try:
+        db.create_tables()
+        starts = month_starts(args.months)
+        if layout != 'none':
+            for table in PARTITIONED_TABLES:
+                db.create_partitions(table, starts[0], starts[-1])
+            db.commit()
+
+        def upload():
+            original_id = db.insert_original_data([], commit=False)
+            db.insert_normalized_data(entries, original_id, commit=False)
+            db.rollback()
+
+        def aggregate(where: str):
+            db.cursor.execute(f"""
+                SELECT color, COUNT(*) FROM normalized_data
+                WHERE color IS NOT NULL AND color != '' {where}
+                GROUP BY color
+            """)
+            db.cursor.fetchall()
+            db.commit()
+
+        print(f"\n{layout}")
+        print(f"{'rows':>12} " + ' '.join(f"{query + ' ms':>12}" for query in QUERIES))
+        rows = 0
+        for start in starts:
+            # The month's rows in bulk, timestamped inside the month
+            db.cursor.execute("""
+                INSERT INTO normalized_data (firstname, lastname, phonenumber, zipcode, color, original_id, upload_timestamp)
+                SELECT md5(g::text), md5((g * 7)::text), '555-555-0000', lpad((g %% 100000)::text, 5, '0'),
+                       (ARRAY['red', 'blue', 'green', 'yellow', 'purple'])[1 + g %% 5], NULL,
+                       %s + make_interval(secs => g %% 86400)
+                FROM generate_series(1, %s) AS g
+            """, (start, args.rows_per_month))
+            db.cursor.execute("ANALYZE normalized_data")
+            db.commit()
+            rows += args.rows_per_month
+            timings = {
+                'insert': best_of(args.repeat, upload),
+                'month agg': best_of(args.repeat, lambda: aggregate(
+                    "AND upload_timestamp >= date_trunc('month', LOCALTIMESTAMP)"
+                )),
+                'full agg': best_of(args.repeat, lambda: aggregate('')),
+            }
+            print(f"{rows:>12} " + ' '.join(f"{timings[query]:>12.1f}" for query in QUERIES))
+
+        # Retention: remove the oldest month
+        begin = time.perf_counter()
+        if layout == 'none':
+            db.cursor.execute("DELETE FROM normalized_data WHERE upload_timestamp < %s", (starts[1],))
+            db.commit()
+        else:
+            db.drop_partitions(starts[1])
+        return (time.perf_counter() - begin) * 1000
+    finally:
+        db.rollback()
+        db.cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        db.commit()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--months', type=int, default=6)
+    parser.add_argument('--rows-per-month', type=int, default=500000)
+    parser.add_argument('--upload', type=int, default=50000, help="Entries per timed upload")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    if args.months < 2:
+        parser.error("--months must be at least 2")
+
+    entries = make_entries(args.upload)
+    retention = {layout: run_layout(layout, args, entries) for layout in LAYOUTS}
+    print("\nRemoving the oldest month: " + ', '.join(
+        f"{'DELETE' if layout == 'none' else 'drop partition'} {ms:.1f} ms" for layout, ms in retention.items()
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark the normalization pipeline stage by stage on synthetic uploads
+
+For every size and format a dataset is generated (see generate_dataset.py) and
+run through the same steps as /upload: detect (on the first rows), parse,
+normalize (per part), sort (merge of the parts), serialize and, with --db, the
+database write, which is rolled back afterwards. Each case runs in a fresh process so its peak RSS
+is measured on its own. Results are saved as JSON; --compare prints the
+speedup per stage against an earlier results file.
+
+    python benchmarks/bench_pipeline.py --rows 1000 100000 1000000 --formats 1 2 3 --db
+    python benchmarks/bench_pipeline.py --rows 100000 --compare benchmarks/results/pipeline-abc1234.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+STAGES = ('parse', 'detect', 'normalize', 'sort', 'serialize', 'db_write')
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(path: str, repeat: int, part_rows: int, with_db: bool) -> Dict:
+    """Time each stage on one dataset (runs in its own process), fastest of repeat runs"""
+    from api.api import read_csv_frame
+    from app.utils.database import DatabaseManager
+    from app.utils.json_writer import result_json_bytes
+    from app.utils.parallel import merge_results, normalize_chunk, split_frame
+    from app.utils.reader import resolve_schema
+
+    baseline_mb = peak_rss_mb()
+    contents = Path(path).read_bytes()
+    db = None
+    if with_db:
+        db = DatabaseManager()
+        if not db.connect():
+            raise RuntimeError("Could not connect to PostgreSQL")
+        db.create_tables()
+
+    timings = {stage: [] for stage in STAGES if with_db or stage != 'db_write'}
+    for _ in range(repeat):
+        def timed(stage, func, *args):
+            start = time.perf_counter()
+            result = func(*args)
+            timings[stage].append(time.perf_counter() - start)
+            return result
+
+        csv_format, usecols = timed('detect', resolve_schema, io.BytesIO(contents))
+        df = timed('parse', read_csv_frame, contents, usecols)
+        results = timed('normalize', lambda: [
+            normalize_chunk(part, csv_format, True) for part in split_frame(df, part_rows)
+        ])
+        entries, errors, lines = timed('sort', merge_results, results)
+        timed('serialize', result_json_bytes, entries, errors)
+        if db:
+            def write():
+                original_id = db.insert_original_frame(df, raw_file=contents, commit=False)
+                if original_id is None or not db.insert_normalized_data(entries, original_id, commit=False, lines=lines):
+                    raise RuntimeError("Database write failed")
+            timed('db_write', write)
+            db.rollback()
+
+    if db:
+        db.close()
+    rows = len(df)
+    stages = {stage: min(values) for stage, values in timings.items()}
+    total = sum(stages.values())
+    return {
+        'rows': rows,
+        'format': csv_format,
+        'entries': len(entries),
+        'errors': len(errors),
+        'file_bytes': len(contents),
+        'stages': stages,
+        'rows_per_sec': {stage: rows / seconds if seconds else None for stage, seconds in stages.items()},
+        'total_seconds': total,
+        'total_rows_per_sec': rows / total if total else None,
+        'baseline_rss_mb': baseline_mb,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked out commit, if any"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(cases: List[Dict], baseline_path: str):
+    """Print per-stage speedups against an earlier results file (>1 is faster)"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(case['rows'], case['format']): case for case in baseline['cases']}
+    print(f"\nSpeedup vs {baseline.get('commit') or baseline_path}")
+    print(f"{'rows':>10} {'fmt':>4} " + ' '.join(f"{stage:>10}" for stage in STAGES) + f" {'total':>10}")
+    for case in cases:
+        old = previous.get((case['rows'], case['format']))
+        if not old:
+            continue
+        ratios = [
+            f"{old['stages'][stage] / case['stages'][stage]:>10.2f}"
+            if stage in case['stages'] and stage in old['stages'] and case['stages'][stage] else f"{'-':>10}"
+            for stage in STAGES
+        ]
+        shared = [stage for stage in case['stages'] if stage in old['stages']]
+        new_total = sum(case['stages'][stage] for stage in shared)
+        total = sum(old['stages'][stage] for stage in shared) / new_total if new_total else 0
+        print(f"{case['rows']:>10} {case['format']:>4} " + ' '.join(ratios) + f" {total:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--formats', type=int, nargs='+', choices=[1, 2, 3], default=[1, 2, 3])
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--phone-styles', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept")
+    parser.add_argument('--part-rows', type=int, default=int(os.getenv("NORMALIZER_PART_ROWS", "50000")))
+    parser.add_argument('--db', action='store_true', help="Also time the database write (rolled back)")
+    parser.add_argument('--data-dir', help="Keep generated datasets here and reuse them on later runs")
+    parser.add_argument('--output', help="Results file (default benchmarks/results/pipeline-<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    from generate_dataset import write_dataset
+
+    commit = git_commit()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="streaver_bench_")
+    os.makedirs(data_dir, exist_ok=True)
+
+    cases = []
+    print(f"{'rows':>10} {'fmt':>4} " + ' '.join(f"{stage:>10}" for stage in STAGES)
+          + f" {'rows/sec':>10} {'peak MB':>8}")
+    for rows in args.rows:
+        for csv_format in args.formats:
+            path = os.path.join(
+                data_dir, f"f{csv_format}-{rows}-e{args.error_rate}-p{args.phone_styles}.csv"
+            )
+            if not os.path.exists(path):
+                write_dataset(path, rows, csv_format, args.error_rate, args.phone_styles)
+
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                case = pool.submit(run_case, path, args.repeat, args.part_rows, args.db).result()
+            case['error_rate'] = args.error_rate
+            case['phone_styles'] = args.phone_styles
+            cases.append(case)
+
+            timings = ' '.join(
+                f"{case['stages'][stage] * 1000:>8.1f}ms" if stage in case['stages'] else f"{'-':>10}"
+                for stage in STAGES
+            )
+            print(f"{rows:>10} {csv_format:>4} {timings} {case['total_rows_per_sec']:>10.0f} "
+                  f"{case['peak_rss_mb']:>8.0f}")
+
+            if not args.data_dir:
+                os.remove(path)
+    if not args.data_dir:
+        os.rmdir(data_dir)
+
+    output = args.output or str(ROOT / "benchmarks" / "results" / f"pipeline-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'part_rows': args.part_rows,
+            'repeat': args.repeat,
+            'cases': cases,
+        }, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        compare(cases, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark /entries searches as normalized_data grows
+
+Grows normalized_data in steps and times search_normalized for each kind of
+filter: a lastname prefix, a deep page reached through its keyset cursor, a
+zipcode, a phone number, a color and an upload. For contrast, the same deep
+page read with OFFSET is timed too; it gets slower as the table grows while
+the indexed searches stay flat. The benchmark rows are removed and
+color_counts rebuilt at the end.
+
+    python benchmarks/bench_queries.py --step 2500000 --steps 8
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.database import DatabaseManager
+from bench_db_insert import make_entries
+
+QUERIES = ('prefix', 'cursor', 'zipcode', 'phone', 'color', 'upload', 'offset')
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--step', type=int, default=1000000, help="Rows added per step")
+    parser.add_argument('--steps', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=50, help="Entries per page")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if not db.connect():
+        sys.exit("Could not connect to PostgreSQL")
+    db.create_tables()
+
+    entries = make_entries(args.step)
+    sample = entries[len(entries) // 2]
+    original_id = db.insert_original_data([])
+
+    def offset_page(rows):
+        db.cursor.execute("""
+            SELECT id, firstname, lastname, phonenumber, zipcode, color, original_id, source_line
+            FROM normalized_data
+            ORDER BY lower(lastname) COLLATE "C", lower(firstname) COLLATE "C", id
+            OFFSET %s LIMIT %s
+        """, (rows // 2, args.limit))
+        db.cursor.fetchall()
+        db.commit()
+
+    print(f"{'rows':>12} " + ' '.join(f"{query + ' ms':>10}" for query in QUERIES))
+    try:
+        for _ in range(args.steps):
+            db.insert_normalized_data(entries, original_id)
+            db.cursor.execute("ANALYZE normalized_data")
+            db.cursor.execute("SELECT COUNT(*) FROM normalized_data")
+            rows = db.cursor.fetchone()[0]
+            db.commit()
+
+            # A cursor halfway through the table, as if paging from the start
+            after = (sample['lastname'].lower(), sample['firstname'].lower(), 0)
+            searches = {
+                'prefix': lambda: db.search_normalized(lastname_prefix=sample['lastname'][:3], limit=args.limit),
+                'cursor': lambda: db.search_normalized(limit=args.limit, after=after),
+                'zipcode': lambda: db.search_normalized(zipcode=sample['zipcode'], limit=args.limit),
+                'phone': lambda: db.search_normalized(phonenumber=sample['phonenumber'], limit=args.limit),
+                'color': lambda: db.search_normalized(color=sample['color'], limit=args.limit),
+                'upload': lambda: db.search_normalized(original_id=original_id, limit=args.limit),
+                'offset': lambda: offset_page(rows),
+            }
+            timings = {query: best_of(args.repeat, searches[query]) for query in QUERIES}
+            print(f"{rows:>12} " + ' '.join(f"{timings[query]:>10.2f}" for query in QUERIES))
+    finally:
+        db.cursor.execute("DELETE FROM normalized_data WHERE original_id = %s", (original_id,))
+        db.cursor.execute("DELETE FROM original_data WHERE id = %s", (original_id,))
+        db.commit()
+        db.rebuild_color_counts()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
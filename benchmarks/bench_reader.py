@@ -0,0 +1,100 @@
+"""
+Benchmark CSV parsing: the untyped read_csv the app used to call against the
+typed reader (app/utils/reader.py) with the C parser and with pyarrow
+
+Each reader runs in a fresh process on the same generated file, so its peak
+RSS is measured on its own. --extra-columns appends columns no format reads,
+to show the effect of skipping them while parsing.
+
+    python benchmarks/bench_reader.py --rows 1000000 --format 1 --extra-columns 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_pipeline import peak_rss_mb
+from generate_dataset import generate_frame
+
+READERS = ('legacy', 'typed-c', 'typed-pyarrow')
+
+
+def run_reader(path: str, reader: str, repeat: int) -> Dict:
+    """Parse a file repeat times with one reader (runs in its own process)"""
+    import pandas as pd
+    from app.utils.reader import read_csv_typed, resolve_schema
+
+    baseline_mb = peak_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if reader == 'legacy':
+            # read_csv with inferred types and NaN -> None, as before the typed reader
+            df = pd.read_csv(path)
+            df = df.replace({pd.NA: None, pd.NaT: None})
+            df = df.where(pd.notna(df), None)
+        else:
+            _, usecols = resolve_schema(path)
+            df = read_csv_typed(path, usecols, engine=reader.split('-')[1])
+        timings.append(time.perf_counter() - start)
+    return {
+        'seconds': min(timings),
+        'rows': len(df),
+        'columns': len(df.columns),
+        'frame_mb': df.memory_usage(deep=True).sum() / (1 << 20),
+        'peak_rss_mb': peak_rss_mb() - baseline_mb,
+    }
+
+
+def write_file(path: str, rows: int, csv_format: int, error_rate: float, extra_columns: int):
+    """Generated dataset plus extra_columns text columns that no format reads"""
+    df = generate_frame(rows, csv_format, error_rate)
+    for i in range(extra_columns):
+        df[f'notes{i}'] = df.iloc[:, 0] + ' lorem ipsum dolor sit amet'
+    df.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', type=int, choices=[1, 2, 3], default=1, dest='csv_format')
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--extra-columns', type=int, default=0, help="Unused text columns appended to every row")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per reader, the fastest is kept")
+    args = parser.parse_args()
+
+    from app.utils.reader import pyarrow
+
+    fd, path = tempfile.mkstemp(suffix='.csv', prefix='streaver_reader_')
+    os.close(fd)
+    try:
+        # Generated in another process too: the peak RSS carries over to spawned children
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            pool.submit(write_file, path, args.rows, args.csv_format, args.error_rate, args.extra_columns).result()
+
+        print(f"{os.path.getsize(path) / (1 << 20):.0f} MB, {args.rows} rows, format {args.csv_format}")
+        print(f"{'reader':<15} {'seconds':>8} {'rows/sec':>10} {'frame MB':>9} {'peak MB':>8}")
+        legacy = None
+        for reader in READERS:
+            if reader == 'typed-pyarrow' and pyarrow is None:
+                print(f"{reader:<15} skipped, pyarrow is not installed")
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                result = pool.submit(run_reader, path, reader, args.repeat).result()
+            legacy = legacy or result
+            print(f"{reader:<15} {result['seconds']:>8.2f} {result['rows'] / result['seconds']:>10.0f} "
+                  f"{result['frame_mb']:>9.0f} {result['peak_rss_mb']:>8.0f}"
+                  f"  ({legacy['seconds'] / result['seconds']:.1f}x)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark /normalize against the CSV path on the same records
+
+The same generated rows are encoded as CSV, as NDJSON and as a JSON array
+with explicit field names. The CSV path parses the bytes into a frame with
+the typed reader and normalizes it (what /upload does before storing);
+the record paths split or parse the body and normalize it batch by batch
+into NDJSON lines (what /normalize does), with no DataFrame involved. With
+--workers the batches / frame parts are spread over a process pool like
+the API does.
+
+    python benchmarks/bench_records.py --rows 1000000 --workers 4
+"""
+import argparse
+import io
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.normalizer import FORMAT_FIELDS, DataNormalizer
+from app.utils.parallel import PART_ROWS, merge_results, normalize_chunk, split_frame
+from app.utils.reader import read_csv_typed, resolve_schema
+from app.utils.records import RecordBatcher, iter_batches, normalize_batch, parse_array
+from generate_dataset import generate_frame
+
+CASES = ('csv', 'ndjson', 'array')
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def encode_bodies(rows: int, csv_format: int, error_rate: float):
+    """CSV, NDJSON and JSON array bodies holding the same records"""
+    df = generate_frame(rows, csv_format, error_rate)
+    csv_body = df.to_csv(index=False).encode('utf-8')
+    records = [
+        dict(zip(FORMAT_FIELDS[csv_format], values))
+        for values in df.itertuples(index=False, name=None)
+    ]
+    ndjson_body = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+    array_body = json.dumps(records).encode('utf-8')
+    return csv_body, ndjson_body, array_body
+
+
+def run_csv(body: bytes, executor, csv_format: int) -> int:
+    source = io.BytesIO(body)
+    csv_format, usecols = resolve_schema(source, csv_format)
+    df = read_csv_typed(source, usecols)
+    if executor:
+        futures = [executor.submit(normalize_chunk, part, csv_format, True) for part in split_frame(df, PART_ROWS)]
+        result = merge_results([future.result() for future in futures])
+    else:
+        result = DataNormalizer.process_csv_data(df, csv_format=csv_format, with_lines=True)
+    return len(result[0]) + len(result[1])
+
+
+def run_batches(batches, executor) -> int:
+    results = executor.map(normalize_batch, batches) if executor else map(normalize_batch, batches)
+    return sum(len(output.splitlines()) for output, _, _ in results)
+
+
+def run_ndjson(body: bytes, executor, batch_size: int) -> int:
+    batcher = RecordBatcher(batch_size)
+    batches = batcher.feed(body) + batcher.close()
+    return run_batches(batches, executor)
+
+
+def run_array(body: bytes, executor, batch_size: int) -> int:
+    return run_batches(list(iter_batches(parse_array(body), batch_size)), executor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', type=int, choices=[1, 2, 3], default=1, dest='csv_format')
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    parser.add_argument('--batch-size', type=int, default=None, help="Records per /normalize batch")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes, 0 runs inline")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept")
+    args = parser.parse_args()
+
+    bodies = dict(zip(CASES, encode_bodies(args.rows, args.csv_format, args.error_rate)))
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers else None
+    runners = {
+        'csv': lambda: run_csv(bodies['csv'], executor, args.csv_format),
+        'ndjson': lambda: run_ndjson(bodies['ndjson'], executor, args.batch_size),
+        'array': lambda: run_array(bodies['array'], executor, args.batch_size),
+    }
+    try:
+        print(f"{args.rows} rows, format {args.csv_format}, {args.workers or 'no'} workers")
+        print(f"{'case':<8} {'body MB':>8} {'seconds':>8} {'rows/sec':>10}")
+        baseline = None
+        for case in CASES:
+            assert runners[case]() == args.rows
+            seconds = best_of(args.repeat, runners[case])
+            baseline = baseline or seconds
+            print(f"{case:<8} {len(bodies[case]) / (1 << 20):>8.0f} {seconds:>8.2f} {args.rows / seconds:>10.0f}"
+                  f"  ({baseline / seconds:.2f}x)")
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Microbenchmarks for the normalizer's validation rules
+
+Times each rule in app/utils/rules.py against the inline-regex version it
+replaced, on unique and heavily repeated values, and the column-wise digit
+extraction on text and int64 columns.
+
+    python benchmarks/bench_rules.py --values 200000 --distinct 2000
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils import rules
+from generate_dataset import generate_frame
+
+
+def legacy_normalize_phone(phone_str):
+    """normalize_phone before the rule engine"""
+    if not phone_str:
+        return None
+    digits = re.sub(r'\D', '', str(phone_str))
+    if len(digits) == 10:
+        return f"{digits[0:3]}-{digits[3:6]}-{digits[6:10]}"
+    elif len(digits) == 11 and digits[0] == '1':
+        return f"{digits[1:4]}-{digits[4:7]}-{digits[7:11]}"
+    return None
+
+
+def legacy_validate_zip(zip_str):
+    """validate_zip before the rule engine"""
+    if not zip_str:
+        return None
+    zip_clean = str(zip_str).strip()
+    if re.match(r'^\d{5}$', zip_clean):
+        return zip_clean
+    digits = re.sub(r'\D', '', zip_clean)
+    return digits if len(digits) == 5 else None
+
+
+def legacy_digits_column(column: pd.Series):
+    """Column-wise digit extraction before the rule engine"""
+    digits = column.astype(str).str.replace(r'\D', '', regex=True)
+    return digits, digits.str.len().to_numpy()
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        rules.normalize_phone.cache_clear()
+        rules.validate_zip.cache_clear()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--values', type=int, default=200000)
+    parser.add_argument('--distinct', type=int, default=2000, help="Distinct values in the repeated data sets")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = generate_frame(args.values, 1, error_rate=0.05)
+    rng = np.random.default_rng(0)
+    phones = df['phonenumber'].tolist()
+    zips = df['zipcode'].tolist()
+    repeated_phones = list(rng.choice(phones[:args.distinct], args.values))
+    repeated_zips = list(rng.choice(zips[:args.distinct], args.values))
+    int_phones = pd.Series(rng.integers(10 ** 9, 2 * 10 ** 10, args.values))
+
+    cases = [
+        ("normalize_phone, unique", lambda: [legacy_normalize_phone(v) for v in phones],
+         lambda: [rules.normalize_phone(v) for v in phones]),
+        ("normalize_phone, repeated", lambda: [legacy_normalize_phone(v) for v in repeated_phones],
+         lambda: [rules.normalize_phone(v) for v in repeated_phones]),
+        ("validate_zip, unique", lambda: [legacy_validate_zip(v) for v in zips],
+         lambda: [rules.validate_zip(v) for v in zips]),
+        ("validate_zip, repeated", lambda: [legacy_validate_zip(v) for v in repeated_zips],
+         lambda: [rules.validate_zip(v) for v in repeated_zips]),
+        ("digits column, text", lambda: legacy_digits_column(df['phonenumber']),
+         lambda: rules.digits_column(df['phonenumber'])),
+        ("digits column, repeated text", lambda: legacy_digits_column(pd.Series(repeated_phones)),
+         lambda: rules.digits_column(pd.Series(repeated_phones))),
+        ("digits column, int64", lambda: legacy_digits_column(int_phones),
+         lambda: rules.digits_column(int_phones)),
+    ]
+
+    print(f"{'rule':<30} {'legacy ms':>10} {'rules ms':>10} {'speedup':>8}")
+    for name, legacy, current in cases:
+        before = best_of(args.repeat, legacy)
+        after = best_of(args.repeat, current)
+        print(f"{name:<30} {before:>10.1f} {after:>10.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Benchmark the global sort of normalized entries
+
+In memory: a generated upload is normalized in parts (as the API does with
+a process pool) and the sorted parts are merged into one ordered result by
+heapq.merge calling sort_key per entry (the previous merge_results), by
+merge_results on the keys the workers computed, and by ExternalSorter with
+its runs kept in memory or spilled. Sorting all entries at once with
+list.sort is the reference: every case must give exactly its order, ties
+included.
+
+Spilled: a larger upload is streamed chunk by chunk, like the pipeline does,
+into ExternalSorter and into runs of JSON lines merged with sort_key (the
+previous spill format), and both merged streams are compared entry by
+entry. Only a chunk and one block per run are in memory, so --spill-rows
+can exceed RAM.
+
+    python benchmarks/bench_sort.py --rows 1000000 --spill-rows 10000000
+"""
+import argparse
+import heapq
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.parallel import create_executor, merge_results, normalize_chunk, split_frame
+from app.utils.sorting import ExternalSorter, sort_key
+from generate_dataset import generate_frame
+
+
+def best_of(repeat: int, func) -> float:
+    """Fastest of repeat runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+class JsonRuns:
+    """Runs as JSON lines merged with sort_key, all collapsed into one every max_runs runs (the previous ExternalSorter)"""
+
+    def __init__(self, max_runs: int = 64):
+        self.max_runs = max_runs
+        self.runs = []
+
+    def add_run(self, entries):
+        self.runs.append(self._write_run(entries))
+        if len(self.runs) >= self.max_runs:
+            runs = self.runs
+            self.runs = [self._write_run(self.merge())]
+            for run in runs:
+                run.close()
+
+    def merge(self):
+        return heapq.merge(*(map(json.loads, self._lines(run)) for run in self.runs), key=sort_key)
+
+    @staticmethod
+    def _write_run(entries):
+        run = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        for entry in entries:
+            run.write(json.dumps(entry, ensure_ascii=False))
+            run.write('\n')
+        run.flush()
+        return run
+
+    @staticmethod
+    def _lines(run):
+        run.seek(0)
+        yield from run
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+
+
+def sorter_case(results, memory_rows: int):
+    def run():
+        with ExternalSorter(memory_rows=memory_rows) as sorter:
+            for entries, _, _, keys in results:
+                sorter.add_run(entries, keys)
+            return list(sorter.merge())
+    return run
+
+
+def in_memory(rows: int, part_rows: int, repeat: int, executor, rng):
+    df = generate_frame(rows, 1, 0.05, rng=rng)
+    start = time.perf_counter()
+    parts = split_frame(df, part_rows)
+    results = list(executor.map(normalize_chunk, parts, [1] * len(parts), [True] * len(parts))) if executor else [
+        normalize_chunk(part, 1, True) for part in parts
+    ]
+    normalized = time.perf_counter() - start
+    reference = sorted((entry for result in results for entry in result[0]), key=sort_key)
+
+    cases = {
+        'heapq.merge (sort_key)': lambda: list(heapq.merge(*(result[0] for result in results), key=sort_key)),
+        'list.sort (sort_key)': lambda: sorted((entry for result in results for entry in result[0]), key=sort_key),
+        'merge_results (keys)': lambda: merge_results(results)[0],
+        'ExternalSorter in memory': sorter_case(results, rows),
+        'ExternalSorter spilled': sorter_case(results, 0),
+    }
+    print(f"{len(reference)} entries in {len(results)} parts, normalized in {normalized:.1f} s")
+    print(f"{'merge':<26} {'s':>8} {'vs heapq.merge':>15}")
+    baseline = None
+    for name, func in cases.items():
+        output = func()
+        if name.startswith('ExternalSorter'):
+            assert output == reference, name
+        else:
+            assert len(output) == len(reference) and all(a is b for a, b in zip(output, reference)), name
+        seconds = best_of(repeat, func)
+        baseline = baseline or seconds
+        print(f"{name:<26} {seconds:>8.2f} {baseline / seconds:>14.1f}x")
+
+
+def spilled(rows: int, chunksize: int, executor, rng):
+    sorters = {'JSON runs (sort_key)': JsonRuns(), 'ExternalSorter': ExternalSorter(memory_rows=0)}
+    added = dict.fromkeys(sorters, 0.0)
+    offset = 0
+    while offset < rows:
+        chunk = generate_frame(min(chunksize, rows - offset), 1, 0.05, rng=rng)
+        chunk.index += offset
+        offset += len(chunk)
+        parts = split_frame(chunk, (len(chunk) + 3) // 4)
+        # Parts stand in for the chunks the pipeline has in flight
+        results = list(executor.map(normalize_chunk, parts, [1] * len(parts), [True] * len(parts))) if executor else [
+            normalize_chunk(part, 1, True) for part in parts
+        ]
+        for entries, _, _, keys in results:
+            # The JSON runs get the dicts entries used to be
+            dicts = [entry.to_dict() for entry in entries]
+            for name, sorter in sorters.items():
+                start = time.perf_counter()
+                sorter.add_run(entries, keys) if isinstance(sorter, ExternalSorter) else sorter.add_run(dicts)
+                added[name] += time.perf_counter() - start
+
+    streams = {name: sorter.merge() for name, sorter in sorters.items()}
+    merged = dict.fromkeys(sorters, 0.0)
+    count = 0
+    while True:
+        batch = {}
+        for name, stream in streams.items():
+            start = time.perf_counter()
+            batch[name] = [entry for entry, _ in zip(stream, range(100000))]
+            merged[name] += time.perf_counter() - start
+        first, second = batch.values()
+        assert first == second, f"streams differ after {count} entries"
+        count += len(first)
+        if not first:
+            break
+    for sorter in sorters.values():
+        sorter.close()
+
+    print(f"{count} entries streamed in runs of {chunksize // 4} rows")
+    print(f"{'spill':<26} {'add s':>8} {'merge s':>8} {'total s':>8}")
+    for name in sorters:
+        print(f"{name:<26} {added[name]:>8.1f} {merged[name]:>8.1f} {added[name] + merged[name]:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help="Rows of the in-memory case, 0 skips it")
+    parser.add_argument('--spill-rows', type=int, default=10000000, help="Rows of the spilled case, 0 skips it")
+    parser.add_argument('--part-rows', type=int, default=50000)
+    parser.add_argument('--chunksize', type=int, default=200000, help="Rows generated at once in the spilled case")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes, defaults to NORMALIZER_WORKERS")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case, the fastest is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    executor = create_executor(args.workers)
+    try:
+        if args.rows:
+            in_memory(args.rows, args.part_rows, args.repeat, executor, rng)
+        if args.spill_rows:
+            spilled(args.spill_rows, args.chunksize, executor, rng)
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Measure the cold start of the API
+
+For each run a fresh interpreter imports the API module under
+python -X importtime, which gives the total import time and the slowest
+modules, and a fresh uvicorn process is started and /health polled until it
+answers, from the moment the process is spawned. It also checks that
+importing the API does not load the modules that are meant to load lazily
+on the first upload. Exits with 1 when a check fails or a budget is
+exceeded, so it can run in CI.
+
+    python benchmarks/bench_startup.py --runs 5 --import-budget-ms 600 --health-budget-ms 2500
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULE = 'api.api'
+# Loaded on the first upload, never by importing the API
+LAZY_MODULES = ('pandas', 'numpy', 'pyarrow', 'app.utils.normalizer', 'app.utils.pipeline')
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, 'PYTHONPATH': str(ROOT)}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times() -> dict:
+    """Cumulative import time of every module, in ms, from -X importtime"""
+    times = {}
+    for line in run_python('-X', 'importtime', '-c', f'import {MODULE}').stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def loaded_lazy_modules() -> list:
+    """Modules of LAZY_MODULES that importing the API loads"""
+    code = f"import json, sys, {MODULE}; print(json.dumps([m for m in {list(LAZY_MODULES)!r} if m in sys.modules]))"
+    return json.loads(run_python('-c', code).stdout)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_health(timeout: float) -> float:
+    """Seconds from spawning uvicorn until /health answers"""
+    port = free_port()
+    env = {**os.environ, 'PYTHONPATH': str(ROOT), 'LOG_LEVEL': 'WARNING'}
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{MODULE}:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Cold starts measured, the median is reported")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imported packages listed")
+    parser.add_argument('--import-budget-ms', type=float, default=None, help="Fail above this median import time")
+    parser.add_argument('--health-budget-ms', type=float, default=None, help="Fail above this median time to /health")
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    total = statistics.median(times[MODULE] for times in runs)
+    # Top-level packages only, their submodules are part of their time
+    packages = [(name, ms) for name, ms in runs[-1].items() if '.' not in name]
+    slowest = sorted(packages, key=lambda item: item[1], reverse=True)[:args.top]
+    print(f"import {MODULE}: {total:.0f} ms (median of {args.runs})")
+    for name, ms in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    health = statistics.median(time_to_health(args.timeout) for _ in range(args.runs)) * 1000
+    print(f"time to first /health: {health:.0f} ms (median of {args.runs})")
+
+    failures = []
+    loaded = loaded_lazy_modules()
+    if loaded:
+        failures.append(f"importing {MODULE} loads {', '.join(loaded)}")
+    if args.import_budget_ms is not None and total > args.import_budget_ms:
+        failures.append(f"import time {total:.0f} ms over the {args.import_budget_ms:.0f} ms budget")
+    if args.health_budget_ms is not None and health > args.health_budget_ms:
+        failures.append(f"time to /health {health:.0f} ms over the {args.health_budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Generate synthetic CSV uploads in the three supported formats
+
+Rows are written in chunks, so files of millions of rows never need to fit in
+memory. A fraction of the rows (--error-rate) gets an invalid phone number or
+ZIP code, and phone numbers are spread over --phone-styles different notations.
+
+    python benchmarks/generate_dataset.py --rows 1000000 --format 2 --error-rate 0.05 -o /tmp/upload.csv
+"""
+import argparse
+import string
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Header of each supported format, in column order
+FORMAT_COLUMNS = {
+    1: ['Lastname', 'Firstname', 'phonenumber', 'color', 'zipcode'],
+    2: ['Firstname Lastname', 'color', 'zipcode', 'phonenumber'],
+    3: ['Firstname', 'Lastname', 'zipcode', 'phonenumber', 'color'],
+}
+
+# Phone notations, all normalized to xxx-xxx-xxxx
+PHONE_STYLES = (
+    '{a}-{b}-{c}',
+    '({a}) {b}-{c}',
+    '{a} {b} {c}',
+    '{a}.{b}.{c}',
+    '{a}{b}{c}',
+    '+1 {a} {b} {c}',
+    '1-{a}-{b}-{c}',
+)
+
+FIRSTNAMES = np.array([
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+    'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Lucia', 'Mateo', 'Sofia', 'Santiago', 'Valentina', 'Martina', 'Juan', 'Camila', 'Diego', 'Agustina',
+], dtype=object)
+LASTNAMES = np.array([
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Suarez', 'Silva', 'Pereira', 'Fernandez', 'Gomez', 'Diaz', 'Alvarez', 'Romero', 'Sosa', 'Torres',
+], dtype=object)
+COLORS = np.array(['red', 'blue', 'green', 'yellow', 'purple', 'aqua marine', 'black', 'white'], dtype=object)
+
+
+def _digits(rng: np.random.Generator, rows: int, width: int, low: int = 0) -> pd.Series:
+    """Zero-padded random numbers of a fixed width"""
+    return pd.Series(rng.integers(low, 10 ** width, rows)).astype(str).str.zfill(width)
+
+
+def _format_phone(style: str, parts: Dict[str, pd.Series]) -> pd.Series:
+    """Fill a PHONE_STYLES template column-wise"""
+    result = ''
+    for literal, field, _, _ in string.Formatter().parse(style):
+        result = result + literal
+        if field:
+            result = result + parts[field]
+    return result
+
+
+def generate_frame(
+    rows: int,
+    csv_format: int,
+    error_rate: float = 0.0,
+    phone_styles: int = len(PHONE_STYLES),
+    rng: Optional[np.random.Generator] = None
+) -> pd.DataFrame:
+    """
+    Synthetic upload in one of the supported formats
+
+    Args:
+        rows: Number of rows
+        csv_format: 1, 2 or 3 (see FORMAT_COLUMNS)
+        error_rate: Fraction of rows with an invalid phone number or ZIP code
+        phone_styles: How many of PHONE_STYLES to use (1 = always xxx-xxx-xxxx)
+        rng: Random generator, a fixed seed by default
+
+    Returns:
+        DataFrame with the format's header, every value as a string
+    """
+    rng = rng or np.random.default_rng(42)
+    first = FIRSTNAMES[rng.integers(0, len(FIRSTNAMES), rows)]
+    last = LASTNAMES[rng.integers(0, len(LASTNAMES), rows)]
+    color = COLORS[rng.integers(0, len(COLORS), rows)]
+    # No leading zeros: read_csv would parse them away and turn valid ZIP codes into errors
+    zipcode = _digits(rng, rows, 5, 10000)
+
+    area, exchange, line = _digits(rng, rows, 3, 200), _digits(rng, rows, 3, 200), _digits(rng, rows, 4)
+    style = rng.integers(0, max(1, min(phone_styles, len(PHONE_STYLES))), rows)
+    phone = pd.Series('', index=range(rows), dtype=object)
+    for index in np.unique(style):
+        mask = style == index
+        phone[mask] = _format_phone(PHONE_STYLES[index], {'a': area[mask], 'b': exchange[mask], 'c': line[mask]})
+
+    # Invalid rows: a phone number one digit short, or a 4-digit ZIP code
+    invalid = rng.random(rows) < error_rate
+    bad_phone = invalid & (rng.random(rows) < 0.5)
+    phone[bad_phone] = area[bad_phone] + '-' + exchange[bad_phone] + '-' + line[bad_phone].str[:3]
+    bad_zip = invalid & ~bad_phone
+    zipcode[bad_zip] = zipcode[bad_zip].str[:4]
+
+    columns = {
+        1: [last, first, phone, color, zipcode],
+        2: [pd.Series(first) + ' ' + pd.Series(last), color, zipcode, phone],
+        3: [first, last, zipcode, phone, color],
+    }[csv_format]
+    return pd.DataFrame(
+        {name: np.asarray(values, dtype=object) for name, values in zip(FORMAT_COLUMNS[csv_format], columns)}
+    )
+
+
+def write_dataset(
+    path,
+    rows: int,
+    csv_format: int,
+    error_rate: float = 0.0,
+    phone_styles: int = len(PHONE_STYLES),
+    seed: int = 42,
+    chunk_rows: int = 500000
+):
+    """Write a synthetic upload to path (a file name or text buffer) in chunks of chunk_rows"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, max(rows, 1), chunk_rows):
+        chunk = generate_frame(min(chunk_rows, rows - start), csv_format, error_rate, phone_styles, rng)
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--format', type=int, choices=sorted(FORMAT_COLUMNS), default=1, dest='csv_format')
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Fraction of invalid rows")
+    parser.add_argument('--phone-styles', type=int, default=len(PHONE_STYLES),
+                        help=f"Phone notations used, 1 to {len(PHONE_STYLES)}")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', default='-', help="CSV file to write, '-' for stdout")
+    args = parser.parse_args()
+
+    write_dataset(sys.stdout if args.output == '-' else args.output, args.rows, args.csv_format,
+                  args.error_rate, args.phone_styles, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Upload overrides that do not fit the file are rejected before processing"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.api import app
+
+CSV = b'Nombre,Apellido,CP,Tel,Color\nAnn,Lee,12345,123-456-7890,blue\nBo,Ray,54321,5551234567,red\n'
+MAPPING = {'firstname': 'Nombre', 'lastname': 'Apellido', 'zipcode': 'CP', 'phonenumber': 'Tel', 'color': 'Color'}
+URLS = ['/upload', '/upload?chunksize=1', '/upload?feed=test-api-mapping', '/jobs']
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def post(client, url, mapping):
+    return client.post(url, files={'file': ('contacts.csv', CSV)}, data={'columns': json.dumps(mapping)})
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_mapping_accepted(client, url):
+    assert post(client, url, MAPPING).status_code in (200, 202)
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_mapped_column_missing_from_header(client, url):
+    response = post(client, url, {**MAPPING, 'color': 'Colour'})
+    assert response.status_code == 422
+    assert 'Colour' in response.json()['detail']
+
+
+@pytest.mark.parametrize('url', URLS)
+@pytest.mark.parametrize('mapping', [
+    {field: column for field, column in MAPPING.items() if field != 'color'},
+    {**MAPPING, 'fullname': 'Nombre'},
+], ids=['missing', 'unknown'])
+def test_mapping_fields(client, url, mapping):
+    assert post(client, url, mapping).status_code == 422
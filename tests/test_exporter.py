@@ -0,0 +1,85 @@
+"""Entries exported as NDJSON, Parquet or Arrow read back as the same entries"""
+import io
+import json
+import random
+import zipfile
+
+import pytest
+
+from app.utils.entry import ENTRY_FIELDS, Entry
+from app.utils.exporter import check_format, errors_name, file_name, write_entries, write_output, write_result
+
+TEXTS = ['Ann', 'Lee', 'ÁLvarez', 'Zoë', '😀', 'a"b', 'tab\there', 'new\nline', '\x00', ' ']
+ZIPS = ['12345', '01234', '54321']
+COLORS = ['red', 'blue', 'light-orange']
+
+
+def random_entries(rng: random.Random, count: int, colors=COLORS):
+    return [
+        Entry(rng.choice(TEXTS), rng.choice(TEXTS), '555-123-4567', rng.choice(ZIPS), rng.choice(colors))
+        for _ in range(count)
+    ]
+
+
+def read_entries(data: bytes, fmt: str):
+    """Entries of an exported file, as dicts"""
+    if fmt == 'ndjson':
+        return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+    pyarrow = pytest.importorskip('pyarrow')
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(io.BytesIO(data))
+    else:
+        import pyarrow.ipc
+        table = pyarrow.ipc.open_file(pyarrow.BufferReader(data)).read_all()
+    assert table.column_names == list(ENTRY_FIELDS)
+    return table.to_pylist()
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'parquet', 'arrow'])
+@pytest.mark.parametrize('batch_rows', [1, 7, 1000])
+@pytest.mark.parametrize('seed', range(5))
+def test_round_trip(seed, batch_rows, fmt):
+    if fmt != 'ndjson':
+        pytest.importorskip('pyarrow')
+    rng = random.Random(seed)
+    # Colors first seen in later batches exercise the dictionary deltas
+    entries = random_entries(rng, rng.randint(0, 60), COLORS + [f'color{i}' for i in range(seed * 3)])
+    buffer = io.BytesIO()
+    assert write_entries(buffer, iter(entries), fmt, batch_rows=batch_rows) == len(entries)
+    assert read_entries(buffer.getvalue(), fmt) == [entry.to_dict() for entry in entries]
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'parquet', 'arrow'])
+def test_result_archive(fmt):
+    if fmt != 'ndjson':
+        pytest.importorskip('pyarrow')
+    entries = random_entries(random.Random(0), 20)
+    buffer = io.BytesIO()
+    write_result(buffer, entries, [3, 5], fmt)
+    with zipfile.ZipFile(buffer) as archive:
+        assert sorted(archive.namelist()) == sorted([file_name('result', fmt), errors_name('result')])
+        assert read_entries(archive.read(file_name('result', fmt)), fmt) == [entry.to_dict() for entry in entries]
+        assert json.loads(archive.read(errors_name('result'))) == {'errors': [3, 5]}
+
+
+@pytest.mark.parametrize('fmt', ['json', 'ndjson', 'parquet', 'arrow'])
+def test_write_output(tmp_path, fmt):
+    if fmt in ('parquet', 'arrow'):
+        pytest.importorskip('pyarrow')
+    entries = random_entries(random.Random(1), 10)
+    path = write_output(str(tmp_path), 'out', entries, [1], fmt)
+    data = open(path, 'rb').read()
+    if fmt == 'json':
+        assert json.loads(data) == {'entries': [entry.to_dict() for entry in entries], 'errors': [1]}
+    else:
+        assert read_entries(data, fmt) == [entry.to_dict() for entry in entries]
+        assert json.loads((tmp_path / errors_name('out')).read_bytes()) == {'errors': [1]}
+    assert not [name for name in tmp_path.iterdir() if name.suffix == '.tmp']
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        check_format('csv')
+    with pytest.raises(ValueError):
+        write_entries(io.BytesIO(), [], 'json')
@@ -0,0 +1,72 @@
+"""The incremental result writer gives the bytes json.dumps gives for the whole result"""
+import json
+import random
+
+import pytest
+
+from app.utils.entry import Entry
+from app.utils.json_writer import entry_encoder, iter_result_json, result_json_bytes
+
+# Text orjson and json could encode differently: non-ASCII, escapes, DEL and control characters
+TEXTS = ['Ann', 'ÁLvarez', 'Zoë', '李', '😀', 'a"b', 'back\\slash', 'tab\there', 'new\nline', '\x7f', '\x00', ' ', '']
+
+
+def random_entries(rng: random.Random, count: int):
+    return [
+        Entry(rng.choice(TEXTS), rng.choice(TEXTS), '555-123-4567', rng.choice(['12345', '01234']), rng.choice(TEXTS))
+        for _ in range(count)
+    ]
+
+
+def expected(entries, errors, pretty: bool) -> bytes:
+    result = {'entries': [entry.to_dict() for entry in entries], 'errors': errors}
+    if pretty:
+        # result.json
+        return json.dumps(result, indent=2, sort_keys=True).encode('utf-8')
+    # FastAPI's JSONResponse
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
+@pytest.mark.parametrize('backend', ['json', 'auto'])
+@pytest.mark.parametrize('pretty', [False, True], ids=['compact', 'pretty'])
+@pytest.mark.parametrize('seed', range(20))
+def test_same_bytes_as_json_dumps(seed, pretty, backend):
+    rng = random.Random(seed)
+    entries = random_entries(rng, rng.choice([0, 1, 2, rng.randint(3, 200)]))
+    errors = sorted(rng.sample(range(1000), rng.randint(0, 5)))
+    chunks = list(iter_result_json(iter(entries), errors, pretty=pretty, backend=backend, buffer_size=rng.randint(1, 512)))
+    assert b''.join(chunks) == expected(entries, errors, pretty)
+    assert result_json_bytes(entries, errors, pretty=pretty, backend=backend) == expected(entries, errors, pretty)
+
+
+@pytest.mark.parametrize('pretty', [False, True], ids=['compact', 'pretty'])
+def test_orjson_matches_json(pretty):
+    pytest.importorskip('orjson')
+    encode_orjson = entry_encoder(pretty, 'orjson')
+    encode_json = entry_encoder(pretty, 'json')
+    rng = random.Random(0)
+    for entry in random_entries(rng, 500):
+        assert encode_orjson(entry) == encode_json(entry)
+        # Entries nested in other values go through the default hook
+        assert encode_orjson({'line': 3, 'entry': entry}) == encode_json({'line': 3, 'entry': entry})
+
+
+def test_generator_is_closed():
+    closed = []
+
+    def entries():
+        try:
+            yield Entry('Ann', 'Lee', '555-123-4567', '12345', 'red')
+            yield Entry('Bo', 'Ray', '555-123-4567', '12345', 'red')
+        finally:
+            closed.append(True)
+
+    chunks = iter_result_json(entries(), [], buffer_size=1)
+    next(chunks)
+    chunks.close()
+    assert closed == [True]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        entry_encoder(False, 'ujson')
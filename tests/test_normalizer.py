@@ -0,0 +1,219 @@
+"""Parity of the vectorized engine of DataNormalizer.process_csv_data with the row loop, and format detection"""
+import io
+import random
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from app.utils import normalizer
+from app.utils.normalizer import DataNormalizer, SchemaCache
+
+DATASETS = sorted((Path(__file__).resolve().parent.parent / 'datasets').glob('*.csv'))
+
+FORMAT_COLUMNS = {
+    1: ['Lastname', 'Firstname', 'phonenumber', 'color', 'zipcode'],
+    2: ['Firstname Lastname', 'color', 'zipcode', 'phonenumber'],
+    3: ['Firstname', 'Lastname', 'zipcode', 'phonenumber', 'color'],
+}
+
+NAMES = ['Doe', 'smith', 'Smith', 'ÁLvarez', '', ' ', 'van Dyke', "o'Neil", 'Zed', 'a  b', '1234', None]
+PHONES = [
+    '123-456-7890', '(555) 123-4567', '1234567890', '+1 (555) 987-6543', '12345678901', '2345678901',
+    '555.123.4567', 'abc', '', None, 1234567890, 11234567890, 0, 'Invalid', '١٢٣٤٥٦٧٨٩٠',
+]
+ZIPS = ['12345', '01234', ' 54321 ', '1234', '123456', '12-345', None, 12345, 1234, '', 'Invalid']
+COLORS = ['red', ' blue ', '', None, 'green', 'light-orange']
+
+
+def assert_same_result(df, csv_format=None):
+    """Both engines give the same entries, errors and lines, entry by entry"""
+    rows = DataNormalizer.process_csv_data(df, engine='rows', csv_format=csv_format, with_lines=True)
+    vectorized = DataNormalizer.process_csv_data(df, engine='vectorized', csv_format=csv_format, with_lines=True)
+    for expected, actual in zip(rows, vectorized):
+        assert len(actual) == len(expected)
+        for position, (want, got) in enumerate(zip(expected, actual)):
+            assert got == want, f"position {position}"
+
+
+def random_frame(rng: random.Random, csv_format: int, rows: int) -> pd.DataFrame:
+    """Frame mixing valid and invalid values of every field, strings and numbers"""
+    data = []
+    for _ in range(rows):
+        first, last = rng.choice(NAMES), rng.choice(NAMES)
+        phone, zipcode, color = rng.choice(PHONES), rng.choice(ZIPS), rng.choice(COLORS)
+        if csv_format == 1:
+            data.append([last, first, phone, color, zipcode])
+        elif csv_format == 2:
+            data.append([f'{first} {last}' if rng.random() < 0.8 else first, color, zipcode, phone])
+        else:
+            data.append([first, last, zipcode, phone, color])
+    return pd.DataFrame(data, columns=FORMAT_COLUMNS[csv_format])
+
+
+@pytest.mark.parametrize('path', DATASETS, ids=lambda path: path.name)
+def test_datasets(path):
+    df = pd.read_csv(path)
+    assert_same_result(df.where(pd.notna(df), None))
+    assert_same_result(df)
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_fuzzed_frames(seed):
+    rng = random.Random(seed)
+    csv_format = rng.choice([1, 2, 3])
+    df = random_frame(rng, csv_format, rng.randint(0, 40))
+    # Index labels are the error line numbers, they need not start at 0
+    df.index = df.index * 3 + seed
+    assert_same_result(df)
+    assert_same_result(df, csv_format=csv_format)
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_csv_round_trip(seed):
+    rng = random.Random(seed)
+    df = random_frame(rng, rng.choice([1, 2, 3]), rng.randint(1, 40))
+    # read_csv turns numeric columns into int/float and blanks into NaN
+    df = pd.read_csv(io.StringIO(df.to_csv(index=False)))
+    assert_same_result(df)
+    assert_same_result(df.where(pd.notna(df), None))
+
+
+@pytest.mark.parametrize('csv_format', [1, 2, 3])
+@pytest.mark.parametrize('width', [0, 1, 2, 3, 4])
+def test_missing_columns(csv_format, width):
+    df = random_frame(random.Random(width), csv_format, 30)
+    assert_same_result(df.iloc[:, :width], csv_format=csv_format)
+
+
+@pytest.mark.parametrize('csv_format', [None, 1, 2, 3])
+def test_numeric_frames(csv_format):
+    df = pd.DataFrame({'a': [1, 2, 3], 'b': [1234567890, 5551234567, 15551234567], 'c': [12345.0, 2.0, 54321.0]})
+    assert_same_result(df, csv_format=csv_format)
+    assert_same_result(df.astype({'c': int}), csv_format=csv_format)
+    assert_same_result(df.iloc[:0], csv_format=csv_format)
+
+
+def test_ties_keep_file_order():
+    df = pd.DataFrame(
+        [['doe', 'John', '1234567890', 'red', '12345'], ['Doe', 'john', '5551234567', 'blue', '54321']] * 5,
+        columns=FORMAT_COLUMNS[1],
+    )
+    assert_same_result(df)
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        DataNormalizer.process_csv_data(pd.DataFrame(columns=FORMAT_COLUMNS[1]), engine='columns')
+
+
+@pytest.mark.parametrize('csv_format', [1, 2, 3])
+def test_nul_values_are_distinct(csv_format):
+    # Repeated values go through a per-value memo, 'x\0y' must not share the entry of 'x'
+    columns = {'zipcode': ['12345\x006', '12345'] * 5, 'phonenumber': ['555-123-4567\x001', '5551234567'] * 5}
+    for field, values in columns.items():
+        df = random_frame(random.Random(0), csv_format, 10)
+        df['zipcode'], df['phonenumber'], df['color'] = '12345', '5551234567', 'red'
+        df.iloc[:, 0] = 'Ann Lee' if csv_format == 2 else 'Ann'
+        if csv_format != 2:
+            df.iloc[:, 1] = 'Lee'
+        df[field] = values
+        assert_same_result(df)
+        assert DataNormalizer.process_csv_data(df, engine='vectorized')[1] == [0, 2, 4, 6, 8]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_normalized_fields_subset(seed):
+    # Delta keys compute only their fields, they must match the full computation
+    rng = random.Random(seed)
+    csv_format = rng.choice([1, 2, 3])
+    df = random_frame(rng, csv_format, rng.randint(0, 60))
+    full = DataNormalizer.normalized_fields(df, csv_format)
+    names = tuple(rng.sample(sorted(full), rng.randint(1, len(full))))
+    subset = DataNormalizer.normalized_fields(df, csv_format, names)
+    assert sorted(subset) == sorted(names)
+    for name in names:
+        assert subset[name].tolist() == full[name].tolist()
+
+
+# Rows valid only when read in their own format
+VALID_ROWS = {
+    1: ['Lee', 'Ann', '5551234567', 'red', '12345'],
+    2: ['Ann Lee', 'red', '12345', '5551234567'],
+    3: ['Ann', 'Lee', '12345', '5551234567', 'red'],
+}
+INVALID_ROW = ['x', 'y', 'z', 'w', 'v']
+
+
+@pytest.fixture
+def schema_cache():
+    normalizer._schema_cache.clear()
+    yield normalizer._schema_cache
+    normalizer._schema_cache.clear()
+
+
+def detect(header, rows):
+    return DataNormalizer.detect_format(pd.DataFrame(rows, columns=header))
+
+
+@pytest.mark.parametrize('csv_format', [1, 2, 3])
+def test_detect_header_fingerprint(schema_cache, csv_format):
+    # Known headers win over the content, whatever their case and spacing
+    header = [f'  {column.upper()} ' for column in FORMAT_COLUMNS[csv_format]]
+    other = 3 if csv_format == 1 else 1
+    rows = [VALID_ROWS[other][:len(header)]] * 5
+    assert detect(header, rows) == csv_format
+    assert detect(['Fullname', 'color', 'zipcode', 'phonenumber'], [INVALID_ROW[:4]]) == 2
+    assert schema_cache.get(DataNormalizer.header_signature(header)) is None
+
+
+@pytest.mark.parametrize('csv_format', [1, 3])
+def test_detect_by_sample_score(schema_cache, csv_format):
+    header = ['a', 'b', 'c', 'd', 'e']
+    other = 3 if csv_format == 1 else 1
+    rows = [VALID_ROWS[csv_format]] * 3 + [VALID_ROWS[other]] * 2 + [INVALID_ROW]
+    assert detect(header, rows) == csv_format
+    # The decision is cached per header, later files skip the scoring
+    assert schema_cache.get(DataNormalizer.header_signature(header)) == csv_format
+    assert detect(header, [VALID_ROWS[other]] * 5) == csv_format
+    # Only the first sample_rows rows are scored
+    rows = [VALID_ROWS[other]] * 2 + [VALID_ROWS[csv_format]] * 5
+    assert DataNormalizer.detect_format(pd.DataFrame(rows, columns=['p', 'q', 'r', 's', 't']), sample_rows=2) == other
+
+
+def test_detect_score_tie(schema_cache):
+    rows = [VALID_ROWS[1], VALID_ROWS[3]] * 2
+    # The heuristics break the tie when they pick one of the leaders ...
+    assert detect(['lastname', 'firstname', 'c', 'd', 'e'], rows) == 1
+    assert detect(['a', 'b', 'c', 'd', 'e'], rows) == 3
+    # ... otherwise the first leader wins (this row is valid as format 2 and 3, the header says 1)
+    assert detect(['lastname', 'firstname', 'x', 'y', 'z'], [['Ann Lee', 'red', '12345', '5551234567', 'x']]) == 2
+    # Ties are not cached
+    assert schema_cache.get(DataNormalizer.header_signature(['a', 'b', 'c', 'd', 'e'])) is None
+    assert schema_cache.get(DataNormalizer.header_signature(['lastname', 'firstname', 'x', 'y', 'z'])) is None
+
+
+def test_detect_heuristic_fallback(schema_cache):
+    # No row is valid in any format: header order, then names with spaces
+    assert detect(['lastname', 'firstname', 'c', 'd', 'e'], [INVALID_ROW] * 3) == 1
+    assert detect(['name', 'c', 'd', 'e'], [['Ann Lee', 'x', 'y', 'z']] * 3) == 2
+    assert detect(['a', 'b', 'c', 'd', 'e'], [INVALID_ROW] * 3) == 3
+    assert detect(['a', 'b', 'c', 'd', 'e'], []) == 3
+    assert schema_cache.get(DataNormalizer.header_signature(['a', 'b', 'c', 'd', 'e'])) is None
+
+
+def test_schema_cache_lru():
+    cache = SchemaCache(max_entries=2)
+    cache.put(('a',), 1)
+    cache.put(('b',), 2)
+    assert cache.get(('a',)) == 1
+    # ('b',) is now the least recently used entry
+    cache.put(('c',), 3)
+    assert cache.get(('b',)) is None
+    assert cache.get(('a',)) == 1 and cache.get(('c',)) == 3
+    cache.put(('a',), 2)
+    cache.put(('d',), 1)
+    assert cache.get(('c',)) is None
+    assert cache.get(('a',)) == 2 and cache.get(('d',)) == 1
+    cache.clear()
+    assert cache.get(('a',)) is None
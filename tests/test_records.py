@@ -0,0 +1,110 @@
+"""POST /normalize applies the same rules as process_csv_data on the CSV path"""
+import csv
+import io
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.api import app
+from app.utils.normalizer import DataNormalizer
+from app.utils.reader import read_csv_typed, resolve_schema
+from app.utils.records import normalize_record
+
+# Values that survive a CSV round trip as written: no empty strings, NA
+# markers or nulls, which read_csv turns into missing values
+NAMES = ['Doe', 'smith', 'ÁLvarez', ' ', 'van Dyke', 'Zed', 'a  b', '1234']
+PHONES = ['123-456-7890', '(555) 123-4567', '+1 (555) 987-6543', '12345678901', '2345678901', 'abc']
+ZIPS = ['12345', '01234', ' 54321 ', '1234', '123456', '12-345']
+COLORS = ['red', ' blue ', 'green']
+
+FIELDS = {
+    1: ['lastname', 'firstname', 'phonenumber', 'color', 'zipcode'],
+    2: ['fullname', 'color', 'zipcode', 'phonenumber'],
+    3: ['firstname', 'lastname', 'zipcode', 'phonenumber', 'color'],
+}
+
+
+@pytest.fixture(scope='module')
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def random_records(rng: random.Random, csv_format: int, count: int):
+    records = []
+    for _ in range(count):
+        first, last = rng.choice(NAMES), rng.choice(NAMES)
+        record = {
+            'firstname': first,
+            'lastname': last,
+            'fullname': f'{first} {last}' if rng.random() < 0.8 else first,
+            'phonenumber': rng.choice(PHONES),
+            'zipcode': rng.choice(ZIPS),
+            'color': rng.choice(COLORS),
+        }
+        records.append({field: record[field] for field in FIELDS[csv_format]})
+    return records
+
+
+def csv_result(records, csv_format: int):
+    """Entries by line and rejected lines of the records written as a CSV"""
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(FIELDS[csv_format])
+    for record in records:
+        writer.writerow([record[field] for field in FIELDS[csv_format]])
+    source = io.BytesIO(text.getvalue().encode('utf-8'))
+    usecols = resolve_schema(source, csv_format)[1]
+    entries, errors, lines = DataNormalizer.process_csv_data(
+        read_csv_typed(source, usecols), csv_format=csv_format, with_lines=True
+    )
+    return {line: entry.to_dict() for line, entry in zip(lines, entries)}, errors
+
+
+def endpoint_result(client, records, array: bool):
+    body = json.dumps(records) if array else '\n'.join(map(json.dumps, records))
+    response = client.post('/normalize', content=body.encode('utf-8'))
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [result['line'] for result in results] == list(range(len(records)))
+    entries = {result['line']: result['entry'] for result in results if 'entry' in result}
+    errors = [result['line'] for result in results if 'error' in result]
+    return entries, errors
+
+
+@pytest.mark.parametrize('array', [False, True], ids=['ndjson', 'array'])
+@pytest.mark.parametrize('seed', range(12))
+def test_same_result_as_csv(client, seed, array):
+    rng = random.Random(seed)
+    csv_format = rng.choice([1, 2, 3])
+    records = random_records(rng, csv_format, rng.randint(1, 60))
+    assert endpoint_result(client, records, array) == csv_result(records, csv_format)
+
+
+def test_missing_or_null_fields_are_rejected():
+    record = {'firstname': 'Ann', 'lastname': 'Lee', 'phonenumber': '5551234567', 'zipcode': '12345', 'color': 'red'}
+    assert normalize_record(record)[1] is None
+    for field, reason in [('firstname', 'name'), ('lastname', 'name'), ('phonenumber', 'phone'),
+                          ('zipcode', 'zip'), ('color', 'color')]:
+        assert normalize_record({**record, field: None}) == (None, reason)
+        assert normalize_record({key: value for key, value in record.items() if key != field}) == (None, reason)
+    names = {'phonenumber': '5551234567', 'zipcode': '12345', 'color': 'red'}
+    assert normalize_record({**names, 'fullname': 'Ann Lee'})[0]['lastname'] == 'Lee'
+    assert normalize_record({**names, 'fullname': None}) == (None, 'name')
+    assert normalize_record({**names, 'fullname': 'Ann'}) == (None, 'name')
+    assert normalize_record(names) == (None, 'name')
+
+
+def test_null_fields_in_endpoint_are_rejected(client):
+    records = [
+        {'firstname': 'Ann', 'lastname': None, 'phonenumber': '5551234567', 'zipcode': '12345', 'color': 'red'},
+        {'firstname': 'Ann', 'lastname': 'Lee', 'phonenumber': '5551234567', 'zipcode': '12345'},
+        {'fullname': 'Ann Lee', 'phonenumber': '5551234567', 'zipcode': '12345', 'color': None},
+    ]
+    response = client.post('/normalize', content='\n'.join(map(json.dumps, records)).encode('utf-8'))
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {'line': 0, 'error': 'name'}, {'line': 1, 'error': 'color'}, {'line': 2, 'error': 'color'}
+    ]
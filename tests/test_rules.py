@@ -0,0 +1,57 @@
+"""The fast paths of rules.py give the result of the plain regex rules"""
+import random
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils import rules
+
+# Separators the fast path strips, other ASCII, Unicode digits (which \d matches), NULs and surrogates
+ALPHABET = list('0123456789') * 3 + list(' -().+/') + list('abcxyz#_\t\n\\') + ['٣', '５', '²', '\0', '\ud800', 'é']
+
+
+def random_texts(rng: random.Random, count: int):
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 16))) for _ in range(count)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_extract_digits_matches_regex(seed):
+    for text in random_texts(random.Random(seed), 500):
+        assert rules.extract_digits(text) == re.sub(r'\D', '', text)
+
+
+@pytest.mark.parametrize('repeat', [False, True], ids=['distinct', 'repeated'])
+@pytest.mark.parametrize('seed', range(10))
+def test_digits_column_matches_regex(seed, repeat):
+    rng = random.Random(seed)
+    texts = random_texts(rng, 300)
+    if repeat:
+        # Above REPEAT_RATIO the column goes through the per-value memo
+        texts = [rng.choice(texts[:20]) for _ in texts]
+    column = pd.Series(texts + [None, 12345, -1, 0], dtype=object)
+    digits, lengths = rules.digits_column(column)
+    expected = [re.sub(r'\D', '', str(value)) for value in column]
+    assert digits.tolist() == expected
+    assert lengths.tolist() == [len(value) for value in expected]
+
+
+@pytest.mark.parametrize('dtype', ['int64', 'uint64', 'int32'])
+def test_integer_column_matches_regex(dtype):
+    info = np.iinfo(dtype)
+    values = np.array([0, 1, 9, 10, 12345, 5551234567 % int(info.max), info.max, info.min], dtype=dtype)
+    digits, lengths = rules.digits_column(pd.Series(values))
+    expected = [re.sub(r'\D', '', str(value)) for value in values.tolist()]
+    assert digits.tolist() == expected
+    assert lengths.tolist() == [len(value) for value in expected]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_phone_and_zip_match_regex(seed):
+    for text in random_texts(random.Random(seed), 500):
+        digits = re.sub(r'\D', '', text)
+        phone = digits[-10:] if len(digits) == 10 or (len(digits) == 11 and digits[0] == '1') else None
+        assert rules.normalize_phone(text) == (phone and f'{phone[:3]}-{phone[3:6]}-{phone[6:]}')
+        zipcode = re.sub(r'\D', '', text.strip())
+        assert rules.validate_zip(text) == (zipcode if len(zipcode) == 5 else None)
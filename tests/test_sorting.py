@@ -0,0 +1,50 @@
+"""ExternalSorter and the numpy sort keys give the order of sorted(key=sort_key)"""
+import random
+
+import pytest
+
+from app.utils.entry import Entry
+from app.utils.sorting import KEY_WIDTH, ExternalSorter, entry_keys, merge_order, sort_key, sort_order
+
+# Ties across case, non-ASCII, NULs and keys longer than KEY_WIDTH (object arrays)
+NAMES = ['Doe', 'doe', 'DOE', 'Smith', 'ÁLvarez', 'alvarez', 'Zoë', 'a', 'a\0', 'a\0b', 'ab', 'x' * (KEY_WIDTH + 3), '']
+
+
+def random_runs(rng: random.Random):
+    """Sorted runs of entries whose color numbers them in input order"""
+    runs = []
+    count = 0
+    for _ in range(rng.randint(0, 40)):
+        run = []
+        for _ in range(rng.choice([0, 1, rng.randint(2, 30)])):
+            run.append(Entry(rng.choice(NAMES), rng.choice(NAMES), '555-123-4567', '12345', str(count)))
+            count += 1
+        runs.append(sorted(run, key=sort_key))
+    return runs
+
+
+@pytest.mark.parametrize('memory_rows', [0, 25, 10 ** 9], ids=['spill', 'mixed', 'memory'])
+@pytest.mark.parametrize('max_runs', [2, 3, 64])
+@pytest.mark.parametrize('seed', range(10))
+def test_merge_matches_sorted(seed, max_runs, memory_rows):
+    rng = random.Random(seed)
+    runs = random_runs(rng)
+    expected = sorted((entry for run in runs for entry in run), key=sort_key)
+    with ExternalSorter(max_runs=max_runs, memory_rows=memory_rows) as sorter:
+        for run in runs:
+            sorter.add_run(run, entry_keys(run) if rng.random() < 0.5 else None)
+        assert sorter.count == len(expected)
+        # Collapsing keeps fewer than max_runs runs per level
+        assert all(sorter.levels.count(level) < max_runs for level in set(sorter.levels))
+        assert [entry.color for entry in sorter.merge()] == [entry.color for entry in expected]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_merge_order_matches_sorted(seed):
+    runs = random_runs(random.Random(seed))
+    entries = [entry for run in runs for entry in run]
+    order = merge_order([entry_keys(run) for run in runs if run])
+    expected = sorted(entries, key=sort_key)
+    assert [entries[i].color for i in order] == [entry.color for entry in expected]
+    keys = entry_keys(entries)
+    assert [entries[i].color for i in sort_order(*keys)] == [entry.color for entry in expected]